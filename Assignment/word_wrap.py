@@ -0,0 +1,214 @@
+"""Word wrap that minimizes the sum of (extra spaces per line) ** power
+
+With word lengths l_0 .. l_n-1 and P[k] = sum of (l_t + 1) for t < k, the line holding words
+i .. j-1 has M + 1 - (P[j] - P[i]) extra spaces and fits when that is >= 0, so
+
+    best[j] = min over fitting i < j of best[i] + (M + 1 - P[j] + P[i]) ** power
+
+Engines, all returning the same score:
+naive: tries every i < j, O(n^2)
+windowed: walks i back from j only while the line still fits, O(n * words per line) <= O(n * M)
+convex: the penalty is convex in P[j] - P[i], so once a later start i2 beats an earlier i1 it
+    stays ahead for every later j. Candidates live in a monotone queue ordered by the P[j]
+    at which each one overtakes the one before it. For power = 2 that crossover has a closed
+    form and the engine is O(n); for other powers it is found by binary search over the ends
+    where the earlier line still fits, O(n log(words per line))
+
+As in the assignment's example every line is scored, including the last one; pass
+last_line_free=True for the variant where the last line costs nothing.
+"""
+import time
+from bisect import bisect_right
+from collections import deque, namedtuple
+
+Wrapping = namedtuple("Wrapping", ["lines", "score"])
+
+ENGINES = ("naive", "windowed", "convex")
+
+
+def _prefix_widths(words: list[str], width: int) -> list[int]:
+    prefix = [0]
+    for word in words:
+        if len(word) > width:
+            raise ValueError(f"'{word}' is longer than the line width {width}")
+        prefix.append(prefix[-1] + len(word) + 1)
+    return prefix
+
+
+def _naive(prefix: list[int], width: int, power: int) -> tuple[list, list]:
+    n_words = len(prefix) - 1
+    best, parent = [0] + [None] * n_words, [0] * (n_words + 1)
+    for j in range(1, n_words + 1):
+        for i in range(j):
+            slack = width + 1 - prefix[j] + prefix[i]
+            if slack >= 0 and (best[j] is None or best[i] + slack ** power < best[j]):
+                best[j], parent[j] = best[i] + slack ** power, i
+    return best, parent
+
+
+def _windowed(prefix: list[int], width: int, power: int) -> tuple[list, list]:
+    n_words = len(prefix) - 1
+    best, parent = [0] + [None] * n_words, [0] * (n_words + 1)
+    for j in range(1, n_words + 1):
+        i = j - 1
+        while i >= 0 and prefix[j] - prefix[i] <= width + 1:
+            cost = best[i] + (width + 1 - prefix[j] + prefix[i]) ** power
+            if best[j] is None or cost < best[j]:
+                best[j], parent[j] = cost, i
+            i -= 1
+    return best, parent
+
+
+def _convex(prefix: list[int], width: int, power: int) -> tuple[list, list]:
+    n_words = len(prefix) - 1
+    best, parent = [0] + [None] * n_words, [0] * (n_words + 1)
+    reach = width + 1
+
+    def cost(i, j):
+        slack = reach - prefix[j] + prefix[i]
+        return best[i] + slack ** power if slack >= 0 else None
+
+    def overtakes(i, k, j):
+        """True if start k (> i) is at least as good as i for a line ending at j"""
+        cost_i, cost_k = cost(i, j), cost(k, j)
+        return cost_i is None or (cost_k is not None and cost_k <= cost_i)
+
+    def crossover(i, k):
+        """Smallest P[j] from which k (> i) is at least as good as i"""
+        # past P[i] + reach the line from i no longer fits, so k wins from there on at the latest
+        too_wide = prefix[i] + reach + 1
+        if power == 2:
+            # best[k] - best[i] + (P[k] - P[i]) * (2 * reach + P[i] + P[k] - 2 * P[j]) <= 0
+            gap = prefix[k] - prefix[i]
+            numerator = best[k] - best[i] + gap * (2 * reach + prefix[i] + prefix[k])
+            return min(-(-numerator // (2 * gap)), too_wide)
+        # only ends where i still fits need searching
+        lo, hi = k + 1, bisect_right(prefix, prefix[i] + reach, k + 1)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if overtakes(i, k, mid):
+                hi = mid
+            else:
+                lo = mid + 1
+        return min(prefix[lo], too_wide) if lo <= n_words else too_wide
+
+    # queue of (start, P[j] from which it beats the previous entry)
+    queue = deque([(0, -1)])
+    for j in range(1, n_words + 1):
+        while len(queue) > 1 and queue[1][1] <= prefix[j]:
+            queue.popleft()
+        start = queue[0][0]
+        best[j], parent[j] = cost(start, j), start
+        threshold = None
+        while queue:
+            threshold = crossover(queue[-1][0], j)
+            if len(queue) > 1 and threshold <= queue[-1][1]:
+                queue.pop()
+            else:
+                break
+        queue.append((j, threshold))
+    return best, parent
+
+
+_SOLVERS = {"naive": _naive, "windowed": _windowed, "convex": _convex}
+
+
+def wrap_words(words: list[str], width: int, engine: str = "convex", power: int = 3,
+               last_line_free: bool = False) -> Wrapping:
+    """
+    :param words: words in order
+    :param width: line width M
+    :param engine: one of ENGINES
+    :param power: exponent of the per line penalty, the assignment uses 3
+    :param last_line_free: don't charge the last line for its extra spaces
+    :return: Wrapping with the lines and the minimum total penalty
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine}, expected one of {ENGINES}")
+    if not words:
+        return Wrapping([], 0)
+    prefix = _prefix_widths(words, width)
+    best, parent = _SOLVERS[engine](prefix, width, power)
+    n_words = len(words)
+    score, last_start = best[n_words], parent[n_words]
+    if last_line_free:
+        i = n_words - 1
+        while i >= 0 and prefix[n_words] - prefix[i] <= width + 1:
+            if best[i] <= score:
+                score, last_start = best[i], i
+            i -= 1
+
+    lines, end, start = [], n_words, last_start
+    while end > 0:
+        lines.append(" ".join(words[start:end]))
+        end, start = start, parent[start]
+    return Wrapping(lines[::-1], score)
+
+
+def word_wrap(text: str, M: int, engine: str = "convex", power: int = 3) -> tuple[int, int]:
+    """
+    :param text: text to wrap, split on whitespace
+    :param M: line width
+    :param engine: one of ENGINES
+    :param power: exponent of the per line penalty
+    :return: (num_lines, score) of the optimal wrapping
+    """
+    wrapping = wrap_words(text.split(), M, engine, power)
+    return len(wrapping.lines), wrapping.score
+
+
+def wrap_paragraphs(lines, width: int, engine: str = "convex", power: int = 3, last_line_free: bool = False):
+    """
+    Wraps a stream of text one paragraph at a time, paragraphs are separated by blank lines
+    :param lines: iterable of input lines, e.g. an open file
+    :param width: line width
+    :param engine: one of ENGINES
+    :param power: exponent of the per line penalty
+    :param last_line_free: don't charge the last line of each paragraph
+    :return: generator of a Wrapping per paragraph, produced as soon as the paragraph has been read
+    """
+    words = []
+    for line in lines:
+        line_words = line.split()
+        if line_words:
+            words.extend(line_words)
+        elif words:
+            yield wrap_words(words, width, engine, power, last_line_free)
+            words = []
+    if words:
+        yield wrap_words(words, width, engine, power, last_line_free)
+
+
+def benchmark(words: list[str], width: int, engines=ENGINES, power: int = 3, repeat: int = 3) -> dict:
+    """
+    Times every engine on the same words and checks that they agree on the score
+    :param words: words to wrap
+    :param width: line width
+    :param engines: engines to run
+    :param power: exponent of the per line penalty
+    :param repeat: runs per engine, the fastest one is reported
+    :return: engine -> (best seconds, score)
+    """
+    results = {}
+    for engine in engines:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            score = wrap_words(words, width, engine, power).score
+            timings.append(time.perf_counter() - start)
+        results[engine] = (min(timings), score)
+    scores = {score for _, score in results.values()}
+    if len(scores) > 1:
+        raise AssertionError(f"engines disagree on the score: {results}")
+    return results
+
+
+if __name__ == "__main__":
+    print(word_wrap("Geeks for Geeks presents word wrap problem", 15))  # (3, 35)
+
+    import random
+    random.seed(0)
+    words = ["x" * random.randint(1, 10) for _ in range(3000)]
+    for power in (2, 3):
+        for engine, (seconds, score) in benchmark(words, 80, power=power, repeat=1).items():
+            print(f"power {power} {engine:>8}: {seconds:.4f}s score {score}")
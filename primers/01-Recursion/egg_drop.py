@@ -1,24 +1,254 @@
-n_floors = 100
-n_eggs = 5
-
-opt_worst_case = [[None] * (n_floors+1) for _ in range(n_eggs)]
-opt_worst_case[0] = [(1, i) for i in range(n_floors + 1)]
-for i in range(n_eggs):
-    opt_worst_case[i][0] = (0,0)
-
-for k in range(1, n_eggs):
-    for n_rem_floors in range(1, n_floors + 1):
-        best_floor = -1
-        opt_worst = n_floors + 1
-        for test_floor in range(1, n_rem_floors + 1):
-            n_if_break = 1 + opt_worst_case[k-1][test_floor-1][1]
-            n_if_survive = 1 + opt_worst_case[k][n_rem_floors - test_floor][1]
-            worst_case = max(n_if_break, n_if_survive)
-            if worst_case < opt_worst:
-                best_floor = test_floor
-                opt_worst = worst_case
-        opt_worst_case[k][n_rem_floors] = (best_floor, opt_worst)
-n = 0
-for col in zip(*opt_worst_case):
-    print(n, col)
-    n+=1
+import numpy as np
+
+ENGINES = ("naive", "bisect", "coverage")
+# every engine fills identical tables, so stored tables are shared between them
+TABLE_VERSION = 1
+
+
+class EggDrop:
+    """
+    Minimum worst case number of drops needed to find the highest safe floor with k eggs and n floors.
+    Solutions are kept in NumPy tables indexed [n_eggs, n_floors] that are filled lazily, and asking for
+    more eggs or floors later only computes the missing cells.
+
+    Engines:
+    naive: the O(k n^2) DP that tries every test floor
+    bisect: binary search for where "egg breaks" (increasing in the floor) meets "egg survives"
+        (decreasing in the floor), O(k n log n)
+    coverage: f(d, k) = f(d - 1, k - 1) + f(d - 1, k) + 1 floors can be covered with d drops and k eggs,
+        so the answer is the first d with f(d, k) >= n, vectorized over all floors at once
+    All engines pick the lowest optimal test floor, so they produce identical tables.
+    """
+
+    def __init__(self, engine: str = "coverage", track_strategy: bool = True):
+        """
+        :param engine: one of ENGINES
+        :param track_strategy: also store the best floor to test, needed for drop_sequence
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine}, expected one of {ENGINES}")
+        self.engine = engine
+        self.track_strategy = track_strategy
+        # row 0 (no eggs) is never used, column 0 (no floors) needs no drops
+        self.drops = np.zeros((1, 1), dtype=np.int32)
+        self.best_floor = np.zeros((1, 1), dtype=np.int32) if track_strategy else None
+        # coverage[d, k]: floors that can be covered with d drops and k eggs
+        self._coverage = np.zeros((1, 1), dtype=np.int64)
+
+    @property
+    def n_eggs(self) -> int:
+        return self.drops.shape[0] - 1
+
+    @property
+    def n_floors(self) -> int:
+        return self.drops.shape[1] - 1
+
+    def worst_case(self, n_eggs: int, n_floors: int) -> int:
+        """
+        :param n_eggs: eggs available
+        :param n_floors: floors left to search
+        :return: minimum number of drops that always finds the highest safe floor
+        """
+        _check_problem(n_eggs, n_floors)
+        self.extend(n_eggs, n_floors)
+        return int(self.drops[n_eggs, n_floors])
+
+    def worst_cases(self, n_eggs: int, floors) -> np.ndarray:
+        """
+        worst_case for one egg count and many floor counts, read off the coverage table alone.
+        The eggs x floors tables are never built, so floors can run into the billions
+        :param n_eggs: eggs available
+        :param floors: floor counts
+        :return: drops per floor count
+        """
+        floors = np.asarray(floors, dtype=np.int64)
+        most_floors = int(floors.max(initial=0))
+        _check_problem(n_eggs, int(floors.min(initial=0)))
+        _check_problem(n_eggs, most_floors)
+        # eggs beyond what binary search needs never help
+        n_eggs = min(n_eggs, most_floors.bit_length())
+        if n_eggs <= 1:
+            # one egg: one drop per floor, going up from the bottom
+            return floors.copy()
+        return np.searchsorted(self._coverage_table(n_eggs, most_floors)[:, n_eggs], floors)
+
+    def test_floor(self, n_eggs: int, n_floors: int) -> int:
+        """
+        :param n_eggs: eggs available
+        :param n_floors: floors left to search
+        :return: the floor (counted from the bottom of the remaining floors) to drop from next
+        """
+        if not self.track_strategy:
+            raise ValueError("solver was created with track_strategy=False")
+        _check_problem(n_eggs, n_floors)
+        self.extend(n_eggs, n_floors)
+        return int(self.best_floor[n_eggs, n_floors])
+
+    def drop_sequence(self, n_eggs: int, n_floors: int, highest_safe_floor: int) -> list[int]:
+        """
+        Plays the optimal strategy against a building whose eggs break above highest_safe_floor
+        :param n_eggs: eggs available
+        :param n_floors: floors in the building
+        :param highest_safe_floor: 0 if the egg breaks everywhere, n_floors if it never breaks
+        :return: floors dropped from, in order
+        """
+        drops = []
+        below = 0
+        while n_floors > 0:
+            floor = below + self.test_floor(n_eggs, n_floors)
+            drops.append(floor)
+            if floor > highest_safe_floor:
+                # broke, the answer is below this floor
+                n_eggs -= 1
+                n_floors = floor - below - 1
+            else:
+                n_floors -= floor - below
+                below = floor
+        return drops
+
+    def extend(self, n_eggs: int, n_floors: int) -> None:
+        """
+        Grows the tables to cover n_eggs and n_floors, reusing every cell already solved
+        :param n_eggs: eggs needed
+        :param n_floors: floors needed
+        """
+        _check_problem(n_eggs, n_floors)
+        old_eggs, old_floors = self.n_eggs, self.n_floors
+        if n_eggs <= old_eggs and n_floors <= old_floors:
+            return
+        n_eggs, n_floors = max(n_eggs, old_eggs), max(n_floors, old_floors)
+        self.drops = self._grow(self.drops, n_eggs, n_floors)
+        if self.track_strategy:
+            self.best_floor = self._grow(self.best_floor, n_eggs, n_floors)
+        for k in range(1, n_eggs + 1):
+            first_new = old_floors + 1 if k <= old_eggs else 1
+            if first_new <= n_floors:
+                self._fill(k, first_new, n_floors + 1)
+
+    @classmethod
+    def from_store(cls, store, n_eggs: int, n_floors: int, engine: str = "coverage") -> "EggDrop":
+        """
+        Solver backed by a primers.table_store.TableStore: the stored tables are memory-mapped,
+        extended if they cover fewer eggs or floors than asked for, and saved back when they grow.
+        Tables that fail their checksum are solved again up to the size they were and saved back
+        :param store: TableStore
+        :param n_eggs: eggs needed
+        :param n_floors: floors needed
+        :param engine: one of ENGINES, used for any cells that still have to be solved
+        :return: EggDrop covering at least n_eggs and n_floors
+        """
+        solver = cls(engine)
+        stored = store.load("egg_drop", {}, TABLE_VERSION)
+        corrupt = stored is not None and not stored.validate()
+        if corrupt:
+            n_eggs, n_floors = max(n_eggs, stored.extent["eggs"]), max(n_floors, stored.extent["floors"])
+        elif stored is not None:
+            solver.drops = stored.arrays["drops"]
+            solver.best_floor = stored.arrays["best_floor"]
+            solver._coverage = stored.arrays["coverage"]
+        if corrupt or n_eggs > solver.n_eggs or n_floors > solver.n_floors:
+            solver.extend(n_eggs, n_floors)
+            store.save("egg_drop", {}, {"drops": solver.drops, "best_floor": solver.best_floor,
+                                        "coverage": solver._coverage},
+                       {"eggs": solver.n_eggs, "floors": solver.n_floors}, TABLE_VERSION)
+        return solver
+
+    @staticmethod
+    def _grow(table: np.ndarray, n_eggs: int, n_floors: int) -> np.ndarray:
+        grown = np.zeros((n_eggs + 1, n_floors + 1), dtype=table.dtype)
+        grown[:table.shape[0], :table.shape[1]] = table
+        return grown
+
+    def _fill(self, k: int, lo: int, hi: int) -> None:
+        """Solves row k of the tables for floors lo to hi - 1, rows below k and floors below lo are done"""
+        floors = np.arange(lo, hi)
+        if k == 1:
+            # one egg: start at the bottom and go up one floor at a time
+            self.drops[1, lo:hi] = floors
+            if self.track_strategy:
+                self.best_floor[1, lo:hi] = 1
+        elif self.engine == "coverage":
+            self._fill_coverage(k, floors)
+        else:
+            fill_floor = self._fill_naive if self.engine == "naive" else self._fill_bisect
+            for n in range(lo, hi):
+                fill_floor(k, n)
+
+    def _fill_naive(self, k: int, n: int) -> None:
+        test_floors = np.arange(1, n + 1)
+        worst = 1 + np.maximum(self.drops[k - 1, test_floors - 1], self.drops[k, n - test_floors])
+        best = np.argmin(worst)
+        self.drops[k, n] = worst[best]
+        if self.track_strategy:
+            self.best_floor[k, n] = best + 1
+
+    def _fill_bisect(self, k: int, n: int) -> None:
+        if_breaks, if_survives = self.drops[k - 1], self.drops[k]
+        # first test floor where breaking is at least as bad as surviving
+        lo, hi = 1, n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if if_breaks[mid - 1] >= if_survives[n - mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        worst = 1 + if_breaks[lo - 1]
+        if lo > 1:
+            worst = min(worst, 1 + if_survives[n - lo + 1])
+        self.drops[k, n] = worst
+        if self.track_strategy:
+            # lowest floor whose survive branch already fits in worst - 1 drops
+            lo_floor, hi_floor = 1, lo
+            while lo_floor < hi_floor:
+                mid = (lo_floor + hi_floor) // 2
+                if if_survives[n - mid] <= worst - 1:
+                    hi_floor = mid
+                else:
+                    lo_floor = mid + 1
+            self.best_floor[k, n] = lo_floor
+
+    def _fill_coverage(self, k: int, floors: np.ndarray) -> None:
+        coverage = self._coverage_table(k, floors[-1])
+        drops = np.searchsorted(coverage[:, k], floors)
+        self.drops[k, floors] = drops
+        if self.track_strategy:
+            # with d drops the survive branch holds at most f(d - 1, k) floors
+            self.best_floor[k, floors] = np.maximum(1, floors - coverage[drops - 1, k])
+
+    def _coverage_table(self, n_eggs: int, n_floors: int) -> np.ndarray:
+        """f(d, k) for every k <= n_eggs and enough drops d that f(d, n_eggs) >= n_floors"""
+        coverage = self._coverage
+        if coverage.shape[1] <= n_eggs:
+            # more eggs changes every row, rebuild with at least as many drops as before
+            n_drops = max(coverage.shape[0], 2)
+            coverage = self._grow_coverage_drops(np.zeros((1, n_eggs + 1), dtype=np.int64), n_drops)
+        while coverage[-1, n_eggs] < n_floors:
+            coverage = self._grow_coverage_drops(coverage, 2 * coverage.shape[0])
+        self._coverage = coverage
+        return coverage
+
+    @staticmethod
+    def _grow_coverage_drops(coverage: np.ndarray, n_drops: int) -> np.ndarray:
+        cap = np.iinfo(np.int64).max // 4
+        grown = np.zeros((n_drops, coverage.shape[1]), dtype=np.int64)
+        grown[:coverage.shape[0]] = coverage
+        for d in range(coverage.shape[0], n_drops):
+            grown[d, 1:] = np.minimum(grown[d - 1, :-1] + grown[d - 1, 1:] + 1, cap)
+        return grown
+
+
+def _check_problem(n_eggs: int, n_floors: int) -> None:
+    if n_eggs < 0 or n_floors < 0:
+        raise ValueError(f"eggs and floors must be non-negative, got {n_eggs} eggs and {n_floors} floors")
+    if n_eggs < 1 and n_floors > 0:
+        raise ValueError(f"{n_floors} floors can't be searched without an egg")
+
+
+if __name__ == "__main__":
+    n_floors = 100
+    n_eggs = 5
+
+    solver = EggDrop()
+    solver.extend(n_eggs, n_floors)
+    for n in range(n_floors + 1):
+        print(n, list(zip(solver.best_floor[1:, n].tolist(), solver.drops[1:, n].tolist())))
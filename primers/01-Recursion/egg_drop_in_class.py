@@ -22,12 +22,13 @@ for n_eggs_remaining in range(2, n_eggs + 1):
         best_test_floor = -1
         for test_floor in range(1, n_floors_remaining + 1):
             # find the best test floor
-            solution_if_breaks = 1 + solutions_lookup_table[n_eggs_remaining - 1][test_floor - 1]
-            solution_if_intact = 1 + solutions_lookup_table[n_eggs_remaining - 1][n_floors_remaining + 1 - test_floor]
-            worst_case_given_floor = max(solution_if_breaks[1],solution_if_intact[1])
+            # breaks: one egg fewer and the floors below, intact: same eggs and the floors above
+            solution_if_breaks = 1 + solutions_lookup_table[n_eggs_remaining - 2][test_floor - 1][1]
+            solution_if_intact = 1 + solutions_lookup_table[n_eggs_remaining - 1][n_floors_remaining - test_floor][1]
+            worst_case_given_floor = max(solution_if_breaks, solution_if_intact)
             if worst_case_num_drops > worst_case_given_floor:
                 # if our worst case overall is bigger than worst case for this floor, we have a new optimal strategy
                 worst_case_num_drops = worst_case_given_floor
                 best_test_floor = test_floor
-        solutions_lookup_table[n_eggs_remaining][n_floors_remaining] = (best_test_floor, worst_case_num_drops)
+        solutions_lookup_table[n_eggs_remaining - 1][n_floors_remaining] = (best_test_floor, worst_case_num_drops)
 
@@ -0,0 +1,97 @@
+"""Knapsack engines that answer the same question as top_down_knapsack.solve_knapsack
+
+solve gives the (value, decision) pair for State(n_items_remaining, rem_weight) without
+recursion or a global cache. Backends:
+table: full bottom up table, O(n * W) memory
+rolling: one row at a time, O(W) memory
+best_items reconstructs the chosen items with the full table or, in O(W) memory, by
+Hirschberg style divide and conquer. solve_capacities answers many capacities at once.
+stored_value_table keeps the full table in a TableStore and widens it when asked for more capacity.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+from .bottom_up import decide, extend_value_table, rolling_values, table_items, value_table
+from .hirschberg import chosen_items
+
+Item = namedtuple("Item", "weight value")
+
+BACKENDS = ("table", "rolling")
+TABLE_VERSION = 1
+RECONSTRUCTIONS = ("table", "hirschberg")
+
+
+def solve(items: list, rem_weight: int, n_items_remaining: int = None, backend: str = "rolling") -> tuple[int, str]:
+    """
+    Returns the optimal value and decision for the first of the last n_items_remaining items,
+    the same result as solve_knapsack(State(n_items_remaining, rem_weight)) for positive weights.
+    Items of weight 0 are still taken when rem_weight is 0, like solve_capacities does, where
+    solve_knapsack's rem_weight == 0 base case gives 0
+    :param items: list of Item(weight, value)
+    :param rem_weight: remaining capacity
+    :param n_items_remaining: number of items left, defaults to all of them
+    :param backend: one of BACKENDS
+    :return: (value, "Y" or "N")
+    """
+    if n_items_remaining is None:
+        n_items_remaining = len(items)
+    if n_items_remaining == 0:
+        return 0, "N"
+    later_items = items[len(items) - n_items_remaining + 1:]
+    if backend == "table":
+        rest = value_table(later_items, rem_weight)[-1]
+    elif backend == "rolling":
+        rest = rolling_values(later_items, rem_weight)
+    else:
+        raise ValueError(f"unknown backend {backend}, expected one of {BACKENDS}")
+    return decide(rest, items[-n_items_remaining], rem_weight)
+
+
+def best_items(items: list, capacity: int, method: str = "hirschberg") -> list[int]:
+    """
+    Returns the indices of an optimal set of items
+    :param items: list of Item(weight, value)
+    :param capacity: capacity of the knapsack
+    :param method: one of RECONSTRUCTIONS
+    :return: sorted indices into items
+    """
+    if method == "table":
+        return table_items(items, capacity)
+    if method == "hirschberg":
+        return chosen_items(items, capacity)
+    raise ValueError(f"unknown method {method}, expected one of {RECONSTRUCTIONS}")
+
+
+def solve_capacities(items: list, capacities) -> np.ndarray:
+    """
+    Returns the optimal value for every capacity in one pass over the items
+    :param items: list of Item(weight, value)
+    :param capacities: capacities to answer
+    :return: best value per capacity, same shape as capacities
+    """
+    capacities = np.asarray(capacities)
+    return rolling_values(items, int(capacities.max()))[capacities]
+
+
+def stored_value_table(store, items: list, capacity: int) -> np.ndarray:
+    """
+    value_table kept in a primers.table_store.TableStore under a hash of the items. A stored
+    table that is too narrow is widened with extend_value_table and saved back, one that fails its
+    checksum is solved again.
+    :param store: TableStore
+    :param items: list of Item(weight, value)
+    :param capacity: largest capacity needed
+    :return: table[n, c] as in value_table, at least capacity + 1 columns wide, memory-mapped
+    """
+    params = {"items": [[int(item.weight), int(item.value)] for item in items]}
+    stored = store.load("knapsack", params, TABLE_VERSION)
+    if stored is not None and not stored.validate():
+        capacity, stored = max(capacity, stored.extent["capacity"]), None
+    if stored is not None and stored.extent["capacity"] >= capacity:
+        return stored.arrays["values"]
+    if stored is None:
+        table = value_table(items, capacity)
+    else:
+        table = extend_value_table(stored.arrays["values"], items, capacity)
+    return store.save("knapsack", params, {"values": table}, {"capacity": capacity}, TABLE_VERSION).arrays["values"]
@@ -0,0 +1,115 @@
+"""Bottom up knapsack engines, one vectorized NumPy row update per item
+
+best[c] is the best value that fits in capacity c. Adding an item with weight w and
+value v is the whole-row update best[w:] = max(best[w:], best[:-w] + v), so n items and
+capacity W take n vector operations of length W instead of n * W Python calls.
+"""
+import numpy as np
+
+
+def add_item(best: np.ndarray, weight: int, value: int, in_place: bool = False) -> np.ndarray:
+    """
+    Returns the best values per capacity once one more item may be included
+    :param best: best[c] is the best value with capacity c using the items so far
+    :param weight: weight of the new item
+    :param value: value of the new item
+    :param in_place: overwrite best instead of returning a new array
+    :return: updated best values
+    """
+    new_best = best if in_place else best.copy()
+    if weight == 0:
+        if value > 0:
+            new_best += value
+    elif weight < len(best):
+        # the right hand side is evaluated before anything is written, so this is safe in place
+        np.maximum(best[weight:], best[:-weight] + value, out=new_best[weight:])
+    return new_best
+
+
+def rolling_values(items: list, capacity: int) -> np.ndarray:
+    """
+    Best value for every capacity 0 to capacity in O(capacity) memory
+    :param items: list of Item(weight, value)
+    :param capacity: largest capacity
+    :return: best[c] for c in 0..capacity
+    """
+    best = np.zeros(capacity + 1, dtype=np.int64)
+    for item in items:
+        add_item(best, item.weight, item.value, in_place=True)
+    return best
+
+
+def value_table(items: list, capacity: int) -> np.ndarray:
+    """
+    Full table in the same layout as the top down State(n_items_remaining, rem_weight)
+    :param items: list of Item(weight, value)
+    :param capacity: largest capacity
+    :return: table[n, c] is the best value using the last n items with capacity c
+    """
+    table = np.zeros((len(items) + 1, capacity + 1), dtype=np.int64)
+    for n in range(1, len(items) + 1):
+        item = items[-n]
+        table[n] = add_item(table[n - 1], item.weight, item.value)
+    return table
+
+
+def extend_value_table(table: np.ndarray, items: list, capacity: int) -> np.ndarray:
+    """
+    Widens a value_table to a larger capacity, only the new columns are computed
+    :param table: value_table(items, old_capacity)
+    :param items: the same items
+    :param capacity: new largest capacity
+    :return: value_table(items, capacity), table itself if it is already wide enough
+    """
+    old_capacity = table.shape[1] - 1
+    if capacity <= old_capacity:
+        return table
+    grown = np.zeros((len(items) + 1, capacity + 1), dtype=np.int64)
+    grown[:, :old_capacity + 1] = table
+    new_columns = np.arange(old_capacity + 1, capacity + 1)
+    for n in range(1, len(items) + 1):
+        item = items[-n]
+        previous, row = grown[n - 1], grown[n, old_capacity + 1:]
+        row[:] = previous[old_capacity + 1:]
+        if item.weight == 0:
+            if item.value > 0:
+                row += item.value
+        else:
+            # new column c looks back to c - weight, which may be an old column
+            first = max(0, item.weight - old_capacity - 1)
+            np.maximum(row[first:], previous[new_columns[first:] - item.weight] + item.value, out=row[first:])
+    return grown
+
+
+def decide(rest: np.ndarray, item, rem_weight: int) -> tuple[int, str]:
+    """
+    Value and decision for the first remaining item given the best values of the items after it
+    :param rest: best value per capacity for the items after this one
+    :param item: Item(weight, value) being decided on
+    :param rem_weight: capacity left
+    :return: (value, "Y" or "N"), "N" on ties like solve_knapsack
+    """
+    value_excluded = int(rest[rem_weight])
+    if item.weight <= rem_weight:
+        value_included = item.value + int(rest[rem_weight - item.weight])
+        if value_included > value_excluded:
+            return value_included, "Y"
+    return value_excluded, "N"
+
+
+def table_items(items: list, capacity: int) -> list[int]:
+    """
+    Indices of an optimal set of items, read back from the full O(n * capacity) table
+    :param items: list of Item(weight, value)
+    :param capacity: capacity of the knapsack
+    :return: sorted indices into items
+    """
+    table = value_table(items, capacity)
+    chosen = []
+    rem_weight = capacity
+    for n in range(len(items), 0, -1):
+        _, decision = decide(table[n - 1], items[-n], rem_weight)
+        if decision == "Y":
+            chosen.append(len(items) - n)
+            rem_weight -= items[-n].weight
+    return chosen
@@ -0,0 +1,38 @@
+"""Hirschberg style reconstruction of the chosen items in O(capacity) memory
+
+The items are split in half and the best values of each half are computed for every
+capacity with the rolling engine. The optimal split of the capacity between the halves
+is the c maximizing left[c] + right[capacity - c], and each half is solved again with its
+share. Only O(log n) rows of length capacity are alive at any time.
+"""
+import numpy as np
+
+from .bottom_up import rolling_values
+
+
+def chosen_items(items: list, capacity: int) -> list[int]:
+    """
+    Indices of an optimal set of items without storing the full table
+    :param items: list of Item(weight, value)
+    :param capacity: capacity of the knapsack
+    :return: sorted indices into items
+    """
+    chosen = []
+    _solve_range(items, 0, len(items), capacity, chosen)
+    return sorted(chosen)
+
+
+def _solve_range(items: list, lo: int, hi: int, capacity: int, chosen: list) -> None:
+    if hi - lo == 0:
+        return
+    if hi - lo == 1:
+        item = items[lo]
+        if item.weight <= capacity and item.value > 0:
+            chosen.append(lo)
+        return
+    mid = (lo + hi) // 2
+    left = rolling_values(items[lo:mid], capacity)
+    right = rolling_values(items[mid:hi], capacity)
+    split = int(np.argmax(left + right[::-1]))
+    _solve_range(items, lo, mid, split, chosen)
+    _solve_range(items, mid, hi, capacity - split, chosen)
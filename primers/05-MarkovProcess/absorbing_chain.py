@@ -0,0 +1,205 @@
+"""Analytics for absorbing Markov chains
+
+For a transition matrix in canonical form A = [[Q, R], [0, I]] the fundamental
+matrix is N = (I - Q)^-1. Everything we care about is N times something, so the
+chain factors I - Q once and answers every question with triangular solves
+instead of forming N, which is dense even when Q is sparse.
+"""
+import numpy as np
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+from scipy.sparse import csgraph
+from scipy.sparse.linalg import splu
+
+
+def find_absorbing_states(transition_matrix, atol: float = 1e-12) -> tuple[np.ndarray, np.ndarray]:
+    """Split the states of a transition matrix into transient and absorbing states
+
+    Args:
+        transition_matrix (np.ndarray | sparse.spmatrix): Row stochastic transition matrix
+        atol (float, optional): Tolerance for a self loop to count as probability 1. Defaults to 1e-12.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Indices of the transient states and of the absorbing states
+    """
+    if sparse.issparse(transition_matrix):
+        diagonal = transition_matrix.diagonal()
+    else:
+        diagonal = np.asarray(transition_matrix).diagonal()
+    is_absorbing = np.isclose(diagonal, 1, rtol=0, atol=atol)
+    return np.flatnonzero(~is_absorbing), np.flatnonzero(is_absorbing)
+
+
+def _can_reach(transition_matrix, targets: np.ndarray) -> np.ndarray:
+    """Mask of the states that reach at least one of targets with positive probability"""
+    n_states = transition_matrix.shape[0]
+    # reverse every edge and add a super source pointing at the targets, so one
+    # breadth first search finds everything that leads into them in O(nnz)
+    reverse = sparse.csr_matrix(transition_matrix).T.tocoo()
+    rows = np.concatenate([reverse.row, np.full(len(targets), n_states)])
+    cols = np.concatenate([reverse.col, targets])
+    graph = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(n_states + 1, n_states + 1))
+    reached = csgraph.breadth_first_order(graph, n_states, directed=True, return_predecessors=False)
+    mask = np.zeros(n_states + 1, dtype=bool)
+    mask[reached] = True
+    return mask[:n_states]
+
+
+class AbsorbingChain:
+    """Absorbing Markov chain with a single reusable factorization of I - Q
+
+    Args:
+        transition_matrix (np.ndarray | np.matrix | sparse.spmatrix): Row stochastic transition matrix
+        atol (float, optional): Tolerance used to detect absorbing states. Defaults to 1e-12.
+
+    Raises:
+        ValueError: If there are no absorbing states or a transient state cannot reach one
+    """
+
+    def __init__(self, transition_matrix, atol: float = 1e-12):
+        self.n_states = transition_matrix.shape[0]
+        self.transient, self.absorbing = find_absorbing_states(transition_matrix, atol)
+        if len(self.absorbing) == 0:
+            raise ValueError("transition matrix has no absorbing states")
+        stuck = ~_can_reach(transition_matrix, self.absorbing)[self.transient]
+        if stuck.any():
+            raise ValueError(f"states {self.transient[stuck].tolist()} can never be absorbed")
+
+        self.is_sparse = sparse.issparse(transition_matrix)
+        if self.is_sparse:
+            matrix = sparse.csr_matrix(transition_matrix)
+            self.Q = matrix[self.transient][:, self.transient]
+            self.R = matrix[self.transient][:, self.absorbing]
+            identity = sparse.identity(len(self.transient), format="csc")
+            self._lu = splu((identity - self.Q).tocsc())
+        else:
+            matrix = np.asarray(transition_matrix, dtype=float)
+            self.Q = matrix[np.ix_(self.transient, self.transient)]
+            self.R = matrix[np.ix_(self.transient, self.absorbing)]
+            self._lu = lu_factor(np.eye(len(self.transient)) - self.Q)
+        self._expected_steps = None
+
+    def solve(self, rhs) -> np.ndarray:
+        """Compute N @ rhs without forming the fundamental matrix N
+
+        Args:
+            rhs (np.ndarray | sparse.spmatrix): Vector or matrix with one row per transient state
+
+        Returns:
+            np.ndarray: N @ rhs
+        """
+        if sparse.issparse(rhs):
+            rhs = rhs.toarray()
+        rhs = np.asarray(rhs, dtype=float)
+        if self.is_sparse:
+            return self._lu.solve(rhs)
+        return lu_solve(self._lu, rhs)
+
+    def expected_steps(self) -> np.ndarray:
+        """Expected number of steps before absorption from each transient state
+
+        Returns:
+            np.ndarray: t = N 1, indexed like self.transient
+        """
+        if self._expected_steps is None:
+            self._expected_steps = self.solve(np.ones(len(self.transient)))
+        return self._expected_steps
+
+    def variance_steps(self) -> np.ndarray:
+        """Variance of the number of steps before absorption from each transient state
+
+        Returns:
+            np.ndarray: (2N - I) t - t * t, indexed like self.transient
+        """
+        t = self.expected_steps()
+        return 2 * self.solve(t) - t - t * t
+
+    def absorption_probabilities(self) -> np.ndarray:
+        """Probability of ending in each absorbing state from each transient state
+
+        Returns:
+            np.ndarray: B = N R with rows indexed like self.transient and columns like self.absorbing
+        """
+        return self.solve(self.R)
+
+    def expected_turns(self, start: int = 0) -> tuple[float, float]:
+        """Mean and variance of the number of turns until absorption from one state
+
+        Args:
+            start (int, optional): Starting state in the original transition matrix. Defaults to 0.
+
+        Returns:
+            tuple[float, float]: Mean and variance of the turns until absorption
+        """
+        position = self.transient_index(start)
+        return float(self.expected_steps()[position]), float(self.variance_steps()[position])
+
+    def turn_distribution(self, start: int = 0, quantile: float = 0.99,
+                          max_turns: int = 100_000) -> tuple[np.ndarray, np.ndarray]:
+        """Probability of being absorbed on each turn, up to a quantile of the finish time
+
+        Only the transient mass is pushed forward, one product with Q per turn, and
+        the walk stops as soon as the cdf reaches the requested quantile.
+
+        Args:
+            start (int, optional): Starting state in the original transition matrix. Defaults to 0.
+            quantile (float, optional): Stop once this much mass has been absorbed. Defaults to 0.99.
+            max_turns (int, optional): Hard cap on the number of turns. Defaults to 100_000.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: pmf and cdf of the finish turn, indexed by turn number
+        """
+        state = np.zeros(len(self.transient))
+        state[self.transient_index(start)] = 1
+        exit_probs = np.asarray(self.R.sum(axis=1)).ravel()
+        Q_T = self.Q.T.tocsr() if self.is_sparse else self.Q.T
+        pmf = [0.0]
+        absorbed = 0.0
+        while absorbed < quantile and len(pmf) <= max_turns:
+            finished = state @ exit_probs
+            pmf.append(finished)
+            absorbed += finished
+            state = Q_T @ state
+        pmf = np.array(pmf)
+        return pmf, np.cumsum(pmf)
+
+    def transient_index(self, state: int) -> int:
+        """Position of a state of the original matrix among the transient states
+
+        Args:
+            state (int): State index in the original transition matrix
+
+        Returns:
+            int: Row of that state in the arrays returned by this class
+        """
+        position = np.searchsorted(self.transient, state)
+        if position == len(self.transient) or self.transient[position] != state:
+            raise ValueError(f"state {state} is absorbing")
+        return int(position)
+
+
+def expected_turns(transition_matrix, start: int = 0) -> tuple[float, float]:
+    """Mean and variance of the number of turns until absorption
+
+    Args:
+        transition_matrix (np.ndarray | np.matrix | sparse.spmatrix): Row stochastic transition matrix
+        start (int, optional): Starting state. Defaults to 0.
+
+    Returns:
+        tuple[float, float]: Mean and variance of the turns until absorption
+    """
+    return AbsorbingChain(transition_matrix).expected_turns(start)
+
+
+def turn_distribution(transition_matrix, start: int = 0, quantile: float = 0.99) -> tuple[np.ndarray, np.ndarray]:
+    """pmf and cdf of the turn the game finishes on, up to the requested quantile
+
+    Args:
+        transition_matrix (np.ndarray | np.matrix | sparse.spmatrix): Row stochastic transition matrix
+        start (int, optional): Starting state. Defaults to 0.
+        quantile (float, optional): Stop once this much mass has been absorbed. Defaults to 0.99.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: pmf and cdf of the finish turn, indexed by turn number
+    """
+    return AbsorbingChain(transition_matrix).turn_distribution(start, quantile)
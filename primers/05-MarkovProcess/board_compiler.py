@@ -0,0 +1,269 @@
+"""Compile dice and board rules into a transition operator
+
+A game is described by a GameSpec: the dice, how rolls past the end of the board are
+handled, a jump map (chutes, ladders, go to jail), cards that move you with some
+probability, and extra turn rules. compile_board turns it into the per turn transition
+matrix in three steps:
+
+roll: the distribution of the dice total, by repeated convolution or FFT, laid out as a
+    banded matrix with one diagonal per total (two per total on a circular board)
+land: the jump map as an aggregation matrix with a single 1 per row, followed by the cards
+turn: extra rolls on doubles or given totals, with an optional penalty square after too
+    many of them, are folded into one matrix, so a turn stays a single step of the chain
+
+Every step is sparse, so compiling a board is O(n_states * n_totals) and a new variant is
+a new spec instead of a new matrix builder.
+"""
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+
+DiceSpec = namedtuple("DiceSpec", ["n_dice", "n_faces", "face_probs"], defaults=[1, 6, None])
+GameSpec = namedtuple("GameSpec", ["n_states", "dice", "jumps", "card_moves", "circular", "max_square", "overshoot",
+                                   "extra_turn_totals", "extra_turn_on_doubles", "max_extra_turns", "penalty_square",
+                                   "ends_turn"],
+                      defaults=[DiceSpec(), None, None, False, None, "stay", (), False, 2, None, ()])
+
+ONE_DIE = DiceSpec()
+TWO_DICE = DiceSpec(2)
+METHODS = ("auto", "convolve", "fft")
+OVERSHOOTS = ("stay", "drop")
+# above this many totals one FFT beats log2(n_dice) convolutions
+FFT_MIN_TOTALS = 512
+
+
+def face_distribution(dice: DiceSpec) -> np.ndarray:
+    """Distribution of a single die
+
+    Args:
+        dice (DiceSpec): Dice, face_probs None for fair dice
+
+    Returns:
+        np.ndarray: Probability of each face indexed by the face, index 0 is always 0
+    """
+    if dice.n_dice < 1 or dice.n_faces < 1:
+        raise ValueError(f"need at least one die with at least one face, got {dice.n_dice}d{dice.n_faces}")
+    probs = np.full(dice.n_faces, 1 / dice.n_faces) if dice.face_probs is None else np.asarray(dice.face_probs, float)
+    if probs.shape != (dice.n_faces,) or not np.isclose(probs.sum(), 1) or (probs < 0).any():
+        raise ValueError(f"face_probs must be {dice.n_faces} non-negative probabilities summing to 1")
+    return np.concatenate([[0.0], probs])
+
+
+def roll_distribution(dice: DiceSpec, method: str = "auto") -> np.ndarray:
+    """Distribution of the total of all the dice
+
+    Args:
+        dice (DiceSpec): Dice
+        method (str, optional): "convolve" squares and multiplies with np.convolve, "fft" raises the
+            spectrum of one die to the n_dice power, "auto" picks by the number of totals. Defaults to "auto".
+
+    Returns:
+        np.ndarray: Probability of each total indexed by the total, length n_dice * n_faces + 1
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method}, expected one of {METHODS}")
+    face = face_distribution(dice)
+    n_totals = dice.n_dice * dice.n_faces + 1
+    if method == "auto":
+        method = "fft" if dice.n_dice > 2 and n_totals >= FFT_MIN_TOTALS else "convolve"
+    if method == "fft":
+        pmf = np.fft.irfft(np.fft.rfft(face, n_totals) ** dice.n_dice, n_totals)
+        # round off leaves tiny negatives and noise on totals that can't be rolled
+        pmf[:dice.n_dice] = 0
+        return np.maximum(pmf, 0)
+    pmf, power, n = np.ones(1), face, dice.n_dice
+    while n:
+        if n & 1:
+            pmf = np.convolve(pmf, power)
+        n >>= 1
+        if n:
+            power = np.convolve(power, power)
+    return pmf
+
+
+def doubles_distribution(dice: DiceSpec) -> np.ndarray:
+    """Probability of each total with every die showing the same face
+
+    Args:
+        dice (DiceSpec): Dice, a single die never rolls doubles
+
+    Returns:
+        np.ndarray: Indexed by the total like roll_distribution
+    """
+    face = face_distribution(dice)
+    doubles = np.zeros(dice.n_dice * dice.n_faces + 1)
+    if dice.n_dice > 1:
+        doubles[dice.n_dice * np.arange(1, dice.n_faces + 1)] = face[1:] ** dice.n_dice
+    return doubles
+
+
+def split_rolls(spec: GameSpec) -> tuple[np.ndarray, np.ndarray]:
+    """Split the roll distribution into rolls that end the turn and rolls that earn another
+
+    Args:
+        spec (GameSpec): Game rules
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Distributions over totals, they add up to roll_distribution
+    """
+    pmf = roll_distribution(spec.dice)
+    again = doubles_distribution(spec.dice) if spec.extra_turn_on_doubles else np.zeros_like(pmf)
+    totals = [total for total in spec.extra_turn_totals if 0 <= total < len(pmf)]
+    again[totals] = pmf[totals]
+    return pmf - again, again
+
+
+def step_matrix(n_states: int, pmf: np.ndarray, circular: bool = False, max_square: int = None,
+                overshoot: str = "stay", format: str = "dia") -> sparse.spmatrix:
+    """Move by the rolled total from every square, before any jumps
+
+    Args:
+        n_states (int): Number of squares
+        pmf (np.ndarray): Probability of each total indexed by the total
+        circular (bool, optional): Totals wrap around the board. Defaults to False.
+        max_square (int, optional): Furthest square a roll can land on when not circular. Defaults to the last one.
+        overshoot (str, optional): Rolls past max_square "stay" where they are or are "drop"ped,
+            which leaves rows that sum to less than 1. Defaults to "stay".
+        format (str, optional): scipy sparse format, "dia" is the banded form it is built in. Defaults to "dia".
+
+    Returns:
+        sparse.spmatrix: n_states x n_states matrix
+    """
+    if overshoot not in OVERSHOOTS:
+        raise ValueError(f"unknown overshoot {overshoot}, expected one of {OVERSHOOTS}")
+    max_square = n_states - 1 if max_square is None else max_square
+    squares = np.arange(n_states)
+    diagonals = {}
+    for total in np.flatnonzero(pmf):
+        prob = pmf[total]
+        if circular:
+            total %= n_states
+            diagonals.setdefault(total, np.zeros(n_states - total))[:] += prob
+            if total:
+                diagonals.setdefault(total - n_states, np.zeros(total))[:] += prob
+            continue
+        # the diagonal at offset total has one entry per square that can roll it
+        fits = squares[:n_states - total] + total <= max_square if total < n_states else squares[:0]
+        if total < n_states:
+            diagonals.setdefault(total, np.zeros(n_states - total))[:] += prob * fits
+        if overshoot == "stay":
+            stays = np.ones(n_states, dtype=bool)
+            stays[:len(fits)] = ~fits
+            diagonals.setdefault(0, np.zeros(n_states))[:] += prob * stays
+    offsets = sorted(diagonals)
+    if not offsets:
+        return sparse.csr_matrix((n_states, n_states)).asformat(format)
+    steps = sparse.diags([diagonals[offset] for offset in offsets], offsets, shape=(n_states, n_states))
+    return steps.asformat(format)
+
+
+def resolve_jumps(n_states: int, jumps: dict) -> np.ndarray:
+    """Resolve a jump map into the final square every square sends its mass to
+
+    Jumps are applied in order, exactly as repeated column moves would be, so a
+    ladder that ends on the start of a later chute keeps sliding down it.
+
+    Args:
+        n_states (int): Number of states (columns) in the transition matrix
+        jumps (dict): Start square to end square
+
+    Returns:
+        np.ndarray: dest[j] is the column that mass landing on column j ends up in
+    """
+    holders = {}
+    for start, end in jumps.items():
+        if start == end:
+            continue
+        moved = holders.get(start, [start])
+        holders[start] = []
+        holders.setdefault(end, [end]).extend(moved)
+    dest = np.arange(n_states)
+    for column, members in holders.items():
+        dest[members] = column
+    return dest
+
+
+def jump_matrix(dest: np.ndarray) -> sparse.csr_matrix:
+    """Aggregation matrix of a resolved jump map, right multiplying by it moves every column j to dest[j]
+
+    Args:
+        dest (np.ndarray): Result of resolve_jumps
+
+    Returns:
+        sparse.csr_matrix: One 1 per row
+    """
+    n_states = len(dest)
+    return sparse.csr_matrix((np.ones(n_states), (np.arange(n_states), dest)), shape=(n_states, n_states))
+
+
+def card_matrix(n_states: int, card_moves: dict) -> sparse.csr_matrix:
+    """Cards drawn on landing, the identity except on card squares
+
+    Args:
+        n_states (int): Number of squares
+        card_moves (dict): Square -> {destination: probability} for cards that move you
+
+    Returns:
+        sparse.csr_matrix: Row stochastic matrix
+    """
+    rows, cols, probs = list(range(n_states)), list(range(n_states)), [1.0] * n_states
+    for square, moves in card_moves.items():
+        probs[square] = 1 - sum(moves.values())
+        for destination, prob in moves.items():
+            rows.append(square)
+            cols.append(destination)
+            probs.append(prob)
+    cards = sparse.csr_matrix((probs, (rows, cols)), shape=(n_states, n_states))
+    cards.sum_duplicates()
+    return cards
+
+
+def land_matrix(spec: GameSpec) -> sparse.csr_matrix:
+    """Where mass that lands on each square ends up after jumps and cards"""
+    land = jump_matrix(resolve_jumps(spec.n_states, spec.jumps or {}))
+    if spec.card_moves:
+        land = land @ card_matrix(spec.n_states, spec.card_moves)
+    return land
+
+
+def compile_board(spec: GameSpec, format: str = "csr") -> sparse.spmatrix:
+    """Transition matrix of one turn
+
+    Args:
+        spec (GameSpec): Game rules
+        format (str, optional): scipy sparse format of the result. Defaults to "csr".
+
+    Returns:
+        sparse.spmatrix: n_states x n_states transition matrix
+    """
+    n_states = spec.n_states
+    land = land_matrix(spec)
+    stop, again = split_rolls(spec)
+
+    def step(pmf):
+        return step_matrix(n_states, pmf, spec.circular, spec.max_square, spec.overshoot, format="csr")
+
+    if not again.any():
+        turn = step(stop + again) @ land
+    else:
+        # build the turn from its last allowed roll backwards
+        ends = np.zeros(n_states, dtype=bool)
+        ends[list(spec.ends_turn)] = True
+        stop_moves = step(stop) @ land
+        again_steps = step(again)
+        again_ends = again_steps @ sparse.diags(ends.astype(float)) @ land
+        again_continues = again_steps @ sparse.diags((~ends).astype(float)) @ land
+        if spec.penalty_square is None:
+            turn = stop_moves + again_steps @ land
+        else:
+            penalty = sparse.csr_matrix((np.full(n_states, again.sum()),
+                                         (np.arange(n_states), np.full(n_states, spec.penalty_square))),
+                                        shape=(n_states, n_states))
+            turn = stop_moves + penalty
+        for _ in range(spec.max_extra_turns):
+            turn = stop_moves + again_ends + again_continues @ turn
+    turn = sparse.csr_matrix(turn)
+    turn.sum_duplicates()
+    turn.eliminate_zeros()
+    return turn.asformat(format)
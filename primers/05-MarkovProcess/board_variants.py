@@ -0,0 +1,115 @@
+"""Score many chutes and ladders layouts in one pass
+
+Every layout of the same size shares the die roll structure, only the jump map
+differs. A batch of layouts is stacked into one block diagonal sparse transition
+matrix, so a single sparse factorization gives the expected game length of every
+layout and a single mat-vec per turn advances all of them together.
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+from scipy import sparse
+
+from absorbing_chain import AbsorbingChain
+from chutes_n_ladders import CHUTES_SQUARES, LADDER_SQUARES, die_roll_structure, resolve_jumps
+
+BoardSpec = namedtuple("BoardSpec", ["n_squares", "chutes", "ladders"])
+LayoutScores = namedtuple("LayoutScores", ["expected_turns", "win_by_turn"])
+
+STANDARD_BOARD = BoardSpec(100, CHUTES_SQUARES, LADDER_SQUARES)
+
+
+def board_jumps(spec: BoardSpec) -> dict:
+    """Jump map of a board, chutes first and then ladders like make_transition_matrix
+
+    Args:
+        spec (BoardSpec): Board layout
+
+    Returns:
+        dict: Start square to end square
+    """
+    for start, end in list(spec.chutes.items()) + list(spec.ladders.items()):
+        if not (0 <= start <= spec.n_squares and 0 <= end <= spec.n_squares):
+            raise ValueError(f"jump {start} -> {end} is off a board of {spec.n_squares} squares")
+    return {**spec.chutes, **spec.ladders}
+
+
+def make_batch_transition_matrix(layouts: list, die_probs: np.ndarray = None) -> sparse.csr_matrix:
+    """Stack the transition matrices of several layouts into one block diagonal matrix
+
+    Args:
+        layouts (list[BoardSpec]): Layouts that all have the same number of squares
+        die_probs (np.ndarray, optional): Probability of rolling 1, 2, ... Defaults to a fair six sided die.
+
+    Returns:
+        sparse.csr_matrix: Block b holds the transition matrix of layouts[b]
+    """
+    n_squares = layouts[0].n_squares
+    if any(spec.n_squares != n_squares for spec in layouts):
+        raise ValueError("all layouts in a batch must have the same number of squares")
+    n_states = n_squares + 1
+    rows, cols, probs = die_roll_structure(n_squares, die_probs)
+
+    # one row of column destinations per layout, then offset each block
+    dest = np.stack([resolve_jumps(n_states, board_jumps(spec)) for spec in layouts])
+    offsets = (np.arange(len(layouts)) * n_states)[:, None]
+    batch_rows = (rows[None, :] + offsets).ravel()
+    batch_cols = (dest[:, cols] + offsets).ravel()
+    batch_probs = np.tile(probs, len(layouts))
+    size = len(layouts) * n_states
+    transition_mat = sparse.csr_matrix((batch_probs, (batch_rows, batch_cols)), shape=(size, size))
+    transition_mat.sum_duplicates()
+    transition_mat.eliminate_zeros()
+    return transition_mat
+
+
+def _score_batch(layouts: list, max_turns: int, die_probs: np.ndarray = None) -> LayoutScores:
+    """Score one batch of layouts that fits in a single block diagonal matrix"""
+    n_states = layouts[0].n_squares + 1
+    transition_mat = make_batch_transition_matrix(layouts, die_probs)
+    starts = np.arange(len(layouts)) * n_states
+
+    chain = AbsorbingChain(transition_mat)
+    expected = chain.expected_steps()[np.searchsorted(chain.transient, starts)]
+    # the same absorbing states expected_steps counts, whichever square they are on
+    absorbing_layout = chain.absorbing // n_states
+
+    transposed = transition_mat.T.tocsr()
+    state = np.zeros(transition_mat.shape[0])
+    state[starts] = 1
+    win_by_turn = np.empty((len(layouts), max_turns + 1))
+    for turn in range(max_turns + 1):
+        if turn:
+            state = transposed @ state
+        win_by_turn[:, turn] = np.bincount(absorbing_layout, weights=state[chain.absorbing], minlength=len(layouts))
+    return LayoutScores(expected, win_by_turn)
+
+
+def evaluate_layouts(layouts: list, max_turns: int = 100, die_probs: np.ndarray = None,
+                     processes: int = None, batch_size: int = 256) -> LayoutScores:
+    """Expected game length and probability of having won by each turn for many layouts
+
+    Args:
+        layouts (list[BoardSpec]): Layouts that all have the same number of squares
+        max_turns (int, optional): Last turn to report the win probability for. Defaults to 100.
+        die_probs (np.ndarray, optional): Probability of rolling 1, 2, ... Defaults to a fair six sided die.
+        processes (int, optional): Score batches on a pool of this many processes. Defaults to None,
+            which scores everything in this process.
+        batch_size (int, optional): Number of layouts stacked into one block diagonal matrix. Defaults to 256.
+
+    Returns:
+        LayoutScores: expected_turns of shape (n_layouts,), the expected number of turns until
+            absorption, and win_by_turn of shape (n_layouts, max_turns + 1), the probability of
+            having been absorbed, in any absorbing state, by each turn
+    """
+    layouts = list(layouts)
+    batches = [layouts[i:i + batch_size] for i in range(0, len(layouts), batch_size)]
+    if processes is None or len(batches) == 1:
+        results = [_score_batch(batch, max_turns, die_probs) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(_score_batch, batches, repeat(max_turns), repeat(die_probs)))
+    return LayoutScores(np.concatenate([result.expected_turns for result in results]),
+                        np.concatenate([result.win_by_turn for result in results]))
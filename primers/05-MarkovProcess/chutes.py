@@ -1,40 +1,25 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from celluloid import Camera
+from itertools import islice
+from absorbing_chain import AbsorbingChain
+from board_compiler import ONE_DIE, GameSpec, compile_board
+from chutes_n_ladders import iter_state_distributions
+from render import render_line_animation
 
 def make_transition_matrix(n_squares):
-    # extra square for death
-    base_row = np.zeros(n_squares + 1)
-    base_row[1:7] = 1/6
-    rows = [base_row]
-    for i in range(n_squares):
-        base_row = np.insert(base_row[:-1], 0, 0)
-        rows.append(base_row)
-    transition_mat = np.matrix(rows)
-    transition_mat[:,-1] = 0
-    for i in range(n_squares + 1):
-        transition_mat[i,i] = 1 - np.sum(transition_mat[i,:])
-    return transition_mat
+    # extra square for death, rolls onto or past it stay put
+    spec = GameSpec(n_squares + 1, ONE_DIE, max_square=n_squares - 1)
+    return np.matrix(compile_board(spec).toarray())
 
 def make_gif(transition_matrix, n_iterations, base_name):
     # Start at first square
     start_sqr = 0
-    state = np.zeros(len(transition_matrix))
+    state = np.zeros(transition_matrix.shape[0])
     state[start_sqr] = 1
-    state = np.matrix([state])
-
-    fig = plt.figure()
-    camera = Camera(fig)
-    for i in range(n_iterations):
-        # Need this in order to plot properly
-        state = np.asarray(state).flatten()
-        plt.plot(state, 'b')
-        plt.ylim([0, 1])
-        camera.snap()
-        state = state * transition_matrix
-    print(state)
-    animation = camera.animate()
-    animation.save(base_name + '.gif', writer="imagemagick")
+    # frames are appended to the gif from one line artist as they are drawn, and like
+    # the original loop it draws n_iterations frames and prints the state after them
+    states = iter_state_distributions(transition_matrix, state, n_iterations)
+    render_line_animation(islice(states, n_iterations), base_name + '.gif', ylim=(0, 1))
+    print(next(states))
 
 def add_chutes_ladders(transition_matrix, chutes_ladders):
     for start, end in chutes_ladders:
@@ -42,35 +27,45 @@ def add_chutes_ladders(transition_matrix, chutes_ladders):
         transition_matrix[:, start] = 0
     return transition_matrix
 
-def average_turns(transition_matrix, n_iterations=1000):
-    state = np.zeros(len(transition_matrix))
-    state[0] = 1
-    state = np.matrix([state])
-    prob_done = [state[0, -1]]
-    for i in range(n_iterations):
-        state = state * transition_matrix
-        prob_done.append(state[0, -1])
-    prob_finish_turn = np.diff(prob_done)
-    mean_turns = 0
-    for i in range(n_iterations):
-        mean_turns += (i+1) * prob_finish_turn[i]
-    return mean_turns
+def average_turns(transition_matrix, n_iterations=None, tol=1e-12):
+    """
+    Expected turn on which a game started on the first square reaches the last state,
+    counting games that never get there as zero, i.e. sum_k k * P(reach it on turn k)
+    :param transition_matrix: transition matrix whose last state is absorbing
+    :param n_iterations: only count the first n_iterations turns, stepping the distribution
+        like before, None for the exact sum over every turn
+    :param tol: with n_iterations, stop stepping once the distribution changes less than this
+    :return: expected number of turns
+    """
+    n_states = transition_matrix.shape[0]
+    if n_iterations is not None:
+        state = np.zeros(n_states)
+        state[0] = 1
+        # stop once (almost) every game has been absorbed
+        prob_done = [state[-1] for state in iter_state_distributions(transition_matrix, state, n_iterations, tol)]
+        prob_finish_turn = np.diff(prob_done)
+        return np.arange(1, len(prob_finish_turn) + 1) @ prob_finish_turn
+    chain = AbsorbingChain(transition_matrix)
+    last = np.searchsorted(chain.absorbing, n_states - 1)
+    if last == len(chain.absorbing) or chain.absorbing[last] != n_states - 1:
+        raise ValueError(f"the last state {n_states - 1} is not absorbing")
+    # sum_k k Q^(k-1) R = N N R, two solves against the same factorization
+    reach_last = chain.solve(chain.solve(chain.R[:, [last]]))
+    return float(reach_last[chain.transient_index(0), 0])
 
-np.set_printoptions(precision=3, suppress=True, linewidth=200)
-n_squares = 10
-chutes_ladders = [(6, n_squares)]
-transition_mat = make_transition_matrix(n_squares)
-transition_mat = add_chutes_ladders(transition_mat, chutes_ladders)
+if __name__ == '__main__':
+    np.set_printoptions(precision=3, suppress=True, linewidth=200)
+    n_squares = 10
+    chutes_ladders = [(6, n_squares)]
+    transition_mat = make_transition_matrix(n_squares)
+    transition_mat = add_chutes_ladders(transition_mat, chutes_ladders)
 
-Q = transition_mat[:n_squares-1, :n_squares-1]
-R = transition_mat[:n_squares-1, n_squares-1:]
-# print(transition_mat)
-# print(Q)
-# print(R)
-N = np.linalg.inv(np.eye(n_squares+1 - 2) - Q)
-print(N*R)
-print(transition_mat**100)
+    # transient and absorbing states are detected from the matrix, no hand slicing of Q and R
+    chain = AbsorbingChain(transition_mat)
+    print(chain.absorption_probabilities())
+    print(transition_mat**100)
 
-# print(transition_mat)
-# print(average_turns(transition_mat))
-# make_gif(transition_mat, 100, "chutes_death")
+    # print(transition_mat)
+    # print(average_turns(transition_mat))
+    # print(chain.expected_turns())
+    # make_gif(transition_mat, 100, "chutes_death")
@@ -2,6 +2,10 @@
 
 import numpy as np
 import matplotlib.pyplot as plt
+from scipy import sparse
+
+from board_compiler import DiceSpec, GameSpec, compile_board, resolve_jumps, step_matrix
+from render import board_position, board_square_labels, render_board_animation, snake_board
 
 LADDER_SQUARES = {
     1: 38,
@@ -32,48 +36,75 @@ def add_chutes_ladders(transition_matrix: np.matrix, chutes_ladders: dict) -> np
     """Add chutes and ladders to the transition matrix
 
     Args:
-        transition_matrix (np.matrix): Transition matrix
+        transition_matrix (np.matrix | sparse.csr_matrix): Transition matrix
         chutes_ladders (dict): Chutes and ladders
 
     Returns:
-        np.matrix: Transition matrix with chutes and ladders
+        np.matrix | sparse.csr_matrix: Transition matrix with chutes and ladders
     """
+    if sparse.issparse(transition_matrix):
+        # When you land on 'start', you immediately go to 'end', so every column
+        # index is relabelled in one pass and duplicates are summed by CSR
+        dest = resolve_jumps(transition_matrix.shape[1], chutes_ladders)
+        coo = transition_matrix.tocoo()
+        return sparse.csr_matrix((coo.data, (coo.row, dest[coo.col])), shape=coo.shape)
     for start, end in chutes_ladders.items():
-        # When you land on 'start', you immediately go to 'end'
-        # So we need to redirect all transitions that would lead to 'start'
-        # to instead lead to 'end'
-        for i in range(transition_matrix.shape[0]):
-            # If there's a probability to move from square i to start
-            if transition_matrix[i, start] > 0:
-                # Add that probability to moving from i to end instead
-                transition_matrix[i, end] += transition_matrix[i, start]
-                # Remove the probability of moving from i to start
-                transition_matrix[i, start] = 0
+        # Redirect all transitions that would lead to 'start' to instead lead to 'end'
+        transition_matrix[:, end] += transition_matrix[:, start]
+        transition_matrix[:, start] = 0
     return transition_matrix
 
-def make_transition_matrix(n_squares: int) -> np.matrix :
+def die_roll_structure(n_squares: int, die_probs: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Coordinates of the die roll moves before any chutes or ladders are applied
+
+    Args:
+        n_squares (int): Number of squares
+        die_probs (np.ndarray, optional): Probability of rolling 1, 2, ... Defaults to a fair six sided die.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray, np.ndarray]: Row, column and probability of every move
+    """
+    # index i of die_probs is a roll of i + 1, the compiler indexes by the total itself
+    pmf = np.concatenate([[0.0], np.full(6, 1 / 6) if die_probs is None else np.asarray(die_probs, dtype=float)])
+    # extra square for death: rolls onto or past it leave the player where they are
+    moves = step_matrix(n_squares + 1, pmf, max_square=n_squares - 1).tocoo()
+    return moves.row, moves.col, moves.data
+
+def make_sparse_transition_matrix(n_squares: int, chutes_ladders: dict = None,
+                                  die_probs: np.ndarray = None) -> sparse.csr_matrix:
+    """Make the transition matrix for a game of chutes and ladders in CSR format
+
+    The matrix is built directly from the die distribution and the jump map, so
+    it takes O(n_squares * n_faces) time and memory instead of O(n_squares ** 2).
+
+    Args:
+        n_squares (int): Number of squares
+        chutes_ladders (dict, optional): Chutes and ladders. Defaults to the standard board.
+        die_probs (np.ndarray, optional): Probability of rolling 1, 2, ... Defaults to a fair six sided die.
+
+    Returns:
+        sparse.csr_matrix: Transition matrix
+    """
+    if chutes_ladders is None:
+        chutes_ladders = {**CHUTES_SQUARES, **LADDER_SQUARES}
+    dice = DiceSpec() if die_probs is None else DiceSpec(1, len(die_probs), die_probs)
+    # extra square for death: rolls onto or past it leave the player where they are
+    return compile_board(GameSpec(n_squares + 1, dice, chutes_ladders, max_square=n_squares - 1))
+
+def make_transition_matrix(n_squares: int, sparse_format: bool = False) -> np.matrix :
     """Make the transition matrix for a game of chutes and ladders
 
     Args:
         n_squares (int): Number of squares
+        sparse_format (bool, optional): If True, return a CSR matrix. Defaults to False.
 
     Returns:
-        np.matrix: Transition matrix
+        np.matrix | sparse.csr_matrix: Transition matrix
     """
-    # extra square for death
-    base_row = np.zeros(n_squares + 1)
-    base_row[1:7] = 1/6
-    rows = [base_row]
-    for i in range(n_squares):
-        base_row = np.insert(base_row[:-1], 0, 0)
-        rows.append(base_row)
-    transition_mat = np.matrix(rows)
-    transition_mat[:,-1] = 0
-    for i in range(n_squares + 1):
-        transition_mat[i,i] = 1 - np.sum(transition_mat[i,:])
-    transition_mat = add_chutes_ladders(transition_mat, CHUTES_SQUARES)
-    transition_mat = add_chutes_ladders(transition_mat, LADDER_SQUARES)
-    return transition_mat
+    transition_mat = make_sparse_transition_matrix(n_squares)
+    if sparse_format:
+        return transition_mat
+    return np.matrix(transition_mat.toarray())
 
 def create_initial_state(n_squares: int) -> np.matrix:
     """Create the initial state for a game of chutes and ladders
@@ -92,15 +123,54 @@ def find_nth_turn(transition_matrix: np.matrix, initial_state: np.matrix, n_turn
     """Find the probability of finishing the game on the nth turn
 
     Args:
-        transition_matrix (np.matrix): Transition matrix
+        transition_matrix (np.matrix | sparse.csr_matrix): Transition matrix
         initial_state (np.matrix): Initial state
         n_turns (int): Number of turns
 
     Returns:
         float: Probability of finishing the game on the nth turn
     """
+    if sparse.issparse(transition_matrix):
+        # A sparse matrix power fills in, so push the state vector through instead
+        state = np.asarray(initial_state, dtype=float).ravel()
+        transposed = transition_matrix.T.tocsr()
+        for _ in range(n_turns):
+            state = transposed @ state
+        return state.reshape(-1, 1)
     return np.linalg.matrix_power(transition_matrix.T, n_turns) * initial_state.T
 
+def iter_state_distributions(transition_matrix: np.matrix, initial_state: np.matrix, max_turns: int,
+                             tol: float = None):
+    """Yield the distribution over squares after 0, 1, ..., max_turns turns
+
+    Each turn costs one vector-matrix product, so streaming T turns is O(T * nnz)
+    instead of computing a fresh matrix power for every turn.
+
+    Args:
+        transition_matrix (np.matrix | sparse.csr_matrix): Transition matrix
+        initial_state (np.matrix): Initial state
+        max_turns (int): Number of turns to advance
+        tol (float, optional): Stop early once less than tol of the mass is outside
+            the absorbing states. Defaults to None, which never stops early.
+
+    Yields:
+        np.ndarray: Flat state distribution for the current turn
+    """
+    if sparse.issparse(transition_matrix):
+        transposed = transition_matrix.T.tocsr()
+        diagonal = transition_matrix.diagonal()
+    else:
+        transposed = np.asarray(transition_matrix).T
+        diagonal = np.diagonal(transposed)
+    absorbing = np.isclose(diagonal, 1)
+    state = np.asarray(initial_state, dtype=float).ravel()
+    for turn in range(max_turns + 1):
+        yield state
+        if tol is not None and 1 - state[absorbing].sum() < tol:
+            return
+        if turn < max_turns:
+            state = transposed @ state
+
 def visualize_nth_turn(transition_matrix: np.matrix, initial_state: np.matrix, n_turns: int, use_opacity: bool = True) -> None:
     """Visualize the state of the game after n
     turns by plotting the state as a heatmap resembling the board
@@ -116,22 +186,9 @@ def visualize_nth_turn(transition_matrix: np.matrix, initial_state: np.matrix, n
     state = find_nth_turn(transition_matrix, initial_state, n_turns)[1:]
     state = np.array(state).flatten()  # Convert to flat array for easier indexing
     
-    # Create a 10x10 board with proper snake pattern
-    board = np.zeros((10, 10))
-    square_labels = np.zeros((10, 10), dtype=object)
-    
-    for i in range(10):
-        row = i  # Start from top row (0) and go down
-        if i % 2 == 0:  # Even rows go left to right (1-10, 21-30, etc.)
-            for j in range(10):
-                square_num = i * 10 + j + 1
-                board[row, j] = state[square_num - 1]  # -1 for 0-indexing
-                square_labels[row, j] = str(square_num)
-        else:  # Odd rows go right to left (11-20, 31-40, etc.)
-            for j in range(10):
-                square_num = (i + 1) * 10 - j
-                board[row, j] = state[square_num - 1]  # -1 for 0-indexing
-                square_labels[row, j] = str(square_num)
+    # Lay the squares out like the board, odd rows run right to left
+    board = snake_board(state)
+    square_labels = board_square_labels()
     
     # Create a heatmap with plotly
     if use_opacity:
@@ -174,39 +231,17 @@ def animate_game_states(transition_matrix: np.matrix, initial_state: np.matrix,
     """
     import plotly.graph_objects as go
     
-    # Create a 10x10 board with proper snake pattern
-    square_labels = np.zeros((10, 10), dtype=object)
-    
-    for i in range(10):
-        row = i  # Start from top row (0) and go down
-        if i % 2 == 0:  # Even rows go left to right (1-10, 21-30, etc.)
-            for j in range(10):
-                square_num = i * 10 + j + 1
-                square_labels[row, j] = str(square_num)
-        else:  # Odd rows go right to left (11-20, 31-40, etc.)
-            for j in range(10):
-                square_num = (i + 1) * 10 - j
-                square_labels[row, j] = str(square_num)
+    # Lay the squares out like the board, odd rows run right to left
+    square_labels = board_square_labels()
     
     # Set colorscale based on visualization type
     colorscale = [[0, 'rgba(0,0,255,0)'], [1, 'rgba(0,0,255,1)']] if use_opacity else "Blues"
     
     # Create frames for each turn
     frames = []
-    for turn in range(max_turns + 1):
-        state = find_nth_turn(transition_matrix, initial_state, turn)[1:]
-        state = np.array(state).flatten()  # Convert to flat array for easier indexing
-        
-        board = np.zeros((10, 10))
-        for i in range(10):
-            if i % 2 == 0:  # Even rows go left to right
-                for j in range(10):
-                    square_num = i * 10 + j + 1
-                    board[i, j] = state[square_num - 1]  # -1 for 0-indexing
-            else:  # Odd rows go right to left
-                for j in range(10):
-                    square_num = (i + 1) * 10 - j
-                    board[i, j] = state[square_num - 1]  # -1 for 0-indexing
+    for turn, state in enumerate(iter_state_distributions(transition_matrix, initial_state, max_turns)):
+        state = state[1:]
+        board = snake_board(state)
         
         frames.append(
             go.Frame(
@@ -227,16 +262,7 @@ def animate_game_states(transition_matrix: np.matrix, initial_state: np.matrix,
     
     # Initial state for the figure
     initial_state_array = np.array(initial_state).flatten()[1:]
-    initial_board = np.zeros((10, 10))
-    for i in range(10):
-        if i % 2 == 0:
-            for j in range(10):
-                square_num = i * 10 + j + 1
-                initial_board[i, j] = initial_state_array[square_num - 1]
-        else:
-            for j in range(10):
-                square_num = (i + 1) * 10 - j
-                initial_board[i, j] = initial_state_array[square_num - 1]
+    initial_board = snake_board(initial_state_array)
     
     fig = go.Figure(
         data=[go.Heatmap(
@@ -297,13 +323,8 @@ def animate_game_states(transition_matrix: np.matrix, initial_state: np.matrix,
     
     # Add markers for chutes and ladders
     for start, end in LADDER_SQUARES.items():
-        start_row, start_col = (start - 1) // 10, (start - 1) % 10
-        if start_row % 2 == 1:  # Odd rows go right to left
-            start_col = 9 - start_col
-            
-        end_row, end_col = (end - 1) // 10, (end - 1) % 10
-        if end_row % 2 == 1:  # Odd rows go right to left
-            end_col = 9 - end_col
+        start_row, start_col = board_position(start)
+        end_row, end_col = board_position(end)
         fig.add_shape(
             type="line",
             x0=start_col,
@@ -315,14 +336,8 @@ def animate_game_states(transition_matrix: np.matrix, initial_state: np.matrix,
         )
     
     for start, end in CHUTES_SQUARES.items():
-        start_row, start_col = (start - 1) // 10, (start - 1) % 10
-        if start_row % 2 == 1:  # Odd rows go right to left
-            start_col = 9 - start_col
-            
-        end_row, end_col = (end - 1) // 10, (end - 1) % 10
-        if end_row % 2 == 1:  # Odd rows go right to left
-            end_col = 9 - end_col
-            
+        start_row, start_col = board_position(start)
+        end_row, end_col = board_position(end)
         fig.add_shape(
             type="line",
             x0=start_col,
@@ -335,12 +350,30 @@ def animate_game_states(transition_matrix: np.matrix, initial_state: np.matrix,
     
     fig.show()
 
+def save_game_states(transition_matrix: np.matrix, initial_state: np.matrix, path: str, max_turns: int = 20) -> None:
+    """Write the game states as a board heatmap animation without a display
+
+    Frames are streamed to disk one turn at a time, so memory does not grow with max_turns.
+
+    Args:
+        transition_matrix (np.matrix | sparse.csr_matrix): Transition matrix
+        initial_state (np.matrix): Initial state
+        path (str): Output file, .gif, .mp4 or .npz for the raw distributions
+        max_turns (int, optional): Maximum number of turns to render. Defaults to 20.
+    """
+    render_board_animation(iter_state_distributions(transition_matrix, initial_state, max_turns), path)
+
 def visualize_transition_matrix(transition_matrix: np.matrix) -> None:
     """Visualize the transition matrix as a heatmap
 
     Args:
-        transition_matrix (np.matrix): Transition matrix
+        transition_matrix (np.matrix | sparse.csr_matrix): Transition matrix
     """
+    if sparse.issparse(transition_matrix):
+        # Only the sparsity pattern is readable on boards with thousands of squares
+        plt.spy(transition_matrix, markersize=1)
+        plt.show()
+        return
     plt.imshow(transition_matrix)
     plt.colorbar()
     plt.show()
@@ -1,55 +1,144 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from celluloid import Camera
-from collections import Counter
+from itertools import islice
+from collections import namedtuple
+from scipy import sparse
+from scipy.sparse.linalg import eigs, spsolve
+
+from board_compiler import TWO_DICE, GameSpec, compile_board, roll_distribution, step_matrix
+from chutes_n_ladders import iter_state_distributions
+from render import render_line_animation
+
+GO_TO_JAIL = 30
+JAIL = 10
+# Chance (7, 22, 36) and Community Chest (2, 17, 33) cards that move you, out of 16 each.
+# Nearest railroad appears twice on the chance deck.
+CARD_MOVES = {
+    2: {0: 1 / 16, JAIL: 1 / 16},
+    17: {0: 1 / 16, JAIL: 1 / 16},
+    33: {0: 1 / 16, JAIL: 1 / 16},
+    7: {0: 1 / 16, JAIL: 1 / 16, 11: 1 / 16, 24: 1 / 16, 39: 1 / 16, 5: 1 / 16, 4: 1 / 16, 15: 2 / 16, 12: 1 / 16},
+    22: {0: 1 / 16, JAIL: 1 / 16, 11: 1 / 16, 24: 1 / 16, 39: 1 / 16, 5: 1 / 16, 19: 1 / 16, 25: 2 / 16, 28: 1 / 16},
+    36: {0: 1 / 16, JAIL: 1 / 16, 11: 1 / 16, 24: 1 / 16, 39: 1 / 16, 5: 2 / 16, 33: 1 / 16, 12: 1 / 16},
+}
+
+StationaryResult = namedtuple("StationaryResult", ["distribution", "iterations", "residual", "method", "converges"],
+                              defaults=[None])
 
 
 def get_probabilities():
     """
     Gets probabilities for dice rolls for two dice
-    :return: list of probabilities
+    :return: list of probabilities indexed by the total
     """
-    vals = np.arange(1, 7)
-    probs = Counter([i + j for i in vals for j in vals])
-    return [0, 0] + [count / 36 for count in probs.values()]
+    return roll_distribution(TWO_DICE).tolist()
 
 
 def make_transition_matrix(n_squares: int):
     """ creates transition matrix for monopoly game with n_squares
     n_squares
     """
-    base_row = np.zeros(n_squares + 1)
-    base_row[0:13] = get_probabilities()
-    rows = [base_row]
-    for i in range(n_squares):
-        base_row = np.insert(base_row[:-1], 0, 0)
-        rows.append(base_row)
-    transition_mat = np.matrix(rows)
-    # for i in range(n_squares + 1):
-    #     transition_mat[i, i] = 1 - np.sum(transition_mat[i, :])
-    return transition_mat
+    # rolls past the last square are dropped, not wrapped
+    steps = step_matrix(n_squares + 1, roll_distribution(TWO_DICE), overshoot="drop")
+    return np.matrix(steps.toarray())
+
+def make_board_transition_matrix(n_squares: int = 40, go_to_jail: int = GO_TO_JAIL, jail: int = JAIL,
+                                 card_moves: dict = None, doubles_to_jail: bool = False):
+    """ creates the transition matrix of a circular monopoly board in CSR format
+    :param n_squares: number of squares around the board
+    :param go_to_jail: square that sends you to jail, None for a board without one
+    :param jail: jail square
+    :param card_moves: square -> {destination: probability} for cards that move you, None for no cards
+    :param doubles_to_jail: doubles roll again and a third double in one turn goes to jail
+    :return: sparse.csr_matrix transition matrix
+    """
+    jumps = {} if go_to_jail is None else {go_to_jail: jail}
+    spec = GameSpec(n_squares, TWO_DICE, jumps, card_moves, circular=True)
+    if doubles_to_jail:
+        spec = spec._replace(extra_turn_on_doubles=True, max_extra_turns=2, penalty_square=jail,
+                             ends_turn=tuple(jumps))
+    return compile_board(spec)
+
+
+def stationary_distribution(transition_matrix, method: str = "power", tol: float = 1e-12,
+                            max_iterations: int = 10_000) -> StationaryResult:
+    """ solves pi P = pi for the long run share of turns spent on each square
+    :param transition_matrix: row stochastic transition matrix, dense or sparse
+    :param method: "power" for power iteration, "direct" for a sparse linear solve,
+        "eigen" for the leading left eigenvector or "circulant" for the analytic answer on a
+        circulant matrix, no solve at all
+    :param tol: power iteration stops once successive distributions differ by less than tol
+    :param max_iterations: cap on the number of power iterations
+    :return: StationaryResult with the distribution, iterations used and the residual |pi P - pi|_1,
+        for "circulant" also whether the chain converges to it from every start (False if it is
+        periodic or reducible, the uniform distribution is stationary either way)
+    """
+    P = sparse.csr_matrix(transition_matrix)
+    n_states = P.shape[0]
+    iterations, converges = 0, None
+    if method == "power":
+        P_T = P.T.tocsr()
+        pi = np.full(n_states, 1 / n_states)
+        for iterations in range(1, max_iterations + 1):
+            new_pi = P_T @ pi
+            converged = np.abs(new_pi - pi).sum() < tol
+            pi = new_pi
+            if converged:
+                break
+    elif method == "direct":
+        # (P^T - I) pi = 0 is singular, so swap one equation for sum(pi) = 1
+        A = (P.T - sparse.identity(n_states)).tolil()
+        A[0, :] = 1
+        b = np.zeros(n_states)
+        b[0] = 1
+        pi = spsolve(A.tocsc(), b)
+    elif method == "eigen":
+        if n_states > 2:
+            # shift-invert just above 1 picks out the eigenvalue 1
+            _, vectors = eigs(P.T, k=1, sigma=1.0 + 1e-9)
+        else:
+            values, vectors = np.linalg.eig(P.T.toarray())
+            vectors = vectors[:, [np.argmin(np.abs(values - 1))]]
+        pi = np.real(vectors[:, 0])
+    elif method == "circulant":
+        first_row = P.getrow(0).toarray().ravel()
+        # circulant: every stored entry equals the first row's entry at the same offset
+        # (col - row) mod n, and every row stores as many entries as the first
+        entries = P.tocoo()
+        entries.sum_duplicates()
+        entries.eliminate_zeros()
+        offsets = (entries.col - entries.row) % n_states
+        if entries.nnz != n_states * np.count_nonzero(first_row) or \
+                not np.allclose(entries.data, first_row[offsets]):
+            raise ValueError("the circulant method only works for circulant matrices")
+        # a circulant matrix is doubly stochastic, so the uniform distribution is stationary.
+        # Its eigenvalues are the discrete Fourier transform of the first row, sum_s p_s w^(ks) for the offsets s it
+        # moves by, and one other than k = 0 has modulus 1 iff n divides k (s - s_0) for every s,
+        # so the chain converges from every start iff gcd(n, s - s_0) is 1. Exact, unlike
+        # checking the moduli, which are within round off of 1 on big boards
+        steps = np.flatnonzero(first_row)
+        converges = bool(np.gcd.reduce(np.append(steps - steps[0], n_states)) == 1)
+        pi = np.full(n_states, 1 / n_states)
+    else:
+        raise ValueError(f"unknown method {method}")
+    pi = pi / pi.sum()
+    residual = np.abs(P.T @ pi - pi).sum()
+    return StationaryResult(pi, iterations, residual, method, converges)
+
 
 def make_gif(transition_matrix, n_iterations, base_name):
     # Start at first square
     start_sqr = 0
-    state = np.zeros(len(transition_matrix))
+    state = np.zeros(transition_matrix.shape[0])
     state[start_sqr] = 1
-    state = np.matrix([state])
-
-    fig = plt.figure()
-    camera = Camera(fig)
-    for i in range(n_iterations):
-        # Need this in order to plot properly
-        state = np.asarray(state).flatten()
-        plt.plot(state, 'b')
-        plt.ylim([0, .2])
-        camera.snap()
-        state = state * transition_matrix
-    print(state)
-    animation = camera.animate()
-    animation.save(base_name + '.gif', writer="imagemagick")
+    # frames are appended to the gif from one line artist as they are drawn, and like
+    # the original loop it draws n_iterations frames and prints the state after them
+    states = iter_state_distributions(transition_matrix, state, n_iterations)
+    render_line_animation(islice(states, n_iterations), base_name + '.gif', ylim=(0, .2))
+    print(next(states))
 
 if __name__ == '__main__':
     np.set_printoptions(precision=3, suppress=True, linewidth=200)
+    board = make_board_transition_matrix(card_moves=CARD_MOVES)
+    print(stationary_distribution(board, method="direct").distribution)
     trans_mat = make_transition_matrix(40)
     make_gif(trans_mat,500,"monopoly")
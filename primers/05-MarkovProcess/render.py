@@ -0,0 +1,230 @@
+"""Headless, streaming renderers for sequences of state distributions
+
+Frames are written to disk as they are produced, so memory stays flat no matter how
+many turns are rendered. The figure is drawn on an Agg canvas without pyplot, which
+works on servers without a display, and a single artist is updated in place every
+frame instead of re-plotting.
+"""
+import io
+import struct
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from matplotlib.animation import FFMpegWriter
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from PIL import Image
+
+
+def snake_board(values: np.ndarray, width: int = 10) -> np.ndarray:
+    """Lay squares 1, 2, ... out like the board, odd rows running right to left
+
+    Args:
+        values (np.ndarray): One value per square, square 1 first
+        width (int, optional): Squares per row. Defaults to 10.
+
+    Returns:
+        np.ndarray: Array of shape (n_rows, width) with row 0 holding squares 1 to width
+    """
+    values = np.asarray(values).ravel()
+    board = values.reshape(-1, width).copy()
+    board[1::2] = board[1::2, ::-1]
+    return board
+
+
+def board_square_labels(n_squares: int = 100, width: int = 10) -> np.ndarray:
+    """Square numbers laid out like snake_board, as strings for heatmap annotations"""
+    return snake_board(np.arange(1, n_squares + 1), width).astype(str).astype(object)
+
+
+def board_position(square: int, width: int = 10) -> tuple[int, int]:
+    """Row and column of a square on the snake board
+
+    Args:
+        square (int): Square number, starting at 1
+        width (int, optional): Squares per row. Defaults to 10.
+
+    Returns:
+        tuple[int, int]: Row and column
+    """
+    row, col = divmod(square - 1, width)
+    if row % 2 == 1:
+        col = width - 1 - col
+    return row, col
+
+
+class GifWriter:
+    """Appends every frame to the GIF file as it is grabbed
+
+    matplotlib's PillowWriter, like Image.save(save_all=True), keeps all frames until the
+    end. Here the GIF blocks are written directly: the palette is taken from the first
+    frame and written once as the global color table, then each frame is mapped onto it,
+    LZW encoded by saving it on its own with Image.save, and its image block is copied to
+    the file behind a graphic control block with the frame delay. Memory doesn't grow
+    with the number of frames. Same saving / grab_frame interface as matplotlib's writers.
+
+    Args:
+        fps (int): Frames per second
+    """
+
+    def __init__(self, fps: int):
+        self.fps = fps
+        self._file = None
+        self._palette = None
+
+    @contextmanager
+    def saving(self, fig: Figure, path: str, dpi: int):
+        self._fig = fig
+        fig.set_dpi(dpi)
+        self._file = open(path, "wb")
+        try:
+            yield self
+            self._file.write(b";")
+        finally:
+            self._file.close()
+            self._file, self._palette = None, None
+
+    def grab_frame(self) -> None:
+        self._fig.canvas.draw()
+        frame = Image.fromarray(np.asarray(self._fig.canvas.buffer_rgba())[..., :3])
+        if self._palette is None:
+            self._palette = frame.quantize(colors=256)
+            self._write_header(frame.size)
+        indexed = frame.quantize(palette=self._palette, dither=Image.Dither.NONE)
+        encoded = io.BytesIO()
+        indexed.save(encoded, "GIF", optimize=False)
+        delay = round(100 / self.fps)
+        # graphic control extension: leave the frame in place, delay in hundredths of a second
+        self._file.write(b"!\xf9\x04\x04" + struct.pack("<H", delay) + b"\x00\x00")
+        self._file.write(_image_block(encoded.getvalue()))
+
+    def _write_header(self, size: tuple[int, int]) -> None:
+        colors = bytes(self._palette.getpalette()[:768]).ljust(768, b"\x00")
+        # logical screen with a 256 color global table, then loop forever
+        self._file.write(b"GIF89a" + struct.pack("<HHBBB", *size, 0xF7, 0, 0) + colors)
+        self._file.write(b"!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+
+def _image_block(gif: bytes) -> bytes:
+    """Image descriptor, local color table if any and LZW data of the first frame of a GIF file"""
+    position = 13 + _color_table_size(gif[10])
+    while gif[position] == 0x21:
+        # extension: introducer, label and data sub-blocks
+        position = _skip_sub_blocks(gif, position + 2)
+    if gif[position] != 0x2C:
+        raise ValueError("no image in the GIF data")
+    start = position
+    position += 10 + _color_table_size(gif[position + 9])
+    # one byte of minimum LZW code size, then the data sub-blocks
+    return gif[start:_skip_sub_blocks(gif, position + 1)]
+
+
+def _color_table_size(flags: int) -> int:
+    return 3 << ((flags & 7) + 1) if flags & 0x80 else 0
+
+
+def _skip_sub_blocks(data: bytes, position: int) -> int:
+    while data[position]:
+        position += data[position] + 1
+    return position + 1
+
+
+def _movie_writer(path: Path, fps: int):
+    if path.suffix == ".gif":
+        return GifWriter(fps=fps)
+    if path.suffix == ".mp4":
+        return FFMpegWriter(fps=fps)
+    raise ValueError(f"unsupported animation format {path.suffix}")
+
+
+def save_distributions(states, path: str, dtype=np.float32) -> np.ndarray:
+    """Stream distributions into an .npz archive, one array per frame
+
+    Args:
+        states (Iterable[np.ndarray]): Distributions, e.g. from iter_state_distributions
+        path (str): Output .npz file, frames are stored as frame_00000, frame_00001, ...
+        dtype (np.dtype, optional): Storage type. Defaults to np.float32.
+
+    Returns:
+        np.ndarray: The last distribution written
+    """
+    state = None
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for frame, state in enumerate(states):
+            with archive.open(f"frame_{frame:05d}.npy", "w") as member:
+                np.lib.format.write_array(member, np.asarray(state, dtype=dtype).ravel())
+    return state
+
+
+def render_line_animation(states, path: str, ylim: tuple = (0, 1), fps: int = 10, dpi: int = 100):
+    """Write distributions as a line plot animation, one frame per distribution
+
+    Args:
+        states (Iterable[np.ndarray]): Distributions, e.g. from iter_state_distributions
+        path (str): Output file, .gif, .mp4 or .npz
+        ylim (tuple, optional): Limits of the y axis. Defaults to (0, 1).
+        fps (int, optional): Frames per second. Defaults to 10.
+        dpi (int, optional): Resolution. Defaults to 100.
+
+    Returns:
+        np.ndarray: The last distribution rendered
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        return save_distributions(states, path)
+    states = iter(states)
+    state = np.asarray(next(states)).ravel()
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    line, = ax.plot(state, 'b')
+    ax.set_ylim(ylim)
+    writer = _movie_writer(path, fps)
+    with writer.saving(fig, str(path), dpi):
+        writer.grab_frame()
+        for state in states:
+            line.set_ydata(np.asarray(state).ravel())
+            writer.grab_frame()
+    return state
+
+
+def render_board_animation(states, path: str, width: int = 10, vmax: float = 0.3, fps: int = 2,
+                           dpi: int = 100):
+    """Write distributions as a heatmap of the snake board, one frame per distribution
+
+    Args:
+        states (Iterable[np.ndarray]): Distributions over the start square and squares 1 to n
+        path (str): Output file, .gif, .mp4 or .npz
+        width (int, optional): Squares per row. Defaults to 10.
+        vmax (float, optional): Top of the color scale. Defaults to 0.3.
+        fps (int, optional): Frames per second. Defaults to 2.
+        dpi (int, optional): Resolution. Defaults to 100.
+
+    Returns:
+        np.ndarray: The last distribution rendered
+    """
+    path = Path(path)
+    if path.suffix == ".npz":
+        return save_distributions(states, path)
+    states = iter(states)
+    state = np.asarray(next(states)).ravel()
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_axis_off()
+    image = ax.imshow(snake_board(state[1:], width), cmap="Blues", vmin=0, vmax=vmax)
+    fig.colorbar(image, ax=ax, label="Probability")
+    title = ax.set_title("State after 0 turns")
+    writer = _movie_writer(path, fps)
+    with writer.saving(fig, str(path), dpi):
+        writer.grab_frame()
+        for turn, state in enumerate(states, start=1):
+            image.set_data(snake_board(np.asarray(state).ravel()[1:], width))
+            title.set_text(f"State after {turn} turns")
+            writer.grab_frame()
+    return state
+
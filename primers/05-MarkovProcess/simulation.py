@@ -0,0 +1,274 @@
+"""Monte Carlo simulation of chutes and ladders and monopoly
+
+Every game is one entry of a NumPy position array and all games advance together each
+turn, rolling again on a 6 or on doubles within the turn. Those extra rolls depend on
+what was rolled earlier in the same turn, but board_compiler folds them into a single
+turn of a chain, so compare_with_chain can check any RuleSet against the exact answer.
+A game finishes when it reaches any absorbing square of that chain, the same definition
+AbsorbingChain and board_variants use, so games stuck on a square that every roll
+overshoots retire at once instead of running to max_turns.
+Work is split into shards with independent seeds spawned from one SeedSequence, so
+no two processes ever draw from overlapping random streams.
+"""
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from statistics import NormalDist
+
+import numpy as np
+
+from absorbing_chain import find_absorbing_states
+from board_compiler import DiceSpec, GameSpec, compile_board, resolve_jumps
+from board_variants import STANDARD_BOARD, board_jumps
+from chutes_n_ladders import iter_state_distributions
+
+RuleSet = namedtuple("RuleSet", ["n_dice", "n_faces", "extra_turn_totals", "extra_turn_on_doubles",
+                                 "max_extra_turns"], defaults=[1, 6, (), False, 2])
+FinishTimeReport = namedtuple("FinishTimeReport", ["counts", "pmf", "lower", "upper", "unfinished",
+                                                   "mean_turns", "elapsed", "games_per_second"])
+OccupancyReport = namedtuple("OccupancyReport", ["visits", "frequencies", "elapsed", "games_per_second"])
+
+CHUTES_RULES = RuleSet()
+# docs/chutesandladdersrules.md: extra turn on a 6 and on doubles
+HOUSE_RULES = RuleSet(n_dice=2, extra_turn_totals=(6,), extra_turn_on_doubles=True)
+# three doubles in a row sends you to jail instead of moving
+MONOPOLY_RULES = RuleSet(n_dice=2, extra_turn_on_doubles=True, max_extra_turns=2)
+
+GAMES_PER_BLOCK = 1 << 18
+
+
+def is_markovian(rules: RuleSet) -> bool:
+    """True if one turn is a single roll, so the game is exactly the plain dice chain"""
+    return not rules.extra_turn_totals and not rules.extra_turn_on_doubles
+
+
+def chutes_game(spec, rules: RuleSet = CHUTES_RULES) -> GameSpec:
+    """Board and rules as a board_compiler spec, extra rolls within a turn are folded into the turn
+
+    Args:
+        spec (BoardSpec): Board layout
+        rules (RuleSet, optional): Dice and extra turn rules. Defaults to one six sided die.
+
+    Returns:
+        GameSpec: Same moves as _chutes_block, rolls onto or past the last square stay put
+    """
+    return GameSpec(spec.n_squares + 1, DiceSpec(rules.n_dice, rules.n_faces), board_jumps(spec),
+                    max_square=spec.n_squares - 1, extra_turn_totals=rules.extra_turn_totals,
+                    extra_turn_on_doubles=rules.extra_turn_on_doubles, max_extra_turns=rules.max_extra_turns,
+                    ends_turn=(spec.n_squares,))
+
+
+def absorbing_squares(spec, rules: RuleSet = CHUTES_RULES) -> np.ndarray:
+    """Squares a game never leaves, where it counts as finished
+
+    Args:
+        spec (BoardSpec): Board layout
+        rules (RuleSet, optional): Dice and extra turn rules. Defaults to one six sided die.
+
+    Returns:
+        np.ndarray: Boolean mask over the n_squares + 1 states of chutes_game, the absorbing states of its chain
+    """
+    mask = np.zeros(spec.n_squares + 1, dtype=bool)
+    mask[find_absorbing_states(compile_board(chutes_game(spec, rules)))[1]] = True
+    return mask
+
+
+def roll_dice(rng: np.random.Generator, n_games: int, rules: RuleSet) -> tuple[np.ndarray, np.ndarray]:
+    """Roll the dice for n_games games at once
+
+    Args:
+        rng (np.random.Generator): Random number generator
+        n_games (int): Number of games rolling
+        rules (RuleSet): Dice and extra turn rules
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Total of the dice and whether every die showed the same face
+    """
+    dice = rng.integers(1, rules.n_faces + 1, size=(n_games, rules.n_dice))
+    doubles = (dice == dice[:, :1]).all(axis=1) if rules.n_dice > 1 else np.zeros(n_games, dtype=bool)
+    return dice.sum(axis=1), doubles
+
+
+def _rolls_again(totals: np.ndarray, doubles: np.ndarray, rules: RuleSet) -> np.ndarray:
+    again = np.isin(totals, rules.extra_turn_totals)
+    if rules.extra_turn_on_doubles:
+        again |= doubles
+    return again
+
+
+def _chutes_block(rng: np.random.Generator, n_games: int, dest: np.ndarray, absorbing: np.ndarray,
+                  n_squares: int, rules: RuleSet, max_turns: int) -> np.ndarray:
+    """Finish turn of every game in one block, max_turns + 1 for games that never finish"""
+    positions = np.zeros(n_games, dtype=np.int64)
+    finish = np.full(n_games, max_turns + 1)
+    active = np.arange(n_games)
+    for turn in range(1, max_turns + 1):
+        rolling = active
+        for _ in range(rules.max_extra_turns + 1):
+            totals, doubles = roll_dice(rng, len(rolling), rules)
+            current = positions[rolling]
+            target = current + totals
+            # same as the transition matrix: rolls onto or past the last square stay put
+            target = np.where(target >= n_squares, current, target)
+            positions[rolling] = dest[target]
+            again = _rolls_again(totals, doubles, rules) & ~absorbing[positions[rolling]]
+            rolling = rolling[again]
+            if len(rolling) == 0:
+                break
+        done = absorbing[positions[active]]
+        finish[active[done]] = turn
+        active = active[~done]
+        if len(active) == 0:
+            break
+    return finish
+
+
+def _chutes_shard(n_games: int, spec, rules: RuleSet, max_turns: int,
+                  seed: np.random.SeedSequence) -> np.ndarray:
+    """Histogram of finish turns for one shard, simulated in blocks to bound memory"""
+    rng = np.random.default_rng(seed)
+    dest = resolve_jumps(spec.n_squares + 1, board_jumps(spec))
+    absorbing = absorbing_squares(spec, rules)
+    counts = np.zeros(max_turns + 2, dtype=np.int64)
+    for start in range(0, n_games, GAMES_PER_BLOCK):
+        block = min(GAMES_PER_BLOCK, n_games - start)
+        counts += np.bincount(_chutes_block(rng, block, dest, absorbing, spec.n_squares, rules, max_turns),
+                              minlength=max_turns + 2)
+    return counts
+
+
+def _monopoly_shard(n_games: int, n_turns: int, n_squares: int, rules: RuleSet, go_to_jail: int,
+                    jail: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Number of turns ending on each square for one shard"""
+    rng = np.random.default_rng(seed)
+    visits = np.zeros(n_squares, dtype=np.int64)
+    for start in range(0, n_games, GAMES_PER_BLOCK):
+        block = min(GAMES_PER_BLOCK, n_games - start)
+        positions = np.zeros(block, dtype=np.int64)
+        for _ in range(n_turns):
+            rolling = np.arange(block)
+            for n_rolls in range(1, rules.max_extra_turns + 2):
+                totals, doubles = roll_dice(rng, len(rolling), rules)
+                again = _rolls_again(totals, doubles, rules)
+                if n_rolls == rules.max_extra_turns + 1 and rules.extra_turn_on_doubles:
+                    # one roll past the extra turn limit on doubles goes straight to jail
+                    jailed = rolling[doubles]
+                    positions[jailed] = jail
+                    rolling, totals, again = rolling[~doubles], totals[~doubles], again[~doubles]
+                moved = (positions[rolling] + totals) % n_squares
+                sent_to_jail = moved == go_to_jail
+                moved[sent_to_jail] = jail
+                positions[rolling] = moved
+                rolling = rolling[again & ~sent_to_jail]
+                if len(rolling) == 0:
+                    break
+            visits += np.bincount(positions, minlength=n_squares)
+    return visits
+
+
+def _run_shards(worker, n_games: int, processes: int, seed, *args) -> np.ndarray:
+    """Split n_games across shards with spawned seeds and add up their results"""
+    n_shards = processes or 1
+    seeds = np.random.SeedSequence(seed).spawn(n_shards)
+    shard_sizes = [n_games // n_shards + (i < n_games % n_shards) for i in range(n_shards)]
+    if processes is None:
+        return worker(n_games, *args, seeds[0])
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        results = executor.map(worker, shard_sizes, *[repeat(arg) for arg in args], seeds)
+        return sum(results)
+
+
+def wilson_interval(counts: np.ndarray, n_trials: int, confidence: float = 0.95) -> tuple[np.ndarray, np.ndarray]:
+    """Wilson score confidence interval for binomial proportions
+
+    Args:
+        counts (np.ndarray): Number of successes
+        n_trials (int): Number of trials
+        confidence (float, optional): Confidence level. Defaults to 0.95.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Lower and upper bound of every proportion
+    """
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = counts / n_trials
+    center = (p + z * z / (2 * n_trials)) / (1 + z * z / n_trials)
+    half_width = z * np.sqrt(p * (1 - p) / n_trials + z * z / (4 * n_trials ** 2)) / (1 + z * z / n_trials)
+    return center - half_width, center + half_width
+
+
+def simulate_chutes(n_games: int, spec=STANDARD_BOARD, rules: RuleSet = CHUTES_RULES, max_turns: int = 500,
+                    processes: int = None, seed=None, confidence: float = 0.95) -> FinishTimeReport:
+    """Simulate many games of chutes and ladders and summarize the turn they finish on
+
+    Args:
+        n_games (int): Number of games
+        spec (BoardSpec, optional): Board layout. Defaults to the standard board.
+        rules (RuleSet, optional): Dice and extra turn rules. Defaults to one six sided die.
+        max_turns (int, optional): Games still running after this many turns count as unfinished. Defaults to 500.
+        processes (int, optional): Shard the games across this many processes. Defaults to None.
+        seed (int, optional): Seed for the root SeedSequence. Defaults to None.
+        confidence (float, optional): Confidence level of the pmf intervals. Defaults to 0.95.
+
+    Returns:
+        FinishTimeReport: Finish turn histogram and pmf indexed by turn with confidence bounds,
+            the fraction of unfinished games, the mean over finished games and the throughput.
+            A game finishes on reaching any of absorbing_squares(spec, rules)
+    """
+    start = time.perf_counter()
+    counts = _run_shards(_chutes_shard, n_games, processes, seed, spec, rules, max_turns)
+    elapsed = time.perf_counter() - start
+
+    finished = counts[:-1]
+    pmf = finished / n_games
+    lower, upper = wilson_interval(finished, n_games, confidence)
+    turns = np.arange(len(finished))
+    mean_turns = turns @ finished / max(finished.sum(), 1)
+    return FinishTimeReport(finished, pmf, lower, upper, counts[-1] / n_games, mean_turns,
+                            elapsed, n_games / elapsed)
+
+
+def simulate_monopoly(n_games: int, n_turns: int = 100, rules: RuleSet = MONOPOLY_RULES, n_squares: int = 40,
+                      go_to_jail: int = 30, jail: int = 10, processes: int = None, seed=None) -> OccupancyReport:
+    """Simulate many games of monopoly movement and count where each turn ends
+
+    Args:
+        n_games (int): Number of games
+        n_turns (int, optional): Turns per game. Defaults to 100.
+        rules (RuleSet, optional): Dice and doubles rules. Defaults to two dice with three doubles to jail.
+        n_squares (int, optional): Squares around the board. Defaults to 40.
+        go_to_jail (int, optional): Square that sends you to jail. Defaults to 30.
+        jail (int, optional): Jail square. Defaults to 10.
+        processes (int, optional): Shard the games across this many processes. Defaults to None.
+        seed (int, optional): Seed for the root SeedSequence. Defaults to None.
+
+    Returns:
+        OccupancyReport: Visit counts and frequencies per square and the throughput
+    """
+    start = time.perf_counter()
+    visits = _run_shards(_monopoly_shard, n_games, processes, seed, n_turns, n_squares, rules, go_to_jail, jail)
+    elapsed = time.perf_counter() - start
+    return OccupancyReport(visits, visits / visits.sum(), elapsed, n_games / elapsed)
+
+
+def compare_with_chain(report: FinishTimeReport, spec=STANDARD_BOARD, rules: RuleSet = CHUTES_RULES) -> tuple[np.ndarray, float]:
+    """Check a simulation against the analytic chain
+
+    Args:
+        report (FinishTimeReport): Result of simulate_chutes
+        spec (BoardSpec, optional): Board layout the report was simulated on. Defaults to the standard board.
+        rules (RuleSet, optional): Rules the report was simulated with. Defaults to one six sided die.
+
+    Returns:
+        tuple[np.ndarray, float]: Analytic pmf of the turn a game is absorbed on, in any absorbing
+            state, and the fraction of turns whose confidence interval contains it
+    """
+    transition_mat = compile_board(chutes_game(spec, rules))
+    absorbing = absorbing_squares(spec, rules)
+    initial_state = np.zeros(spec.n_squares + 1)
+    initial_state[0] = 1
+    absorbed = [state[absorbing].sum()
+                for state in iter_state_distributions(transition_mat, initial_state, len(report.pmf) - 1)]
+    analytic_pmf = np.concatenate([[absorbed[0]], np.diff(absorbed)])
+    covered = (report.lower <= analytic_pmf) & (analytic_pmf <= report.upper)
+    return analytic_pmf, covered.mean()
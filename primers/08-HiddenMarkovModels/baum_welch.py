@@ -0,0 +1,150 @@
+"""Baum-Welch estimation of HMM parameters from observation sequences
+
+Each iteration is an E-step, which runs forward-backward on every sequence and adds up
+the expected counts, and an M-step, which normalizes those counts into new parameters.
+The E-step is split into shards of sequences that run on a process pool; a worker
+only sends back the summed counts (S + S*S + S*K numbers and the log-likelihood), never
+per-sequence posteriors, so the traffic does not grow with the amount of data.
+"""
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+
+import numpy as np
+
+from hmm import HMM, make_hmm, scaled_forward_backward
+
+SufficientStats = namedtuple("SufficientStats", ["prior_counts", "transition_counts", "emission_counts",
+                                                 "log_likelihood"])
+FitReport = namedtuple("FitReport", ["hmm", "log_likelihoods", "iteration_times", "converged"])
+
+
+def sequence_statistics(hmm: HMM, emissions, n_symbols: int) -> SufficientStats:
+    """
+    Expected counts of one observation sequence under the current model
+    :param hmm: current model
+    :param emissions: observation codes
+    :param n_symbols: number of distinct observation codes
+    :return: SufficientStats for this sequence
+    """
+    emissions = np.asarray(emissions)
+    alpha, beta, scales = scaled_forward_backward(hmm, emissions)
+    gamma = alpha * beta
+    likelihoods = hmm.emission_probs[:, emissions].T
+    # sum over t of P(s_t-1 = i, s_t = j | y), with the scaling folded into the next step
+    transition_counts = alpha[:-1].T @ (likelihoods[1:] * beta[1:] / scales[1:, None]) * hmm.transitions
+    emission_counts = np.zeros((n_symbols, len(hmm.prior)))
+    np.add.at(emission_counts, emissions, gamma)
+    return SufficientStats(gamma[0], transition_counts, emission_counts.T, float(np.log(scales).sum()))
+
+
+def add_statistics(first: SufficientStats, second: SufficientStats) -> SufficientStats:
+    return SufficientStats(*(a + b for a, b in zip(first, second)))
+
+
+def shard_statistics(hmm: HMM, sequences: list, n_symbols: int) -> SufficientStats:
+    """
+    E-step for one shard of sequences, the unit of work sent to a worker process
+    :param hmm: current model
+    :param sequences: observation sequences in this shard
+    :param n_symbols: number of distinct observation codes
+    :return: SufficientStats summed over the shard
+    """
+    total = None
+    for emissions in sequences:
+        stats = sequence_statistics(hmm, emissions, n_symbols)
+        total = stats if total is None else add_statistics(total, stats)
+    return total
+
+
+def maximize(hmm: HMM, stats: SufficientStats) -> HMM:
+    """
+    M-step, rows without any expected counts keep their previous parameters
+    :param hmm: current model
+    :param stats: SufficientStats summed over all sequences
+    :return: new model
+    """
+    def normalize(counts, previous):
+        totals = counts.sum(axis=-1, keepdims=True)
+        return np.where(totals > 0, counts / np.where(totals > 0, totals, 1), previous)
+
+    return HMM(normalize(stats.transition_counts, hmm.transitions),
+               normalize(stats.emission_counts, hmm.emission_probs),
+               normalize(stats.prior_counts, hmm.prior))
+
+
+def save_checkpoint(path, hmm: HMM, iteration: int, log_likelihoods: list) -> None:
+    """
+    Writes the parameters after an iteration so training can resume from them
+    :param path: .npz file
+    :param hmm: model after the iteration
+    :param iteration: number of completed iterations
+    :param log_likelihoods: log-likelihood of every completed iteration
+    """
+    np.savez(path, transitions=hmm.transitions, emission_probs=hmm.emission_probs, prior=hmm.prior,
+             iteration=iteration, log_likelihoods=np.asarray(log_likelihoods, dtype=float))
+
+
+def load_checkpoint(path) -> tuple[HMM, int, list]:
+    """
+    :param path: .npz file written by save_checkpoint
+    :return: (model, completed iterations, log-likelihoods so far)
+    """
+    with np.load(path) as checkpoint:
+        hmm = make_hmm(checkpoint["transitions"], checkpoint["emission_probs"], checkpoint["prior"])
+        return hmm, int(checkpoint["iteration"]), checkpoint["log_likelihoods"].tolist()
+
+
+def fit(hmm: HMM, sequences: list, n_symbols: int = None, tol: float = 1e-6, max_iterations: int = 100,
+        processes: int = None, n_shards: int = None, checkpoint_path=None, resume: bool = False) -> FitReport:
+    """
+    Fits the model to the observation sequences with Baum-Welch
+    :param hmm: starting model, its shape fixes the number of states
+    :param sequences: list of observation code sequences
+    :param n_symbols: number of distinct observation codes, defaults to the emission matrix width
+    :param tol: stop once the log-likelihood improves by less than tol
+    :param max_iterations: cap on the number of iterations
+    :param processes: run the E-step on a pool of this many processes, None runs it in this process
+    :param n_shards: number of shards per E-step, defaults to 4 per process
+    :param checkpoint_path: write the parameters here after every iteration
+    :param resume: start from checkpoint_path if it exists
+    :return: FitReport with the fitted model, the log-likelihood and seconds taken per iteration
+        and whether it converged
+    """
+    n_symbols = n_symbols or hmm.emission_probs.shape[1]
+    log_likelihoods, iteration_times = [], []
+    first_iteration = 0
+    if resume and checkpoint_path is not None and Path(checkpoint_path).exists():
+        hmm, first_iteration, log_likelihoods = load_checkpoint(checkpoint_path)
+
+    n_shards = n_shards or 4 * (processes or 1)
+    shard_size = -(-len(sequences) // n_shards)
+    shards = [sequences[i:i + shard_size] for i in range(0, len(sequences), shard_size)]
+    executor = ProcessPoolExecutor(max_workers=processes) if processes else None
+    converged = False
+    try:
+        for iteration in range(first_iteration, max_iterations):
+            start = time.perf_counter()
+            if executor is None:
+                results = [shard_statistics(hmm, shard, n_symbols) for shard in shards]
+            else:
+                results = executor.map(shard_statistics, repeat(hmm), shards, repeat(n_symbols))
+            stats = None
+            for shard_stats in results:
+                stats = shard_stats if stats is None else add_statistics(stats, shard_stats)
+            # the log-likelihood belongs to the parameters the E-step ran with
+            converged = bool(log_likelihoods) and stats.log_likelihood - log_likelihoods[-1] < tol
+            log_likelihoods.append(stats.log_likelihood)
+            if converged:
+                iteration_times.append(time.perf_counter() - start)
+                break
+            hmm = maximize(hmm, stats)
+            iteration_times.append(time.perf_counter() - start)
+            if checkpoint_path is not None:
+                save_checkpoint(checkpoint_path, hmm, iteration + 1, log_likelihoods)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    return FitReport(hmm, log_likelihoods, iteration_times, converged)
@@ -0,0 +1,152 @@
+"""Vectorized hidden Markov model decoding
+
+The model uses the names from the Viterbi primer: transitions[i, j] = P(s_t = j | s_t-1 = i),
+emission_probs[i, k] = P(y_t = k | s_t = i) and prior[i] = P(s_1 = i). Observations are
+integer codes into the columns of emission_probs.
+
+viterbi runs the log-space recurrence
+    delta_t[j] = max_i (delta_t-1[i] + log A[i, j]) + log B[j, y_t]
+as one (S x S) array operation per time step, keeping the argmax backpointers in a compact
+integer array, so it needs no recursion and no cache. forward_backward uses per step
+scaling for posteriors and the log-likelihood.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+HMM = namedtuple("HMM", ["transitions", "emission_probs", "prior"])
+
+
+def make_hmm(transitions, emission_probs, prior) -> HMM:
+    """
+    :param transitions: (S, S) transition probabilities, rows sum to 1
+    :param emission_probs: (S, K) emission probabilities, rows sum to 1
+    :param prior: (S,) initial state probabilities
+    :return: HMM with float arrays
+    """
+    return HMM(np.asarray(transitions, dtype=float), np.asarray(emission_probs, dtype=float),
+               np.asarray(prior, dtype=float).ravel())
+
+
+def _log(probs) -> np.ndarray:
+    with np.errstate(divide="ignore"):
+        return np.log(np.asarray(probs, dtype=float))
+
+
+def backpointer_dtype(n_states: int) -> np.dtype:
+    """Smallest unsigned integer type that can index n_states states"""
+    return np.min_scalar_type(max(n_states - 1, 0))
+
+
+def viterbi(hmm: HMM, emissions) -> tuple[np.ndarray, float]:
+    """
+    Most likely hidden state sequence
+    :param hmm: model
+    :param emissions: observation codes, length T
+    :return: (state path of length T, log probability of the path jointly with the emissions),
+        an empty path and 0 for no emissions
+    """
+    emissions = np.asarray(emissions, dtype=np.int64)
+    if len(emissions) == 0:
+        return np.empty(0, dtype=np.int64), 0.0
+    log_transitions = _log(hmm.transitions)
+    log_emissions = _log(hmm.emission_probs)
+    n_steps, n_states = len(emissions), len(hmm.prior)
+    backpointers = np.empty((n_steps, n_states), dtype=backpointer_dtype(n_states))
+
+    emission_scores = log_emissions[:, emissions].T
+    delta = _log(hmm.prior) + emission_scores[0]
+    for t in range(1, n_steps):
+        # scores[i, j]: best path ending in i at t - 1, then moving to j
+        scores = delta[:, None] + log_transitions
+        backpointers[t] = scores.argmax(axis=0)
+        delta = scores.max(axis=0) + emission_scores[t]
+    return _backtrack(backpointers, int(delta.argmax()), n_steps), float(delta.max())
+
+
+def _backtrack(backpointers: np.ndarray, last_state: int, n_steps: int) -> np.ndarray:
+    path = np.empty(n_steps, dtype=np.int64)
+    if n_steps == 0:
+        return path
+    path[n_steps - 1] = last_state
+    for t in range(n_steps - 1, 0, -1):
+        path[t - 1] = backpointers[t, path[t]]
+    return path
+
+
+def viterbi_batch(hmm: HMM, sequences: list) -> list[np.ndarray]:
+    """
+    Decodes many observation sequences of different lengths together
+    :param hmm: model
+    :param sequences: list of observation code sequences
+    :return: most likely state path for every sequence, empty for an empty sequence
+    """
+    if not sequences:
+        return []
+    lengths = np.array([len(sequence) for sequence in sequences])
+    # at least one padded step so the first column exists when every sequence is empty
+    n_batch, n_steps, n_states = len(sequences), max(int(lengths.max()), 1), len(hmm.prior)
+    padded = np.zeros((n_batch, n_steps), dtype=np.int64)
+    for b, sequence in enumerate(sequences):
+        padded[b, :lengths[b]] = sequence
+    log_transitions = _log(hmm.transitions)
+    log_emissions = _log(hmm.emission_probs)
+    backpointers = np.empty((n_steps, n_batch, n_states), dtype=backpointer_dtype(n_states))
+    states = np.arange(n_states)
+
+    delta = _log(hmm.prior) + log_emissions[:, padded[:, 0]].T
+    for t in range(1, n_steps):
+        scores = delta[:, :, None] + log_transitions
+        best = scores.argmax(axis=1)
+        new_delta = np.take_along_axis(scores, best[:, None, :], axis=1)[:, 0] + log_emissions[:, padded[:, t]].T
+        # finished sequences keep their last delta and point back to themselves
+        active = (t < lengths)[:, None]
+        backpointers[t] = np.where(active, best, states)
+        delta = np.where(active, new_delta, delta)
+
+    last_states = delta.argmax(axis=1)
+    return [_backtrack(backpointers[:, b], int(last_states[b]), int(lengths[b])) for b in range(n_batch)]
+
+
+def forward_backward(hmm: HMM, emissions) -> tuple[np.ndarray, float]:
+    """
+    Posterior state probabilities with scaled forward and backward passes
+    :param hmm: model
+    :param emissions: observation codes, length T
+    :return: (posteriors of shape (T, S) with P(s_t = i | all emissions), log-likelihood of the emissions),
+        shape (0, S) and 0 for no emissions
+    """
+    alpha, beta, scales = scaled_forward_backward(hmm, emissions)
+    posteriors = alpha * beta
+    return posteriors, float(np.log(scales).sum())
+
+
+def scaled_forward_backward(hmm: HMM, emissions) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Forward and backward passes normalized at every step to avoid underflow
+    :param hmm: model
+    :param emissions: observation codes, length T
+    :return: (alpha, beta, scales) where alpha[t] = P(s_t | y_1..t), scales[t] = P(y_t | y_1..t-1)
+        and alpha * beta gives the posteriors, all empty for no emissions
+    """
+    emissions = np.asarray(emissions, dtype=np.int64)
+    likelihoods = hmm.emission_probs[:, emissions].T
+    n_steps, n_states = likelihoods.shape
+    alpha = np.empty((n_steps, n_states))
+    beta = np.empty((n_steps, n_states))
+    scales = np.empty(n_steps)
+    if n_steps == 0:
+        return alpha, beta, scales
+
+    alpha[0] = hmm.prior * likelihoods[0]
+    scales[0] = alpha[0].sum()
+    alpha[0] /= scales[0]
+    for t in range(1, n_steps):
+        alpha[t] = (alpha[t - 1] @ hmm.transitions) * likelihoods[t]
+        scales[t] = alpha[t].sum()
+        alpha[t] /= scales[t]
+
+    beta[-1] = 1
+    for t in range(n_steps - 2, -1, -1):
+        beta[t] = hmm.transitions @ (likelihoods[t + 1] * beta[t + 1]) / scales[t + 1]
+    return alpha, beta, scales
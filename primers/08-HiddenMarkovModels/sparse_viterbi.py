@@ -0,0 +1,258 @@
+"""Viterbi decoding for HMMs with many states and sparse transitions
+
+hmm.viterbi scores every (i, j) state pair at every step, O(T S^2). Here the transitions
+are kept as the log of the nonzero entries of a CSR matrix, so a step only scores the
+pairs that can actually happen:
+
+exact: all nonzero transitions, O(T nnz), the same path as hmm.viterbi
+beam: only transitions out of the beam_width best states of the previous step,
+    O(T beam_width degree), approximate
+online: fixed-lag decoding of a stream, the state at time t is decided once the
+    observation at t + lag has arrived, keeping lag steps of backpointers, approximate
+    unless the paths merge within lag steps
+
+compare_modes runs the approximate modes next to exact decoding and reports how many
+states they get right and how far their path's log probability is from the best one.
+transitions may be dense or a scipy sparse matrix, in the HMM namedtuple either way.
+"""
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+from scipy import sparse
+
+from hmm import HMM, _log, backpointer_dtype
+
+LogTransitions = namedtuple("LogTransitions", ["sources", "targets", "log_probs", "segment_starts", "row_indptr",
+                                               "row_entries", "n_states"])
+ModeReport = namedtuple("ModeReport", ["mode", "parameter", "accuracy", "log_prob", "log_prob_gap", "seconds"])
+
+
+def log_transitions(transitions) -> LogTransitions:
+    """
+    :param transitions: (S, S) transition probabilities, dense or scipy sparse
+    :return: LogTransitions with one entry per nonzero transition sorted by (target, source),
+        segment_starts where each target's entries begin and row_entries[row_indptr[i]:row_indptr[i + 1]]
+        the entries leaving state i
+    """
+    csc = sparse.csc_matrix(transitions, dtype=float)
+    csc.eliminate_zeros()
+    csc.sort_indices()
+    n_states = csc.shape[0]
+    sources, targets = csc.indices, np.repeat(np.arange(n_states), np.diff(csc.indptr))
+    row_entries = np.argsort(sources, kind="stable")
+    row_indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=n_states))])
+    segment_starts = csc.indptr[:-1][np.diff(csc.indptr) > 0]
+    return LogTransitions(sources, targets, np.log(csc.data), segment_starts, row_indptr, row_entries, n_states)
+
+
+def _step(delta: np.ndarray, transitions: LogTransitions, active: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    One max-product step over the nonzero transitions out of the active states
+    :param delta: best log probability of a path ending in each state
+    :param transitions: LogTransitions
+    :param active: source states to expand, None for all of them
+    :return: (best score of each target state before its emission, -inf if unreachable, and backpointers)
+    """
+    if active is None:
+        sources, targets, log_probs = transitions.sources, transitions.targets, transitions.log_probs
+        segment_starts = transitions.segment_starts
+    else:
+        # entries leaving the active states, concatenated without a Python loop and put back
+        # in (target, source) order so every target is one segment
+        starts = transitions.row_indptr[active]
+        lengths = transitions.row_indptr[active + 1] - starts
+        offsets = np.cumsum(lengths) - lengths
+        entries = np.sort(transitions.row_entries[np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())])
+        sources, targets, log_probs = transitions.sources[entries], transitions.targets[entries], \
+            transitions.log_probs[entries]
+        segment_starts = np.flatnonzero(np.diff(targets, prepend=-1))
+    best = np.full(transitions.n_states, -np.inf)
+    backpointers = np.zeros(transitions.n_states, dtype=backpointer_dtype(transitions.n_states))
+    if len(sources) == 0:
+        return best, backpointers
+    scores = delta[sources] + log_probs
+    segment_best = np.maximum.reduceat(scores, segment_starts)
+    lengths = np.diff(segment_starts, append=len(scores))
+    # first entry of each segment reaching its maximum, the lowest source like argmax in hmm.viterbi
+    positions = np.arange(len(scores))
+    first = np.minimum.reduceat(np.where(scores == np.repeat(segment_best, lengths), positions, len(scores)),
+                                segment_starts)
+    segment_targets = targets[segment_starts]
+    best[segment_targets] = segment_best
+    backpointers[segment_targets] = sources[first]
+    return best, backpointers
+
+
+def _beam(delta: np.ndarray, beam_width: int) -> np.ndarray:
+    """Sorted states with the beam_width highest finite scores"""
+    if beam_width >= len(delta):
+        return np.flatnonzero(np.isfinite(delta))
+    top = np.argpartition(delta, -beam_width)[-beam_width:]
+    return np.sort(top[np.isfinite(delta[top])])
+
+
+def sparse_viterbi(hmm: HMM, emissions, beam_width: int = None) -> tuple[np.ndarray, float]:
+    """
+    Most likely hidden state sequence, over the nonzero transitions only
+    :param hmm: model, transitions dense or scipy sparse
+    :param emissions: observation codes, length T
+    :param beam_width: expand only this many best states per step, None for exact decoding
+    :return: (state path of length T, log probability of the path jointly with the emissions),
+        an empty path and 0.0 for no emissions
+    """
+    if beam_width is not None and beam_width < 1:
+        raise ValueError(f"beam_width must be at least 1, got {beam_width}")
+    emissions = np.asarray(emissions, dtype=np.int64)
+    if len(emissions) == 0:
+        return np.empty(0, dtype=np.int64), 0.0
+    transitions = log_transitions(hmm.transitions)
+    # one contiguous row of log likelihoods per observation code
+    emission_scores = np.ascontiguousarray(_log(hmm.emission_probs).T)
+    n_steps = len(emissions)
+    backpointers = np.empty((n_steps, transitions.n_states), dtype=backpointer_dtype(transitions.n_states))
+
+    delta = _log(hmm.prior) + emission_scores[emissions[0]]
+    for t in range(1, n_steps):
+        active = None if beam_width is None else _beam(delta, beam_width)
+        delta, backpointers[t] = _step(delta, transitions, active)
+        delta += emission_scores[emissions[t]]
+    path = np.empty(n_steps, dtype=np.int64)
+    path[-1] = delta.argmax()
+    for t in range(n_steps - 1, 0, -1):
+        path[t - 1] = backpointers[t, path[t]]
+    return path, float(delta.max())
+
+
+def online_viterbi(hmm: HMM, emissions, lag: int, beam_width: int = None):
+    """
+    Fixed-lag decoding of an observation stream, memory O(lag S) however long the stream is
+    :param hmm: model, transitions dense or scipy sparse
+    :param emissions: iterable of observation codes, consumed lazily
+    :param lag: observations to wait for before deciding a state, 0 decides each state from
+        the observations so far
+    :param beam_width: expand only this many best states per step, None for all of them
+    :return: generator of decided states in time order, the last lag come when the stream ends
+    """
+    if lag < 0:
+        raise ValueError(f"lag must be non-negative, got {lag}")
+    transitions = log_transitions(hmm.transitions)
+    emission_scores = np.ascontiguousarray(_log(hmm.emission_probs).T)
+    recent = deque(maxlen=lag)
+    delta, n_seen = None, 0
+    for emission in emissions:
+        if delta is None:
+            delta = _log(hmm.prior) + emission_scores[emission]
+        else:
+            active = None if beam_width is None else _beam(delta, beam_width)
+            delta, backpointers = _step(delta, transitions, active)
+            delta += emission_scores[emission]
+            # only differences matter, keep the scores near 0 on long streams
+            delta -= delta.max()
+            recent.append(backpointers)
+        n_seen += 1
+        if n_seen > lag:
+            yield _backtrack(delta, recent)[-1]
+    if delta is None:
+        return
+    # the end of the stream: the states still waiting are decided by one backtrack
+    yield from reversed(_backtrack(delta, recent)[:min(lag, n_seen)])
+
+
+def _backtrack(delta: np.ndarray, recent: deque) -> list[int]:
+    """States of the best path from the last step back through the buffered backpointers"""
+    state = int(delta.argmax())
+    states = [state]
+    for backpointers in reversed(recent):
+        state = int(backpointers[state])
+        states.append(state)
+    return states
+
+
+def path_log_prob(hmm: HMM, path, emissions) -> float:
+    """
+    :param hmm: model, transitions dense or scipy sparse
+    :param path: hidden states, length T
+    :param emissions: observation codes, length T
+    :return: log P(path, emissions)
+    """
+    path, emissions = np.asarray(path), np.asarray(emissions)
+    steps = hmm.transitions[path[:-1], path[1:]]
+    with np.errstate(divide="ignore"):
+        return float(np.log(hmm.prior[path[0]]) + np.log(np.asarray(steps, dtype=float)).sum()
+                     + np.log(hmm.emission_probs[path, emissions]).sum())
+
+
+def compare_modes(hmm: HMM, emissions, beam_widths=(8, 32, 128), lags=(4, 16, 64)) -> list[ModeReport]:
+    """
+    Decodes one sequence in every mode and scores the approximate ones against exact decoding
+    :param hmm: model, transitions dense or scipy sparse
+    :param emissions: observation codes
+    :param beam_widths: beam mode settings to try
+    :param lags: online mode settings to try
+    :return: one ModeReport per run, accuracy is the fraction of states equal to the exact path
+        and log_prob_gap how much less likely the path is than the exact one, inf for online
+        decisions that don't join up into a possible path
+    """
+    emissions = np.asarray(emissions)
+    runs = [("exact", None, lambda: sparse_viterbi(hmm, emissions)[0])]
+    runs += [("beam", width, lambda width=width: sparse_viterbi(hmm, emissions, width)[0]) for width in beam_widths]
+    runs += [("online", lag, lambda lag=lag: np.fromiter(online_viterbi(hmm, iter(emissions), lag), dtype=np.int64))
+             for lag in lags]
+    reports, exact_path, exact_log_prob = [], None, None
+    for mode, parameter, decode in runs:
+        start = time.perf_counter()
+        path = decode()
+        seconds = time.perf_counter() - start
+        log_prob = path_log_prob(hmm, path, emissions)
+        if exact_path is None:
+            exact_path, exact_log_prob = path, log_prob
+        reports.append(ModeReport(mode, parameter, float(np.mean(path == exact_path)), log_prob,
+                                  exact_log_prob - log_prob, seconds))
+    return reports
+
+
+def random_sparse_hmm(n_states: int, n_symbols: int, degree: int, concentration: float = 0.2, seed=None) -> HMM:
+    """
+    HMM whose states each move to degree random states, for trying out the modes
+    :param n_states: hidden states
+    :param n_symbols: observation codes
+    :param degree: nonzero transitions per state, a self loop plus degree - 1 others
+    :param concentration: Dirichlet parameter of the emission rows, smaller is more informative
+    :param seed: seed for np.random.default_rng
+    :return: HMM with CSR transitions and dense emissions
+    """
+    rng = np.random.default_rng(seed)
+    targets = np.column_stack([np.arange(n_states), rng.integers(0, n_states, size=(n_states, degree - 1))])
+    probs = rng.dirichlet(np.ones(degree), size=n_states)
+    transitions = sparse.csr_matrix((probs.ravel(), (np.repeat(np.arange(n_states), degree), targets.ravel())),
+                                    shape=(n_states, n_states))
+    emission_probs = rng.dirichlet(np.full(n_symbols, concentration), size=n_states)
+    return HMM(transitions, emission_probs, np.full(n_states, 1 / n_states))
+
+
+def sample(hmm: HMM, n_steps: int, seed=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    :param hmm: model, transitions dense or scipy sparse
+    :param n_steps: sequence length
+    :param seed: seed for np.random.default_rng
+    :return: (hidden states, observation codes)
+    """
+    rng = np.random.default_rng(seed)
+    transitions = sparse.csr_matrix(hmm.transitions)
+    states = np.empty(n_steps, dtype=np.int64)
+    states[0] = rng.choice(len(hmm.prior), p=hmm.prior)
+    for t in range(1, n_steps):
+        row = transitions.getrow(states[t - 1])
+        states[t] = rng.choice(row.indices, p=row.data / row.data.sum())
+    uniforms = rng.random(n_steps)
+    emissions = (hmm.emission_probs[states].cumsum(axis=1) < uniforms[:, None]).sum(axis=1)
+    return states, np.minimum(emissions, hmm.emission_probs.shape[1] - 1)
+
+
+if __name__ == "__main__":
+    model = random_sparse_hmm(5000, 500, 16, concentration=0.05, seed=0)
+    _, observed = sample(model, 2000, seed=1)
+    for report in compare_modes(model, observed):
+        print(f"{report.mode:>6} {str(report.parameter):>5}  accuracy {report.accuracy:.4f}  "
+              f"log prob gap {report.log_prob_gap:10.3f}  {report.seconds * 1e3:8.1f} ms")
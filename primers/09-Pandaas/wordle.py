@@ -0,0 +1,156 @@
+"""Integer encoded Wordle candidate index
+
+Words are stored as a uint8 (N, 5) array of letter codes 0-25 and a uint8 (N, 26) array of
+letter counts. Sets of words are bitsets: uint64 arrays with bit n set for word n, so
+a 12,947 word set is 203 machine words. The index precomputes
+    position_masks[c, p]: words with letter c at position p
+    at_least[c, k]:       words containing letter c at least k times
+and a guess/response is a handful of ANDs of those bitsets with the current candidates.
+
+Responses use the notebook's colors: 'g' right letter in the right place, 'y' letter in
+the word but elsewhere, 'b' letter not in the word (beyond the copies already marked g/y).
+"""
+from pathlib import Path
+
+import numpy as np
+
+WORD_LENGTH = 5
+N_LETTERS = 26
+
+
+def load_words(path=Path(__file__).parent / "word-list.txt") -> list[str]:
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def encode_words(words: list[str]) -> np.ndarray:
+    """
+    :param words: lowercase words of WORD_LENGTH letters
+    :return: uint8 array of shape (len(words), WORD_LENGTH) with 'a' = 0 ... 'z' = 25
+    """
+    raw = np.frombuffer("".join(words).encode("ascii"), dtype=np.uint8)
+    return (raw - ord("a")).reshape(len(words), WORD_LENGTH)
+
+
+def parse_response(response) -> list[str]:
+    """Accepts ['y', 'y', 'g', 'b', 'b'] as in the notebook or the string 'yygbb'"""
+    response = [color.lower() for color in response]
+    if len(response) != WORD_LENGTH or not set(response) <= {"g", "y", "b"}:
+        raise ValueError(f"response must be {WORD_LENGTH} of 'g', 'y' or 'b', got {response}")
+    return response
+
+
+def pack_bits(flags: np.ndarray) -> np.ndarray:
+    """
+    :param flags: boolean array whose last axis is indexed by word
+    :return: uint64 bitsets over the last axis, bit n of the set is flags[..., n]
+    """
+    n_words = flags.shape[-1]
+    padded = np.zeros(flags.shape[:-1] + (-(-n_words // 64) * 64,), dtype=bool)
+    padded[..., :n_words] = flags
+    return np.packbits(padded, axis=-1, bitorder="little").view(np.uint64)
+
+
+def unpack_bits(bits: np.ndarray, n_words: int) -> np.ndarray:
+    """Inverse of pack_bits for a single bitset, returns the indices of the set bits"""
+    flags = np.unpackbits(bits.view(np.uint8), count=n_words, bitorder="little")
+    return np.flatnonzero(flags)
+
+
+class WordleIndex:
+    """
+    Candidate words that are still consistent with every guess/response seen so far
+    :param words: word list, load_words() by default
+    """
+
+    def __init__(self, words: list[str] = None):
+        self.words = np.array(load_words() if words is None else words)
+        n_words = len(self.words)
+        self.codes = encode_words(list(self.words))
+        counts = np.zeros((n_words, N_LETTERS), dtype=np.uint8)
+        np.add.at(counts, (np.arange(n_words)[:, None], self.codes), 1)
+        self.letter_counts = counts
+
+        letters = np.arange(N_LETTERS, dtype=np.uint8)
+        self.position_masks = pack_bits(self.codes.T[None, :, :] == letters[:, None, None])
+        # k runs to WORD_LENGTH + 1 so that at_least[c, count + 1] always exists and
+        # "exactly count" is at_least[c, count] & ~at_least[c, count + 1]
+        ks = np.arange(WORD_LENGTH + 2, dtype=np.uint8)
+        self.at_least = pack_bits(counts.T[:, None, :] >= ks[None, :, None])
+        self.all_words = self.at_least[0, 0].copy()
+        self.alive = self.all_words.copy()
+
+    def reset(self) -> None:
+        self.alive = self.all_words.copy()
+
+    @property
+    def candidates(self) -> np.ndarray:
+        """Indices of the remaining candidate words"""
+        return unpack_bits(self.alive, len(self.words))
+
+    @property
+    def candidate_words(self) -> list[str]:
+        return self.words[self.candidates].tolist()
+
+    def __len__(self):
+        return int(np.unpackbits(self.alive.view(np.uint8)).sum())
+
+    def matches(self, guess: str, response, alive: np.ndarray = None) -> np.ndarray:
+        """
+        :param guess: guessed word
+        :param response: colors for each letter of the guess
+        :param alive: bitset of words to test, every word by default
+        :return: bitset of the words in alive that would have given this response
+        """
+        response = parse_response(response)
+        guess_codes = [int(code) for code in encode_words([guess])[0]]
+        mask = (self.all_words if alive is None else alive).copy()
+
+        marked, capped = {}, set()
+        for position, (code, color) in enumerate(zip(guess_codes, response)):
+            if color == "g":
+                mask &= self.position_masks[code, position]
+            else:
+                mask &= ~self.position_masks[code, position]
+            if color == "b":
+                capped.add(code)
+            marked[code] = marked.get(code, 0) + (color != "b")
+
+        for code, count in marked.items():
+            if count:
+                mask &= self.at_least[code, count]
+            if code in capped:
+                mask &= ~self.at_least[code, count + 1]
+        return mask
+
+    def update(self, guess: str, response) -> int:
+        """
+        Keeps only the candidates consistent with the response to guess
+        :param guess: guessed word
+        :param response: colors for each letter of the guess
+        :return: number of candidates left
+        """
+        self.alive = self.matches(guess, response, self.alive)
+        return len(self)
+
+    def letter_position_counts(self) -> np.ndarray:
+        """
+        :return: (N_LETTERS, WORD_LENGTH) array, how many candidates have each letter at each position
+        """
+        offsets = np.arange(WORD_LENGTH) * N_LETTERS
+        flat = (self.codes[self.candidates] + offsets).ravel()
+        counts = np.bincount(flat, minlength=WORD_LENGTH * N_LETTERS)
+        return counts.reshape(WORD_LENGTH, N_LETTERS).T
+
+    def letter_probabilities(self) -> dict[str, list[float]]:
+        """
+        :return: letter -> fraction of candidates with that letter at each position, as in the notebook
+        """
+        probs = self.letter_position_counts() / max(len(self), 1)
+        return {chr(ord("a") + code): probs[code].tolist() for code in range(N_LETTERS)}
+
+
+if __name__ == "__main__":
+    index = WordleIndex()
+    print(index.update("arise", ["y", "y", "g", "b", "b"]), "candidates left")
+    print(index.candidate_words[:20])
@@ -0,0 +1,245 @@
+"""Entropy maximizing Wordle solver on a precomputed feedback matrix
+
+patterns[g, a] is the response to guessing word g when the answer is word a, packed as a
+base 3 number: sum over positions p of color_p * 3 ** p with b = 0, y = 1, g = 2, so it
+fits in a uint8 (243 patterns). For the 12,947 word list the matrix is about 168 MB. It is
+built once in chunks of guess rows, optionally on a process pool with every worker writing
+its rows straight into the .npy file, and later runs memory-map the file instead of
+rebuilding it.
+
+The best guess for a set of candidate answers is the word whose pattern row, restricted
+to the candidates, has the highest entropy: one bincount over the gathered rows gives the
+size of every pattern bucket for every guess at once.
+"""
+import hashlib
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from wordle import WORD_LENGTH, WordleIndex, parse_response
+
+N_PATTERNS = 3 ** WORD_LENGTH
+SOLVED = N_PATTERNS - 1  # every position green
+COLORS = "byg"
+PLACES = 3 ** np.arange(WORD_LENGTH)
+
+BenchmarkReport = namedtuple("BenchmarkReport", ["mean_guesses", "max_guesses", "guess_counts", "failures",
+                                                 "seconds_per_game", "elapsed"])
+
+
+def feedback_patterns(guess_codes: np.ndarray, answer_codes: np.ndarray, answer_counts: np.ndarray) -> np.ndarray:
+    """
+    Responses of every guess against every answer, with Wordle's rule for repeated letters:
+    greens first, then yellows left to right while unmatched copies of the letter remain
+    :param guess_codes: (G, WORD_LENGTH) letter codes of the guesses
+    :param answer_codes: (A, WORD_LENGTH) letter codes of the answers
+    :param answer_counts: (A, N_LETTERS) letter counts of the answers
+    :return: (G, A) uint8 pattern codes
+    """
+    green = [guess_codes[:, j, None] == answer_codes[None, :, j] for j in range(WORD_LENGTH)]
+    patterns = np.zeros(green[0].shape, dtype=np.uint8)
+    for i in range(WORD_LENGTH):
+        # copies of the letter in the answer that no green has used up, minus the ones
+        # earlier non-green copies in the guess have already taken as yellows
+        available = answer_counts[:, guess_codes[:, i]].T.astype(np.int8)
+        taken = np.zeros_like(available)
+        for j in range(WORD_LENGTH):
+            same_letter = guess_codes[:, j] == guess_codes[:, i]
+            if not same_letter.any():
+                continue
+            available -= green[j] & same_letter[:, None]
+            if j < i:
+                taken += ~green[j] & same_letter[:, None]
+        yellow = ~green[i] & (taken < available)
+        patterns += green[i] * np.uint8(2 * PLACES[i]) + yellow * np.uint8(PLACES[i])
+    return patterns
+
+
+def pattern_code(response) -> int:
+    """'yygbb' or ['y', 'y', 'g', 'b', 'b'] -> pattern code"""
+    return int(sum(COLORS.index(color) * place for color, place in zip(parse_response(response), PLACES)))
+
+
+def pattern_response(code: int) -> str:
+    """pattern code -> response string such as 'yygbb'"""
+    return "".join(COLORS[code // place % 3] for place in PLACES)
+
+
+def default_pattern_path(words: list[str]) -> Path:
+    digest = hashlib.sha1("\n".join(words).encode("ascii")).hexdigest()[:12]
+    return Path(__file__).parent / f"feedback-patterns-{digest}.npy"
+
+
+def _fill_rows(path, words: list[str], start: int, stop: int) -> None:
+    """Computes pattern rows start to stop - 1 and writes them into the .npy file at path"""
+    index = WordleIndex(words)
+    patterns = np.load(path, mmap_mode="r+")
+    patterns[start:stop] = feedback_patterns(index.codes[start:stop], index.codes, index.letter_counts)
+    patterns.flush()
+
+
+def build_pattern_matrix(words: list[str], path, chunk_size: int = 256, processes: int = None) -> np.ndarray:
+    """
+    Writes the full (N, N) pattern matrix to a .npy file
+    :param words: word list, used both as guesses and as answers
+    :param path: .npy file to create
+    :param chunk_size: guess rows per task, each task holds about 5 * chunk_size * N bytes of temporaries
+    :param processes: fill the chunks on a pool of this many processes, None fills them in this process
+    :return: the matrix, memory-mapped read only
+    """
+    path = Path(path)
+    partial = path.with_name(path.name + ".partial")
+    n_words = len(words)
+    np.lib.format.open_memmap(partial, mode="w+", dtype=np.uint8, shape=(n_words, n_words)).flush()
+    starts = range(0, n_words, chunk_size)
+    stops = [min(start + chunk_size, n_words) for start in starts]
+    if processes:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            list(executor.map(_fill_rows, [partial] * len(starts), [words] * len(starts), starts, stops))
+    else:
+        for start, stop in zip(starts, stops):
+            _fill_rows(partial, words, start, stop)
+    # only a complete matrix gets the real name, so an interrupted build is never loaded
+    partial.replace(path)
+    return np.load(path, mmap_mode="r")
+
+
+def load_pattern_matrix(words: list[str], path=None, processes: int = None) -> np.ndarray:
+    """
+    :param words: word list
+    :param path: .npy cache file, named after a hash of the word list by default
+    :param processes: processes used if the matrix has to be built
+    :return: the (N, N) pattern matrix, memory-mapped from the cache file
+    """
+    path = default_pattern_path(words) if path is None else Path(path)
+    if path.exists():
+        patterns = np.load(path, mmap_mode="r")
+        if patterns.shape == (len(words), len(words)) and patterns.dtype == np.uint8:
+            return patterns
+    return build_pattern_matrix(words, path, processes=processes)
+
+
+def pattern_entropy(patterns: np.ndarray, candidates: np.ndarray, guesses: np.ndarray = None,
+                    chunk_size: int = 1024) -> np.ndarray:
+    """
+    Expected information in bits of each guess when the answer is uniform over the candidates
+    :param patterns: (N, N) pattern matrix
+    :param candidates: indices of the remaining answers
+    :param guesses: indices of the guesses to score, every word by default
+    :param chunk_size: guesses per bincount, bounds the temporary arrays
+    :return: entropy per guess
+    """
+    guesses = np.arange(patterns.shape[0]) if guesses is None else guesses
+    entropy = np.empty(len(guesses))
+    for start in range(0, len(guesses), chunk_size):
+        rows = guesses[start:start + chunk_size]
+        block = patterns[np.ix_(rows, candidates)]
+        # shift every row into its own range of N_PATTERNS bins so one bincount does all rows
+        offsets = (np.arange(len(rows)) * N_PATTERNS)[:, None]
+        counts = np.bincount((block + offsets).ravel(), minlength=len(rows) * N_PATTERNS)
+        probs = counts.reshape(len(rows), N_PATTERNS) / len(candidates)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            entropy[start:start + chunk_size] = -np.where(probs > 0, probs * np.log2(probs), 0).sum(axis=1)
+    return entropy
+
+
+class WordleSolver:
+    """
+    Picks guesses that maximize the expected information about the answer
+    :param words: word list, the WordleIndex default list by default
+    :param patterns: pattern matrix, loaded or built with load_pattern_matrix by default
+    :param processes: processes used if the pattern matrix has to be built
+    """
+
+    def __init__(self, words: list[str] = None, patterns: np.ndarray = None, processes: int = None):
+        self.index = WordleIndex(words)
+        self.words = self.index.words
+        self.patterns = load_pattern_matrix(list(self.words), processes=processes) if patterns is None else patterns
+        # candidate set -> best guess, the solver is deterministic so games that reach the same
+        # candidates share the work, and a whole benchmark only scores each node of the game tree once
+        self._guesses = {}
+
+    def word_index(self, word: str) -> int:
+        matches = np.flatnonzero(self.words == word)
+        if len(matches) == 0:
+            raise ValueError(f"{word} is not in the word list")
+        return int(matches[0])
+
+    def best_guess(self, candidates: np.ndarray = None) -> str:
+        """
+        :param candidates: indices of the remaining answers, the index's current candidates by default
+        :return: the guess with the highest entropy, preferring a candidate on ties so it can win outright
+        """
+        return str(self.words[self._best_guess_index(self.index.candidates if candidates is None else candidates)])
+
+    def _best_guess_index(self, candidates: np.ndarray) -> int:
+        if len(candidates) <= 2:
+            return int(candidates[0])
+        key = candidates.tobytes()
+        if key not in self._guesses:
+            scores = pattern_entropy(self.patterns, candidates)
+            # on equal information prefer a guess that could be the answer and end the game now
+            scores[candidates] += 1e-9
+            self._guesses[key] = int(scores.argmax())
+        return self._guesses[key]
+
+    def play(self, answer: str, max_guesses: int = 20) -> list[str]:
+        """
+        :param answer: the hidden word
+        :param max_guesses: give up after this many guesses
+        :return: the guesses made, ending with the answer unless it gave up
+        """
+        target = self.word_index(answer)
+        candidates = np.arange(len(self.words))
+        guesses = []
+        while len(guesses) < max_guesses:
+            guess = self._best_guess_index(candidates)
+            guesses.append(str(self.words[guess]))
+            code = self.patterns[guess, target]
+            if code == SOLVED:
+                break
+            candidates = candidates[self.patterns[guess, candidates] == code]
+        return guesses
+
+    def update(self, guess: str, response) -> str:
+        """
+        Applies a response from a real game and suggests the next guess
+        :param guess: word that was guessed
+        :param response: colors shown for it
+        :return: next guess
+        """
+        self.index.update(guess, response)
+        return self.best_guess()
+
+    def benchmark(self, answers: list[str] = None, max_guesses: int = 20) -> BenchmarkReport:
+        """
+        Plays a game against every answer
+        :param answers: answers to play against, the whole word list by default
+        :param max_guesses: guesses allowed per game before it counts as a failure
+        :return: BenchmarkReport with the mean and max number of guesses, guess count -> games,
+            games that hit max_guesses and the time per game, which includes filling the guess cache
+        """
+        answers = list(self.words) if answers is None else answers
+        start = time.perf_counter()
+        lengths = []
+        failures = []
+        for answer in answers:
+            guesses = self.play(answer, max_guesses)
+            lengths.append(len(guesses))
+            if guesses[-1] != answer:
+                failures.append(answer)
+        elapsed = time.perf_counter() - start
+        lengths = np.array(lengths)
+        values, counts = np.unique(lengths, return_counts=True)
+        return BenchmarkReport(float(lengths.mean()), int(lengths.max()), dict(zip(values.tolist(), counts.tolist())),
+                               failures, elapsed / len(answers), elapsed)
+
+
+if __name__ == "__main__":
+    solver = WordleSolver(processes=None)
+    print("opening:", solver.best_guess())
+    print(solver.play("fairy"))
+    print(solver.benchmark())
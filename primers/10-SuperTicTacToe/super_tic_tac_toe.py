@@ -0,0 +1,362 @@
+"""Super tic tac toe (docs/superticktacktoe.md) on bitboards with a negamax searcher
+
+Rules: a move in cell c of a small board sends the opponent to small board c. If that
+board is already won or full they may play in any open board. Winning a small board
+claims that square of the meta board, a full small board without a winner claims nothing,
+and three claimed squares in a row win the game. No legal moves left is a draw.
+
+Cell c of small board b is bit 9 * b + c of an 81 bit int, and a move is that bit index.
+Every position keeps
+    cells[p]:  the 81 cells of player p (0 = X, 1 = O)
+    boards[p]: the 9 small boards player p has won
+    closed:    the 9 small boards that are won or full
+so checking a small board is a shift, a mask and a lookup in WINS, a 512 entry table of
+which 9 bit patterns contain a line, and legal moves come from the empty bits of the
+open boards through the BITS table.
+
+Searcher runs iterative deepening negamax with alpha-beta pruning and a transposition table
+keyed by an incrementally updated Zobrist hash. The table has a fixed number of slots and
+keeps, per slot, the deeper of the old and new entry unless the old one is from an
+earlier search. parallel_search splits the root moves over a process pool, each worker
+searching its share with its own table, and every result reports nodes per second.
+"""
+import os
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+FULL = 0x1FF
+LINES = (0b000000111, 0b000111000, 0b111000000, 0b001001001, 0b010010010, 0b100100100, 0b100010001, 0b001010100)
+WINS = tuple(any(mask & line == line for line in LINES) for mask in range(512))
+BITS = tuple(tuple(c for c in range(9) if mask >> c & 1) for mask in range(512))
+POPCOUNT = tuple(bin(mask).count("1") for mask in range(512))
+# center, corners, edges
+SQUARE_WEIGHTS = (3, 2, 3, 2, 4, 2, 3, 2, 3)
+
+WIN_SCORE = 1_000_000
+MAX_PLY = 81
+INFINITY = 10 * WIN_SCORE
+
+# exact value, lower bound (search failed high), upper bound (search failed low)
+EXACT, LOWER, UPPER = 0, 1, 2
+
+SearchResult = namedtuple("SearchResult", ["move", "value", "depth", "nodes", "seconds", "nodes_per_second"])
+
+_rng = random.Random(2023)
+ZOBRIST_CELLS = tuple(tuple(_rng.getrandbits(64) for _ in range(81)) for _ in range(2))
+ZOBRIST_NEXT_BOARD = tuple(_rng.getrandbits(64) for _ in range(10))  # index next_board + 1
+ZOBRIST_O_TO_MOVE = _rng.getrandbits(64)
+
+
+class Position:
+    """Game state with play/undo, X moves first"""
+
+    def __init__(self):
+        self.cells = [0, 0]
+        self.boards = [0, 0]
+        self.closed = 0
+        self.player = 0
+        self.next_board = -1  # -1: any open board
+        self.hash = ZOBRIST_NEXT_BOARD[0]
+        self._history = []
+
+    @classmethod
+    def from_moves(cls, moves: list[int]) -> "Position":
+        position = cls()
+        for move in moves:
+            if move not in position.legal_moves():
+                raise ValueError(f"illegal move {move} after {position.moves}")
+            position.play(move)
+        return position
+
+    @property
+    def moves(self) -> list[int]:
+        return [entry[0] for entry in self._history]
+
+    def legal_moves(self) -> list[int]:
+        if self.winner() is not None:
+            return []
+        occupied = self.cells[0] | self.cells[1]
+        boards = (self.next_board,) if self.next_board >= 0 else BITS[~self.closed & FULL]
+        return [9 * b + c for b in boards for c in BITS[~(occupied >> 9 * b) & FULL]]
+
+    def play(self, move: int) -> None:
+        player = self.player
+        board, cell = divmod(move, 9)
+        self._history.append((move, self.boards[player], self.closed, self.next_board, self.hash))
+        self.cells[player] |= 1 << move
+        if WINS[(self.cells[player] >> 9 * board) & FULL]:
+            self.boards[player] |= 1 << board
+            self.closed |= 1 << board
+        elif ((self.cells[0] | self.cells[1]) >> 9 * board) & FULL == FULL:
+            self.closed |= 1 << board
+        next_board = -1 if self.closed >> cell & 1 else cell
+        self.hash ^= (ZOBRIST_CELLS[player][move] ^ ZOBRIST_O_TO_MOVE ^
+                      ZOBRIST_NEXT_BOARD[self.next_board + 1] ^ ZOBRIST_NEXT_BOARD[next_board + 1])
+        self.next_board = next_board
+        self.player = 1 - player
+
+    def undo(self) -> None:
+        move, boards, closed, next_board, position_hash = self._history.pop()
+        self.player = 1 - self.player
+        self.cells[self.player] &= ~(1 << move)
+        self.boards[self.player] = boards
+        self.closed, self.next_board, self.hash = closed, next_board, position_hash
+
+    def winner(self):
+        """0 or 1 if that player has three small boards in a row, otherwise None"""
+        # only the player who just moved can have completed a line
+        last = 1 - self.player
+        return last if WINS[self.boards[last]] else None
+
+    def evaluate(self) -> int:
+        """Heuristic value for the player to move, from the meta board and the open small boards"""
+        me, them = self.player, 1 - self.player
+        return self._score(me) - self._score(them)
+
+    def _score(self, player: int) -> int:
+        mine, theirs = self.boards[player], self.boards[1 - player]
+        drawn = self.closed & ~(mine | theirs)
+        score = 0
+        for line in LINES:
+            # a meta line still counts while the opponent holds none of it and no board in it is drawn
+            if not line & (theirs | drawn):
+                score += 100 * POPCOUNT[line & mine] ** 2
+        for board in BITS[mine]:
+            score += 20 * SQUARE_WEIGHTS[board]
+        own, other = self.cells[player], self.cells[1 - player]
+        for board in BITS[~self.closed & FULL]:
+            cells, blocked = (own >> 9 * board) & FULL, (other >> 9 * board) & FULL
+            for line in LINES:
+                if not line & blocked:
+                    score += POPCOUNT[line & cells] ** 2 * SQUARE_WEIGHTS[board]
+        return score
+
+    def __str__(self):
+        rows = []
+        for meta_row in range(3):
+            for cell_row in range(3):
+                row = []
+                for meta_col in range(3):
+                    board = 3 * meta_row + meta_col
+                    row.append("".join(self._mark(9 * board + 3 * cell_row + c) for c in range(3)))
+                rows.append(" | ".join(row))
+            if meta_row < 2:
+                rows.append("----+-----+----")
+        return "\n".join(rows)
+
+    def _mark(self, move: int) -> str:
+        if self.cells[0] >> move & 1:
+            return "X"
+        if self.cells[1] >> move & 1:
+            return "O"
+        return "."
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results indexed by the low bits of the Zobrist hash
+    :param size_bits: the table holds 2 ** size_bits entries
+    """
+
+    def __init__(self, size_bits: int = 20):
+        self.mask = (1 << size_bits) - 1
+        self._slots = [None] * (1 << size_bits)
+        self.generation = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self) -> None:
+        """Entries from earlier searches become the first to be replaced"""
+        self.generation += 1
+
+    def probe(self, key: int):
+        """
+        :param key: Zobrist hash
+        :return: (key, depth, value, flag, move, generation) or None
+        """
+        entry = self._slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, value: int, flag: int, move: int) -> None:
+        slot = key & self.mask
+        old = self._slots[slot]
+        if old is not None:
+            # keep a deeper result of the current search over a shallower one
+            if old[0] != key and old[5] == self.generation and old[1] > depth:
+                return
+            self.overwrites += old[0] != key
+        self._slots[slot] = (key, depth, value, flag, move, self.generation)
+        self.stores += 1
+
+    def __len__(self):
+        return sum(entry is not None for entry in self._slots)
+
+
+class Searcher:
+    """
+    Iterative deepening negamax with alpha-beta pruning and a transposition table
+    :param table_bits: the transposition table holds 2 ** table_bits entries
+    """
+
+    def __init__(self, table_bits: int = 20):
+        self.table = TranspositionTable(table_bits)
+        self.nodes = 0
+
+    def search(self, position: Position, depth: int, time_limit: float = None) -> SearchResult:
+        """
+        :param position: position to search, left unchanged
+        :param depth: maximum depth in plies, at least 1
+        :param time_limit: stop deepening once this many seconds have passed
+        :return: SearchResult of the deepest completed iteration, with move None and depth 0 if
+            the game is already over
+        """
+        _check_depth(depth)
+        if not position.legal_moves():
+            return _game_over(position)
+        self.table.new_search()
+        self.nodes = 0
+        start = time.perf_counter()
+        result = None
+        for current_depth in range(1, depth + 1):
+            value, move = self._root(position, current_depth, position.legal_moves())
+            elapsed = time.perf_counter() - start
+            result = SearchResult(move, value, current_depth, self.nodes, elapsed, self.nodes / max(elapsed, 1e-9))
+            if abs(value) >= WIN_SCORE - MAX_PLY or (time_limit is not None and elapsed > time_limit):
+                break
+        return result
+
+    def _root(self, position: Position, depth: int, moves: list[int]) -> tuple[int, int]:
+        alpha, best_move = -INFINITY, None
+        for move in self._ordered(position, moves):
+            position.play(move)
+            value = -self._negamax(position, depth - 1, -INFINITY, -alpha, 1)
+            position.undo()
+            if value > alpha:
+                alpha, best_move = value, move
+        self.table.store(position.hash, depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _ordered(self, position: Position, moves: list[int]) -> list[int]:
+        entry = self.table.probe(position.hash)
+        if entry is not None and entry[4] in moves:
+            moves = [entry[4]] + [move for move in moves if move != entry[4]]
+        return moves
+
+    def _negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if position.winner() is not None:
+            return -(WIN_SCORE - ply)
+        moves = position.legal_moves()
+        if not moves:
+            return 0
+        if depth == 0:
+            return position.evaluate()
+
+        original_alpha = alpha
+        entry = self.table.probe(position.hash)
+        if entry is not None and entry[1] >= depth:
+            value = _from_table(entry[2], ply)
+            if entry[3] == EXACT:
+                return value
+            if entry[3] == LOWER:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+            if alpha >= beta:
+                return value
+
+        best_value, best_move = -INFINITY, None
+        for move in self._ordered(position, moves):
+            position.play(move)
+            value = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.undo()
+            if value > best_value:
+                best_value, best_move = value, move
+                alpha = max(alpha, value)
+                if alpha >= beta:
+                    break
+
+        flag = UPPER if best_value <= original_alpha else LOWER if best_value >= beta else EXACT
+        self.table.store(position.hash, depth, _to_table(best_value, ply), flag, best_move)
+        return best_value
+
+
+def _check_depth(depth: int) -> None:
+    if depth < 1:
+        raise ValueError(f"depth must be at least 1, got {depth}")
+
+
+def _game_over(position: Position) -> SearchResult:
+    """Result for a finished game: lost for the player to move if the other one won, else drawn"""
+    value = -WIN_SCORE if position.winner() is not None else 0
+    return SearchResult(None, value, 0, 0, 0.0, 0.0)
+
+
+def _to_table(value: int, ply: int) -> int:
+    """Win scores are stored relative to the node so they stay valid at any ply"""
+    if value >= WIN_SCORE - MAX_PLY:
+        return value + ply
+    if value <= -(WIN_SCORE - MAX_PLY):
+        return value - ply
+    return value
+
+
+def _from_table(value: int, ply: int) -> int:
+    if value >= WIN_SCORE - MAX_PLY:
+        return value - ply
+    if value <= -(WIN_SCORE - MAX_PLY):
+        return value + ply
+    return value
+
+
+def _search_root_moves(moves_played: list[int], root_moves: list[int], depth: int,
+                       table_bits: int) -> tuple[int, int, int]:
+    """Worker for parallel_search: best of root_moves at the given depth, returns (value, move, nodes)"""
+    position = Position.from_moves(moves_played)
+    searcher = Searcher(table_bits)
+    value, move = None, None
+    for current_depth in range(1, depth + 1):
+        value, move = searcher._root(position, current_depth, root_moves)
+    return value, move, searcher.nodes
+
+
+def parallel_search(position: Position, depth: int, processes: int = None, table_bits: int = 18) -> SearchResult:
+    """
+    Root parallel search: the root moves are dealt round robin to the workers, each searches
+    its share with iterative deepening and its own transposition table, and the best of
+    their answers wins. Workers can't share alpha, so the total node count is higher than
+    a serial search of the same depth.
+    :param position: position to search
+    :param depth: depth in plies, at least 1
+    :param processes: pool size, os.cpu_count() by default
+    :param table_bits: transposition table size per worker
+    :return: SearchResult with the summed node count, as Searcher.search if the game is over
+    """
+    _check_depth(depth)
+    moves = position.legal_moves()
+    if not moves:
+        return _game_over(position)
+    start = time.perf_counter()
+    n_shares = min(processes or os.cpu_count(), len(moves))
+    with ProcessPoolExecutor(max_workers=n_shares) as executor:
+        shares = [moves[i::n_shares] for i in range(n_shares)]
+        results = list(executor.map(_search_root_moves, [position.moves] * n_shares, shares,
+                                    [depth] * n_shares, [table_bits] * n_shares))
+    elapsed = time.perf_counter() - start
+    value, move, _ = max(results, key=lambda result: result[0])
+    nodes = sum(result[2] for result in results)
+    return SearchResult(move, value, depth, nodes, elapsed, nodes / max(elapsed, 1e-9))
+
+
+if __name__ == "__main__":
+    position = Position.from_moves([40, 36, 4])
+    print(position, "\n")
+    for depth in (4, 5, 6):
+        print("serial  ", Searcher().search(position, depth))
+    print("parallel", parallel_search(position, 6, processes=2))
@@ -0,0 +1,210 @@
+"""Memoized Bellman solver shared by the DP and MDP primers
+
+The primers all follow the same recipe: a state type, possible_actions(state),
+transitions(state, action) returning Transition(prob, next_state) and
+immediate_value(state, action), solved with
+
+    V(s) = max_a [F(s, a) + sum_s' P(s' | s, a) V(s')]
+
+and a global dict as the cache. BellmanSolver takes those same functions and a
+pluggable cache, and evaluates the recursion with an explicit stack, so deep state
+spaces never hit Python's recursion limit.
+
+Caches:
+DictCache: unbounded dict, what the primers use today
+LRUCache: dict capped at maxsize entries, least recently used entries are evicted
+ArrayCache: preallocated arrays for dense integer state spaces, a fixed 9 bytes per state
+All caches count hits, misses and evictions in cache.stats.
+"""
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+Transition = namedtuple('Transition', ['prob', 'next_state'])
+Result = namedtuple('Result', ['action', 'value'])
+
+
+class CacheStats:
+    """Hit, miss and eviction counters of a cache"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __repr__(self):
+        return f"CacheStats(hits={self.hits}, misses={self.misses}, evictions={self.evictions})"
+
+
+class DictCache:
+    """Unbounded cache backed by a dict"""
+
+    def __init__(self):
+        self._data = {}
+        self.stats = CacheStats()
+
+    def get(self, state):
+        """
+        :param state: state to look up
+        :return: the cached Result or None
+        """
+        result = self._data.get(state)
+        if result is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return result
+
+    def put(self, state, result: Result) -> None:
+        self._data[state] = result
+
+    def __len__(self):
+        return len(self._data)
+
+    def items(self):
+        return self._data.items()
+
+
+class LRUCache(DictCache):
+    """Cache holding at most maxsize results, evicting the least recently used one"""
+
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, state):
+        result = super().get(state)
+        if result is not None:
+            self._data.move_to_end(state)
+        return result
+
+    def put(self, state, result: Result) -> None:
+        self._data[state] = result
+        self._data.move_to_end(state)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+
+class ArrayCache:
+    """
+    Cache for dense integer state spaces, stored as a value array and an action code array
+    :param size: number of states
+    :param index: maps a state to an int in range(size)
+    :param actions: every action that can be returned, stored by position
+    """
+
+    def __init__(self, size: int, index, actions: list):
+        self.index = index
+        self.actions = list(actions)
+        self._codes = {action: code for code, action in enumerate(self.actions)}
+        self._values = np.zeros(size, dtype=np.float64)
+        # -1 marks an empty slot
+        self._action_codes = np.full(size, -1, dtype=np.int8 if len(self.actions) < 128 else np.int32)
+        self.stats = CacheStats()
+
+    def get(self, state):
+        i = self.index(state)
+        code = self._action_codes[i]
+        if code < 0:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return Result(self.actions[code], float(self._values[i]))
+
+    def put(self, state, result: Result) -> None:
+        i = self.index(state)
+        self._values[i] = result.value
+        self._action_codes[i] = self._codes[result.action]
+
+    def __len__(self):
+        return int(np.count_nonzero(self._action_codes >= 0))
+
+
+class BellmanSolver:
+    """
+    Solves V(s) = max_a [F(s, a) + sum P(s' | s, a) V(s')] for a finite horizon or acyclic problem
+    :param possible_actions: state -> list of actions
+    :param transitions: (state, action) -> list of Transition(prob, next_state)
+    :param immediate_value: (state, action) -> reward F(s, a)
+    :param is_terminal: state -> True if the state has no decisions left
+    :param terminal_value: state -> value of a terminal state, 0 by default
+    :param cache: DictCache, LRUCache or ArrayCache, a new DictCache by default
+    :param record_timing: store the seconds spent solving each state in self.timings
+    """
+
+    def __init__(self, possible_actions, transitions, immediate_value, is_terminal,
+                 terminal_value=None, cache=None, record_timing: bool = False):
+        self.possible_actions = possible_actions
+        self.transitions = transitions
+        self.immediate_value = immediate_value
+        self.is_terminal = is_terminal
+        self.terminal_value = terminal_value or (lambda state: 0)
+        self.cache = DictCache() if cache is None else cache
+        self.record_timing = record_timing
+        self.timings = {}
+
+    def _known(self, state):
+        if self.is_terminal(state):
+            return Result('', self.terminal_value(state))
+        return self.cache.get(state)
+
+    def _evaluate(self, state):
+        """
+        Bellman update for one state, yields each next state and is sent back its value.
+        Ties go to the action listed first, the actions themselves are never compared
+        """
+        options = []
+        for action in self.possible_actions(state):
+            action_value = self.immediate_value(state, action)
+            for transition in self.transitions(state, action):
+                action_value += transition.prob * (yield transition.next_state)
+            options.append((action_value, action))
+        if not options:
+            raise ValueError(f"state {state} is not terminal but has no possible actions")
+        best_value, best_action = max(options, key=lambda option: option[0])
+        return Result(best_action, best_value)
+
+    def solve(self, state) -> Result:
+        """
+        :param state: state to solve
+        :return: Result(action, value) with the optimal action and value of the state
+        """
+        known = self._known(state)
+        if known is not None:
+            return known
+        # every frame is (state, its Bellman update generator, start time), the generator
+        # pauses at each next state that still has to be solved
+        stack = [(state, self._evaluate(state), time.perf_counter())]
+        in_progress = {state}
+        sent = None
+        while stack:
+            current, update, started = stack[-1]
+            try:
+                next_state = update.send(sent)
+            except StopIteration as finished:
+                result = finished.value
+                self.cache.put(current, result)
+                if self.record_timing:
+                    self.timings[current] = time.perf_counter() - started
+                stack.pop()
+                in_progress.discard(current)
+                sent = result.value
+                continue
+            known = self._known(next_state)
+            if known is not None:
+                sent = known.value
+            elif next_state in in_progress:
+                raise ValueError(f"state {next_state} depends on itself, the problem must be acyclic")
+            else:
+                stack.append((next_state, self._evaluate(next_state), time.perf_counter()))
+                in_progress.add(next_state)
+                sent = None
+        return result
@@ -0,0 +1,352 @@
+"""Benchmark suite for the primers' solvers
+
+Every benchmark is a parameter sweep: one Case per point, holding the parameters, the
+amount of work (for throughput) and a setup function that returns the zero argument
+callable to time, so building inputs never counts. For each case run() records
+
+    seconds:    best of repeat wall times with time.perf_counter
+    peak_bytes: peak traced allocation during one extra run under tracemalloc (NumPy
+                arrays are traced too)
+    throughput: work / seconds, in the benchmark's unit
+
+fit_exponents regresses log(seconds) on the log of every swept parameter, so a sweep over
+floors x eggs gives t ~ floors^a * eggs^b. The sweeps are wide enough that the smallest
+case is well above timer and call overhead noise; a fit whose times span less than
+MIN_TIME_SPAN or whose R^2 is below MIN_R_SQUARED is flagged as unreliable and left out of
+saved baselines. Results can be saved as a JSON baseline and compare flags cases that got
+slower or hungrier than the baseline by more than a threshold.
+
+    python -m primers.benchmarks --quick --save baseline.json
+    python -m primers.benchmarks --quick --baseline baseline.json --threshold 0.25
+"""
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from primers.profiling import load_module
+
+PRIMERS = Path(__file__).parent
+
+Case = namedtuple("Case", ["params", "work", "setup"])
+Benchmark = namedtuple("Benchmark", ["name", "unit", "cases"])
+Measurement = namedtuple("Measurement", ["benchmark", "params", "seconds", "peak_bytes", "throughput"])
+Regression = namedtuple("Regression", ["benchmark", "params", "metric", "baseline", "current", "ratio"])
+Fit = namedtuple("Fit", ["exponents", "r_squared", "time_span", "reliable"])
+
+# a fit over times closer together than this is mostly fitting noise and fixed overhead
+MIN_TIME_SPAN = 10
+MIN_R_SQUARED = 0.9
+
+
+def _egg_drop(quick: bool) -> list[Benchmark]:
+    egg_drop = load_module(PRIMERS / "01-Recursion" / "egg_drop.py")
+    floors = [250, 500, 1000] if quick else [500, 1000, 2000, 4000]
+    eggs = [2, 4] if quick else [2, 4, 8]
+    # coverage fills a row of floors at once, so it needs far more of both to be timed well
+    coverage_floors, coverage_eggs = [1000 * n for n in floors], [2, 8] if quick else [2, 8, 32]
+    benchmarks = []
+    for engine, engine_floors, engine_eggs in (("naive", floors, eggs), ("bisect", floors, eggs),
+                                               ("coverage", coverage_floors, coverage_eggs)):
+        cases = [Case({"floors": n, "eggs": k}, n * k,
+                      lambda n=n, k=k, engine=engine: lambda: egg_drop.EggDrop(engine).extend(k, n))
+                 for n in engine_floors for k in engine_eggs]
+        benchmarks.append(Benchmark(f"egg_drop.{engine}", "cells", cases))
+    return benchmarks
+
+
+def _random_items(module, n_items: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    return [module.Item(int(w), int(v)) for w, v in zip(rng.integers(1, 50, n_items), rng.integers(1, 100, n_items))]
+
+
+def _knapsack(quick: bool) -> list[Benchmark]:
+    top_down = load_module(PRIMERS / "03-Top-Down-DP" / "top_down_knapsack.py")
+    knapsack = load_module(PRIMERS / "03-Top-Down-DP" / "knapsack")
+
+    def recursive(items, capacity):
+        def solve():
+            # solve_knapsack reads the module's globals and memoizes in them, so every run
+            # points them at this instance and starts from the base cases only
+            top_down.items = items
+            top_down.cache = {top_down.State(0, w): (0, "N") for w in range(capacity + 1)}
+            top_down.cache.update({top_down.State(n, 0): (0, "N") for n in range(len(items) + 1)})
+            return top_down.solve_knapsack(top_down.State(len(items), capacity))
+        return solve
+
+    def rolling(items, capacity):
+        return lambda: knapsack.solve(items, capacity)
+
+    small_items, small_capacities = ([25, 100], [100, 400]) if quick else ([25, 50, 100, 200], [100, 200, 400, 800])
+    large_items, large_capacities = ([200, 800], [10_000, 40_000]) if quick else \
+        ([200, 800, 3200], [10_000, 40_000, 160_000])
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10_000))
+    return [
+        Benchmark("knapsack.solve_knapsack", "cells",
+                  [Case({"items": n, "capacity": w}, n * w, lambda n=n, w=w: recursive(_random_items(top_down, n), w))
+                   for n in small_items for w in small_capacities]),
+        Benchmark("knapsack.solve.rolling", "cells",
+                  [Case({"items": n, "capacity": w}, n * w, lambda n=n, w=w: rolling(_random_items(knapsack, n), w))
+                   for n in large_items for w in large_capacities]),
+    ]
+
+
+def _chutes(quick: bool) -> list[Benchmark]:
+    chutes = load_module(PRIMERS / "05-MarkovProcess" / "chutes_n_ladders.py")
+    # dense matrices are squares^2 (80 MB at 3200 squares), so only small boards are dense,
+    # the sparse ones need many more squares before the fixed overhead stops dominating
+    dense_matrix_squares = [200, 800, 3200]
+    sparse_matrix_squares = [1_000, 10_000, 100_000] if quick else [1_000, 10_000, 100_000, 1_000_000]
+    dense_squares = [100, 200, 400] if quick else [100, 200, 400, 800]
+    sparse_squares = [1_000, 10_000, 100_000] if quick else [1_000, 4_000, 16_000, 64_000, 256_000]
+    turns = [25, 50, 100] if quick else [25, 50, 100, 200]
+
+    def nth_turn(n_squares, n_turns, sparse_format):
+        matrix = chutes.make_transition_matrix(n_squares, sparse_format)
+        initial = chutes.create_initial_state(n_squares)
+        return lambda: chutes.find_nth_turn(matrix, initial, n_turns)
+
+    return [
+        Benchmark("chutes.make_transition_matrix", "squares",
+                  [Case({"squares": n}, n, lambda n=n: lambda: chutes.make_transition_matrix(n))
+                   for n in dense_matrix_squares]),
+        Benchmark("chutes.make_transition_matrix.sparse", "squares",
+                  [Case({"squares": n}, n, lambda n=n: lambda: chutes.make_transition_matrix(n, True))
+                   for n in sparse_matrix_squares]),
+        Benchmark("chutes.find_nth_turn.dense", "turns",
+                  [Case({"squares": n, "turns": t}, t, lambda n=n, t=t: nth_turn(n, t, False))
+                   for n in dense_squares for t in turns]),
+        Benchmark("chutes.find_nth_turn.sparse", "turns",
+                  [Case({"squares": n, "turns": t}, t, lambda n=n, t=t: nth_turn(n, t, True))
+                   for n in sparse_squares for t in turns]),
+    ]
+
+
+def _monopoly(quick: bool) -> list[Benchmark]:
+    load_module(PRIMERS / "05-MarkovProcess" / "chutes_n_ladders.py")
+    monopoly = load_module(PRIMERS / "05-MarkovProcess" / "monopoly.py")
+    # dense, 50 MB per matrix at 2560 squares
+    squares = [160, 640, 2560]
+    # the compiled board is sparse and takes about a millisecond below a few thousand squares
+    board_squares = [640, 6_400, 64_000] if quick else [640, 6_400, 64_000, 640_000]
+    return [
+        Benchmark("monopoly.make_transition_matrix", "squares",
+                  [Case({"squares": n}, n, lambda n=n: lambda: monopoly.make_transition_matrix(n)) for n in squares]),
+        Benchmark("monopoly.make_board_transition_matrix", "squares",
+                  [Case({"squares": n}, n, lambda n=n: lambda: monopoly.make_board_transition_matrix(n))
+                   for n in board_squares]),
+    ]
+
+
+def _viterbi(quick: bool) -> list[Benchmark]:
+    hmm = load_module(PRIMERS / "08-HiddenMarkovModels" / "hmm.py")
+    lengths = [1_000, 4_000, 16_000] if quick else [1_000, 4_000, 16_000, 64_000]
+    n_states = [4, 16]
+
+    def decode(length, states):
+        rng = np.random.default_rng(0)
+        model = hmm.make_hmm(rng.dirichlet(np.ones(states), states), rng.dirichlet(np.ones(6), states),
+                             np.full(states, 1 / states))
+        emissions = rng.integers(0, 6, length)
+        return lambda: hmm.viterbi(model, emissions)
+
+    return [Benchmark("hmm.viterbi", "steps",
+                      [Case({"length": t, "states": s}, t, lambda t=t, s=s: decode(t, s))
+                       for t in lengths for s in n_states])]
+
+
+def _wordle(quick: bool) -> list[Benchmark]:
+    wordle = load_module(PRIMERS / "09-Pandaas" / "wordle.py")
+    words = wordle.load_words()
+    # a filter is a few bitset operations, which take about as long as the call itself until
+    # there are hundreds of thousands of words, so the word list is repeated to get there
+    sizes = [50_000, 500_000, 2_000_000] if quick else [len(words), 100_000, 1_000_000, 4_000_000]
+
+    def filtering(n_words):
+        index = wordle.WordleIndex((words * -(-n_words // len(words)))[:n_words])
+        return lambda: index.matches("arise", "yygbb")
+
+    return [Benchmark("wordle.filter", "words",
+                      [Case({"words": n}, n, lambda n=n: filtering(n)) for n in sizes])]
+
+
+SUITES = {"egg_drop": _egg_drop, "knapsack": _knapsack, "chutes": _chutes, "monopoly": _monopoly,
+          "viterbi": _viterbi, "wordle": _wordle}
+
+
+def collect(only: list[str] = None, quick: bool = False) -> list[Benchmark]:
+    """
+    :param only: suite names from SUITES, all of them by default
+    :param quick: smaller sweeps
+    :return: the benchmarks of the chosen suites
+    """
+    names = list(SUITES) if only is None else only
+    unknown = set(names) - set(SUITES)
+    if unknown:
+        raise ValueError(f"unknown suites {sorted(unknown)}, expected some of {list(SUITES)}")
+    return [benchmark for name in names for benchmark in SUITES[name](quick)]
+
+
+def measure(function, repeat: int = 3, min_time: float = 0.05) -> tuple[float, int]:
+    """
+    :param function: zero argument callable
+    :param repeat: timed runs, the fastest one counts
+    :param min_time: calls quicker than this are looped until a run takes at least this long
+    :return: (seconds per call, peak traced bytes of one call)
+    """
+    start = time.perf_counter()
+    function()
+    once = time.perf_counter() - start
+    loops = max(1, int(min_time / once)) if once > 0 else 1000
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        best = min(best, (time.perf_counter() - start) / loops)
+
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    function()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    if not tracing:
+        tracemalloc.stop()
+    return best, peak
+
+
+def run(benchmarks: list[Benchmark], repeat: int = 3, verbose: bool = False) -> list[Measurement]:
+    """
+    :param benchmarks: benchmarks to run
+    :param repeat: timed runs per case
+    :param verbose: print every measurement as it is taken
+    :return: one Measurement per case
+    """
+    measurements = []
+    for benchmark in benchmarks:
+        for case in benchmark.cases:
+            seconds, peak = measure(case.setup(), repeat)
+            measurement = Measurement(benchmark.name, case.params, seconds, peak, case.work / seconds)
+            measurements.append(measurement)
+            if verbose:
+                print(f"{benchmark.name:<40} {_format_params(case.params):<28} {seconds * 1e3:10.3f} ms "
+                      f"{peak / 2 ** 20:9.2f} MiB {measurement.throughput:12.4g} {benchmark.unit}/s")
+    return measurements
+
+
+def fit_exponents(measurements: list[Measurement]) -> dict:
+    """
+    Least squares fit of log(seconds) = c + sum_p e_p log(param_p) per benchmark
+    :param measurements: results of run
+    :return: benchmark -> Fit with {param: exponent} for the parameters that take more than one
+        value, the R^2 of the fit, slowest / fastest case and whether both clear MIN_R_SQUARED
+        and MIN_TIME_SPAN
+    """
+    fits = {}
+    for name in dict.fromkeys(m.benchmark for m in measurements):
+        cases = [m for m in measurements if m.benchmark == name]
+        swept = [p for p in cases[0].params if len({m.params[p] for m in cases}) > 1]
+        if not swept:
+            continue
+        log_seconds = np.log([m.seconds for m in cases])
+        design = np.column_stack([np.ones(len(cases))] + [np.log([m.params[p] for m in cases]) for p in swept])
+        coefficients, *_ = np.linalg.lstsq(design, log_seconds, rcond=None)
+        total = np.sum((log_seconds - log_seconds.mean()) ** 2)
+        r_squared = 1 - np.sum((log_seconds - design @ coefficients) ** 2) / total if total > 0 else 0.0
+        time_span = float(np.exp(np.ptp(log_seconds)))
+        fits[name] = Fit(dict(zip(swept, np.round(coefficients[1:], 3).tolist())), round(float(r_squared), 4),
+                         round(time_span, 2), time_span >= MIN_TIME_SPAN and r_squared >= MIN_R_SQUARED)
+    return fits
+
+
+def save_baseline(measurements: list[Measurement], path) -> None:
+    """
+    Writes the measurements, reliable fitted exponents and a description of the machine as JSON
+    :param measurements: results of run
+    :param path: .json file
+    """
+    baseline = {
+        "machine": {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+                    "processor": platform.processor()},
+        "exponents": {name: fit.exponents for name, fit in fit_exponents(measurements).items() if fit.reliable},
+        "measurements": [m._asdict() for m in measurements],
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1)
+
+
+def load_baseline(path) -> list[Measurement]:
+    with open(path) as f:
+        return [Measurement(**row) for row in json.load(f)["measurements"]]
+
+
+def compare(measurements: list[Measurement], baseline: list[Measurement], threshold: float = 0.25,
+            metrics=("seconds", "peak_bytes")) -> list[Regression]:
+    """
+    :param measurements: current results
+    :param baseline: earlier results, cases are matched on benchmark name and parameters
+    :param threshold: flag a case once a metric exceeds the baseline by this fraction
+    :param metrics: Measurement fields to check, larger is worse
+    :return: Regression rows, worst ratio first. Cases missing from the baseline are skipped
+    """
+    earlier = {(m.benchmark, _format_params(m.params)): m for m in baseline}
+    regressions = []
+    for m in measurements:
+        old = earlier.get((m.benchmark, _format_params(m.params)))
+        if old is None:
+            continue
+        for metric in metrics:
+            before, after = getattr(old, metric), getattr(m, metric)
+            # a few KiB of allocator noise is not a regression
+            floor = 64 * 1024 if metric == "peak_bytes" else 0
+            if after > max(before, floor) * (1 + threshold):
+                regressions.append(Regression(m.benchmark, m.params, metric, before, after,
+                                              after / before if before else np.inf))
+    return sorted(regressions, key=lambda r: r.ratio, reverse=True)
+
+
+def _format_params(params: dict) -> str:
+    return " ".join(f"{key}={value}" for key, value in sorted(params.items()))
+
+
+def main(argv: list[str] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the primer benchmarks")
+    parser.add_argument("--only", nargs="+", choices=list(SUITES), help="suites to run, all by default")
+    parser.add_argument("--quick", action="store_true", help="smaller sweeps")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--save", help="write the results to this JSON baseline")
+    parser.add_argument("--baseline", help="compare against this JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown as a fraction")
+    options = parser.parse_args(argv)
+
+    measurements = run(collect(options.only, options.quick), options.repeat, verbose=True)
+    print()
+    for name, fit in fit_exponents(measurements).items():
+        exponents = " ".join(f"{param}^{exponent:.2f}" for param, exponent in fit.exponents.items())
+        flag = "" if fit.reliable else f"  unreliable: R^2 {fit.r_squared:.2f}, times span {fit.time_span:.1f}x"
+        print(f"{name:<40} {exponents:<28}{flag}")
+    if options.save:
+        save_baseline(measurements, options.save)
+    if options.baseline:
+        regressions = compare(measurements, load_baseline(options.baseline), options.threshold)
+        print()
+        for r in regressions:
+            print(f"REGRESSION {r.benchmark} {_format_params(r.params)} {r.metric}: "
+                  f"{r.baseline:.4g} -> {r.current:.4g} ({r.ratio:.2f}x)")
+        if regressions:
+            return 1
+        print(f"no regressions beyond {options.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
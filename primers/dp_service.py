@@ -0,0 +1,331 @@
+"""Batch solver and request loop for knapsack and egg drop queries
+
+A request is a JSON object:
+
+    {"id": 1, "problem": "knapsack", "items": [[weight, value], ...], "capacity": 50}
+    {"id": 2, "problem": "egg_drop", "eggs": 3, "floors": 100}
+
+and its response is {"id": ..., "value": ...} or {"id": ..., "error": ...}.
+
+BatchSolver.solve answers a list of requests by grouping the ones that can share a table:
+egg drop requests with the same number of eggs are all answered by EggDrop.worst_cases from
+one column of its coverage table (floors covered with d drops), and knapsack requests with
+the same items by one row of best values up to their largest capacity. Small groups are solved in
+this process; bigger knapsack groups go to a process pool whose workers write their
+answers straight into a shared memory buffer, so only a timing comes back through the
+pool. A group that fails gets an error response for its own requests only. Every batch
+reports per request latency percentiles.
+
+serve_jsonl reads requests as JSON lines from a stream (stdin by default) and serve_unix
+from connections to a Unix socket, batching lines that arrive together.
+
+    python -m primers.dp_service < requests.jsonl > responses.jsonl
+    python -m primers.dp_service --socket /tmp/dp.sock
+"""
+import json
+import os
+import select
+import socketserver
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from primers.profiling import load_module
+
+PRIMERS = Path(__file__).parent
+PROBLEMS = ("knapsack", "egg_drop")
+PERCENTILES = (50, 90, 99)
+# bounds on what a single request may allocate or loop over
+MAX_FLOORS = 10 ** 9
+MAX_CAPACITY = 10 ** 7
+
+BatchReport = namedtuple("BatchReport", ["responses", "latencies", "percentiles", "n_groups", "seconds"])
+
+
+def _knapsack():
+    return load_module(PRIMERS / "03-Top-Down-DP" / "knapsack")
+
+
+def _egg_drop():
+    return load_module(PRIMERS / "01-Recursion" / "egg_drop.py")
+
+
+def _is_count(value, limit: int = None) -> bool:
+    """A non-negative int, bools don't count"""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0 and (limit is None or value <= limit)
+
+
+def _check(request):
+    """Returns an error message for a malformed request, None if it is fine"""
+    if not isinstance(request, dict):
+        return "request must be a JSON object"
+    problem = request.get("problem")
+    if problem not in PROBLEMS:
+        return f"unknown problem {problem!r}, expected one of {PROBLEMS}"
+    fields = ("items", "capacity") if problem == "knapsack" else ("eggs", "floors")
+    missing = [field for field in fields if field not in request]
+    if missing:
+        return f"missing {', '.join(missing)}"
+    if problem == "knapsack":
+        if not _is_count(request["capacity"], MAX_CAPACITY):
+            return f"capacity must be an integer from 0 to {MAX_CAPACITY}"
+        items = request["items"]
+        if not isinstance(items, list) or not all(
+                isinstance(item, list) and len(item) == 2 and all(_is_count(field) for field in item) for item in items):
+            return "items must be a list of [weight, value] pairs of non-negative integers"
+        return None
+    if not _is_count(request["eggs"]) or not _is_count(request["floors"], MAX_FLOORS):
+        return f"eggs must be a non-negative integer and floors an integer from 0 to {MAX_FLOORS}"
+    if request["floors"] > 0 and request["eggs"] < 1:
+        return "at least one egg is needed for any floors"
+    return None
+
+
+def _solve_knapsack_group(items: list, capacities: list, slots: list, buffer_name: str, buffer_size: int) -> float:
+    """Pool worker: best values for one item set, written into the shared buffer, returns seconds taken"""
+    start = time.perf_counter()
+    knapsack = _knapsack()
+    values = knapsack.solve_capacities([knapsack.Item(*item) for item in items], capacities)
+    buffer = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        results = np.ndarray((buffer_size,), dtype=np.int64, buffer=buffer.buf)
+        results[slots] = values
+        del results
+    finally:
+        buffer.close()
+    return time.perf_counter() - start
+
+
+class BatchSolver:
+    """
+    :param processes: pool size for knapsack groups, None or 1 solves everything in this process
+    :param min_parallel_work: knapsack groups with fewer than this many items * capacity cells
+        are solved in this process, shipping them to the pool costs more than solving them
+    """
+
+    def __init__(self, processes: int = None, min_parallel_work: int = 1_000_000):
+        self.processes = processes
+        self.min_parallel_work = min_parallel_work
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.processes)
+        return self._executor
+
+    def solve(self, requests: list[dict], received: list[float] = None) -> BatchReport:
+        """
+        :param requests: request dicts, anything else gets an error response
+        :param received: perf_counter time each request arrived, the start of the batch by default
+        :return: BatchReport with one response per request in order, the latency of each, their
+            percentiles, the number of shared tables and the wall time of the batch
+        """
+        start = time.perf_counter()
+        received = [start] * len(requests) if received is None else received
+        n_requests = len(requests)
+        responses = [None] * n_requests
+        finished = np.full(n_requests, start)
+
+        knapsack_groups, egg_drop_slots = {}, []
+        for slot, request in enumerate(requests):
+            error = _check(request)
+            if error is not None:
+                responses[slot] = {"id": request.get("id") if isinstance(request, dict) else None, "error": error}
+                finished[slot] = time.perf_counter()
+            elif request["problem"] == "knapsack":
+                key = tuple(tuple(item) for item in request["items"])
+                knapsack_groups.setdefault(key, []).append(slot)
+            else:
+                egg_drop_slots.append(slot)
+
+        values = np.zeros(n_requests, dtype=np.int64)
+
+        def fail(slots, error):
+            for slot in slots:
+                responses[slot] = {"id": requests[slot].get("id"), "error": f"{type(error).__name__}: {error}"}
+            finished[slots] = time.perf_counter()
+
+        egg_groups, egg_drop = {}, _egg_drop().EggDrop(track_strategy=False)
+        for slot in egg_drop_slots:
+            egg_groups.setdefault(requests[slot]["eggs"], []).append(slot)
+        for n_eggs, slots in egg_groups.items():
+            try:
+                values[slots] = egg_drop.worst_cases(n_eggs, [requests[slot]["floors"] for slot in slots])
+                finished[slots] = time.perf_counter()
+            except Exception as error:
+                fail(slots, error)
+
+        parallel = []
+        for items, slots in knapsack_groups.items():
+            capacities = [requests[slot]["capacity"] for slot in slots]
+            if self.processes and self.processes > 1 and len(items) * max(capacities) >= self.min_parallel_work:
+                parallel.append((items, capacities, slots))
+                continue
+            try:
+                knapsack = _knapsack()
+                values[slots] = knapsack.solve_capacities([knapsack.Item(*item) for item in items], capacities)
+                finished[slots] = time.perf_counter()
+            except Exception as error:
+                fail(slots, error)
+
+        if parallel:
+            buffer = shared_memory.SharedMemory(create=True, size=max(n_requests, 1) * 8)
+            try:
+                shared = np.ndarray((n_requests,), dtype=np.int64, buffer=buffer.buf)
+                futures = {self._pool().submit(_solve_knapsack_group, list(items), capacities, slots, buffer.name,
+                                               n_requests): slots
+                           for items, capacities, slots in parallel}
+                for future in as_completed(futures):
+                    slots = futures[future]
+                    try:
+                        future.result()
+                    except Exception as error:
+                        fail(slots, error)
+                        continue
+                    finished[slots] = time.perf_counter()
+                    values[slots] = shared[slots]
+                del shared
+            finally:
+                buffer.close()
+                buffer.unlink()
+
+        for slot, request in enumerate(requests):
+            if responses[slot] is None:
+                responses[slot] = {"id": request.get("id"), "value": int(values[slot])}
+        latencies = finished - np.asarray(received)
+        percentiles = latency_percentiles(latencies)
+        n_groups = len(knapsack_groups) + len(egg_groups)
+        return BatchReport(responses, latencies, percentiles, n_groups, time.perf_counter() - start)
+
+
+def latency_percentiles(latencies) -> dict:
+    """
+    :param latencies: seconds per request
+    :return: {"p50": ..., "p90": ..., "p99": ..., "max": ...} in seconds
+    """
+    latencies = np.asarray(latencies, dtype=float)
+    if latencies.size == 0:
+        return {}
+    summary = {f"p{p}": float(np.percentile(latencies, p)) for p in PERCENTILES}
+    summary["max"] = float(latencies.max())
+    return summary
+
+
+def _read_batch(stream, batch_size: int, wait: float) -> list[tuple[str, float]]:
+    """
+    Lines that are available now, up to batch_size, waiting up to wait seconds for more after
+    the first. Streams without a file descriptor are read batch_size lines at a time.
+    :return: (line, perf_counter time it was read) pairs, empty at end of stream
+    """
+    batch = []
+    try:
+        fd = stream.fileno()
+    except (AttributeError, OSError, ValueError):
+        fd = None
+    while len(batch) < batch_size:
+        # buffered lines don't show up in select, so only wait once the buffer looks drained
+        if batch and fd is not None and not select.select([fd], [], [], wait)[0]:
+            break
+        line = stream.readline()
+        if not line:
+            break
+        if line.strip():
+            batch.append((line, time.perf_counter()))
+    return batch
+
+
+def serve_stream(solver: BatchSolver, reader, writer, batch_size: int = 1000, wait: float = 0.005,
+                 log=None) -> dict:
+    """
+    Answers JSON line requests from reader on writer until reader ends
+    :param solver: BatchSolver
+    :param reader: text stream of requests
+    :param writer: text stream for responses, one line per request in arrival order
+    :param batch_size: most requests solved together
+    :param wait: seconds to wait for more lines before solving a partial batch
+    :param log: stream for per batch latency summaries, None for quiet
+    :return: latency percentiles over everything served
+    """
+    latencies = []
+    while True:
+        batch = _read_batch(reader, batch_size, wait)
+        if not batch:
+            break
+        requests, received = [], []
+        for line, arrived in batch:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                # solve answers anything that isn't a dict with an error
+                request = line
+            requests.append(request)
+            received.append(arrived)
+        report = solver.solve(requests, received)
+        for response in report.responses:
+            writer.write(json.dumps(response) + "\n")
+        writer.flush()
+        latencies.extend(report.latencies)
+        if log is not None:
+            summary = " ".join(f"{name}={seconds * 1e3:.2f}ms" for name, seconds in report.percentiles.items())
+            print(f"{len(requests)} requests in {report.n_groups} groups, {summary}", file=log, flush=True)
+    return latency_percentiles(latencies)
+
+
+def serve_jsonl(solver: BatchSolver = None, reader=None, writer=None, **options) -> dict:
+    """serve_stream on stdin and stdout by default"""
+    with solver or BatchSolver() as active:
+        return serve_stream(active, reader or sys.stdin, writer or sys.stdout, **options)
+
+
+def serve_unix(path, solver: BatchSolver = None, **options) -> None:
+    """
+    Serves JSON line requests on a Unix socket, one connection at a time sharing one solver
+    :param path: socket path, replaced if it exists
+    :param solver: BatchSolver, a new serial one by default
+    :param options: passed on to serve_stream
+    """
+    solver = solver or BatchSolver()
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            with self.request.makefile("r") as reader, self.request.makefile("w") as writer:
+                serve_stream(solver, reader, writer, **options)
+
+    if os.path.exists(path):
+        os.unlink(path)
+    with solver, socketserver.UnixStreamServer(str(path), Handler) as server:
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Answer knapsack and egg drop requests given as JSON lines")
+    parser.add_argument("--socket", help="serve on this Unix socket instead of stdin/stdout")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    options = parser.parse_args()
+
+    batch_solver = BatchSolver(options.processes)
+    if options.socket:
+        serve_unix(options.socket, batch_solver, batch_size=options.batch_size, log=sys.stderr)
+    else:
+        overall = serve_jsonl(batch_solver, batch_size=options.batch_size, log=sys.stderr)
+        print("overall " + " ".join(f"{name}={seconds * 1e3:.2f}ms" for name, seconds in overall.items()),
+              file=sys.stderr)
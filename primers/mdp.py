@@ -0,0 +1,314 @@
+"""Array backed MDP solvers
+
+compile_mdp walks every state reachable from the initial states once, using the same
+possible_actions / transitions / immediate_value functions as the primers, and stores
+the problem as one sparse transition matrix per action plus a reward matrix. The
+solvers then work on whole arrays:
+
+backward_induction: for acyclic MDPs (finite horizon, stage by stage), states are grouped
+    into levels by their longest path to a terminal state and each level is solved with one
+    vectorized backup, after every state it can reach, O(nnz) in total
+value_iteration: V <- max_a [R_a + discount * P_a V] until the update is below tol
+policy_iteration: alternate policy evaluation and greedy improvement. Evaluation is an
+    exact sparse linear solve of (I - discount * P_pi) V = R_pi, or with
+    evaluation_sweeps=k, k sweeps of V <- R_pi + discount * P_pi V (modified policy iteration)
+
+Terminal states get the single action '' with reward terminal_value(state) and no
+transitions, matching Result('', 0) in the primers. With discount=1 the problem has to be
+acyclic or otherwise reach a terminal state with probability 1. solve picks backward
+induction when discount=1 and the MDP is acyclic, and policy iteration otherwise.
+
+save_solution and load_solution keep a solved MDP in a primers.table_store.TableStore so a
+restarted process gets the lookup dict back without compiling or solving again.
+"""
+from collections import deque, namedtuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import spsolve
+
+from primers.bellman import Result
+
+CompiledMDP = namedtuple("CompiledMDP", ["states", "index", "actions", "transition_matrices", "rewards"])
+SolveReport = namedtuple("SolveReport", ["values", "policy", "iterations", "residual", "converged"])
+
+TERMINAL_ACTION = ''
+METHODS = ("backward_induction", "value_iteration", "policy_iteration")
+
+
+def compile_mdp(initial_states, possible_actions, transitions, immediate_value, is_terminal,
+                terminal_value=None) -> CompiledMDP:
+    """
+    Enumerates the reachable states and builds the array form of the MDP
+    :param initial_states: iterable of states to start the search from
+    :param possible_actions: state -> list of actions
+    :param transitions: (state, action) -> list of Transition(prob, next_state)
+    :param immediate_value: (state, action) -> reward
+    :param is_terminal: state -> True if the state has no decisions left
+    :param terminal_value: state -> value of a terminal state, 0 by default
+    :return: CompiledMDP with states in discovery order, index mapping a state to its row, the
+        list of actions, one CSR matrix per action and rewards of shape (n_states, n_actions)
+        holding -inf where an action is not available
+    """
+    terminal_value = terminal_value or (lambda state: 0)
+    states, index = [], {}
+    actions, action_index = [TERMINAL_ACTION], {TERMINAL_ACTION: 0}
+    entries = {}  # action code -> (rows, cols, probs)
+    rewards = []  # (row, action code, reward)
+
+    def visit(state):
+        if state not in index:
+            index[state] = len(states)
+            states.append(state)
+            queue.append(state)
+
+    queue = deque()
+    for state in initial_states:
+        visit(state)
+    while queue:
+        state = queue.popleft()
+        row = index[state]
+        if is_terminal(state):
+            rewards.append((row, 0, terminal_value(state)))
+            continue
+        for action in possible_actions(state):
+            if action not in action_index:
+                action_index[action] = len(actions)
+                actions.append(action)
+            code = action_index[action]
+            rewards.append((row, code, immediate_value(state, action)))
+            rows, cols, probs = entries.setdefault(code, ([], [], []))
+            for transition in transitions(state, action):
+                visit(transition.next_state)
+                rows.append(row)
+                cols.append(index[transition.next_state])
+                probs.append(transition.prob)
+
+    n_states = len(states)
+    transition_matrices = []
+    for code in range(len(actions)):
+        rows, cols, probs = entries.get(code, ([], [], []))
+        transition_matrices.append(sparse.csr_matrix((probs, (rows, cols)), shape=(n_states, n_states)))
+    reward_matrix = np.full((n_states, len(actions)), -np.inf)
+    rows, codes, values = zip(*rewards)
+    reward_matrix[list(rows), list(codes)] = values
+    return CompiledMDP(states, index, actions, transition_matrices, reward_matrix)
+
+
+def _action_values(mdp: CompiledMDP, values: np.ndarray, discount: float) -> np.ndarray:
+    """Q[s, a] = R[s, a] + discount * sum_s' P_a[s, s'] V[s']"""
+    q = mdp.rewards.copy()
+    for code, matrix in enumerate(mdp.transition_matrices):
+        q[:, code] += discount * (matrix @ values)
+    return q
+
+
+def _policy_matrix(mdp: CompiledMDP, policy: np.ndarray) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """Transition matrix and reward vector of a fixed policy"""
+    n_states = len(mdp.states)
+    matrix = sparse.csr_matrix((n_states, n_states))
+    for code, action_matrix in enumerate(mdp.transition_matrices):
+        chosen = sparse.diags((policy == code).astype(float))
+        matrix = matrix + chosen @ action_matrix
+    return matrix.tocsr(), mdp.rewards[np.arange(n_states), policy]
+
+
+def evaluate_policy(mdp: CompiledMDP, policy: np.ndarray, discount: float = 1.0) -> np.ndarray:
+    """
+    Exact value of a policy from one sparse linear solve
+    :param mdp: compiled MDP
+    :param policy: action code per state
+    :param discount: discount factor
+    :return: value per state
+    """
+    matrix, reward = _policy_matrix(mdp, policy)
+    system = sparse.identity(len(mdp.states), format="csc") - discount * matrix.tocsc()
+    return np.atleast_1d(spsolve(system, reward))
+
+
+def state_levels(mdp: CompiledMDP):
+    """
+    Longest number of steps from each state to a terminal state, peeling off the states whose
+    successors are all done one level at a time
+    :param mdp: compiled MDP
+    :return: level per state, or None if the transitions have a cycle
+    """
+    n_states = len(mdp.states)
+    reachable = sum((matrix != 0).astype(np.int8) for matrix in mdp.transition_matrices)
+    reachable = sparse.csr_matrix(reachable)
+    reachable.data[:] = 1
+    predecessors = reachable.T.tocsr()
+    remaining = np.diff(reachable.indptr).astype(np.int64)
+    levels = np.full(n_states, -1, dtype=np.int64)
+    frontier = np.flatnonzero(remaining == 0)
+    level = 0
+    while len(frontier):
+        levels[frontier] = level
+        # every edge into the frontier is one successor fewer left to solve
+        remaining -= np.bincount(predecessors[frontier].indices, minlength=n_states)
+        frontier = np.flatnonzero((remaining == 0) & (levels < 0))
+        level += 1
+    return None if (levels < 0).any() else levels
+
+
+def backward_induction(mdp: CompiledMDP, discount: float = 1.0, levels: np.ndarray = None) -> SolveReport:
+    """
+    Exact solve of an acyclic MDP with one backup per level, no iterating to convergence
+    :param mdp: compiled MDP whose transitions have no cycles
+    :param discount: discount factor
+    :param levels: result of state_levels if it is already known
+    :return: SolveReport with values, action codes, and the number of levels as iterations
+    """
+    levels = state_levels(mdp) if levels is None else levels
+    if levels is None:
+        raise ValueError("the MDP has a cycle, use value_iteration or policy_iteration")
+    # renumber the states level by level so every level is a contiguous block of rows
+    order = np.argsort(levels, kind="stable")
+    bounds = np.searchsorted(levels[order], np.arange(levels.max() + 2))
+    matrices = [matrix[order][:, order].tocsr() for matrix in mdp.transition_matrices]
+    rewards = mdp.rewards[order]
+    values = np.zeros(len(order))
+    policy = np.zeros(len(order), dtype=np.int64)
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        q = rewards[lo:hi].copy()
+        for code, matrix in enumerate(matrices):
+            # rows of this level only point at lower levels, which are already solved
+            q[:, code] += discount * (matrix[lo:hi] @ values)
+        policy[lo:hi] = q.argmax(axis=1)
+        values[lo:hi] = q[np.arange(hi - lo), policy[lo:hi]]
+    solved_values, solved_policy = np.empty_like(values), np.empty_like(policy)
+    solved_values[order], solved_policy[order] = values, policy
+    return SolveReport(solved_values, solved_policy, len(bounds) - 1, 0.0, True)
+
+
+def solve(mdp: CompiledMDP, discount: float = 1.0, method: str = None, **options) -> SolveReport:
+    """
+    :param mdp: compiled MDP
+    :param discount: discount factor
+    :param method: one of METHODS, by default backward_induction when discount is 1 and the MDP
+        is acyclic, policy_iteration otherwise
+    :param options: passed on to value_iteration or policy_iteration
+    :return: SolveReport
+    """
+    levels = None
+    if method is None:
+        levels = state_levels(mdp) if discount == 1 else None
+        method = "policy_iteration" if levels is None else "backward_induction"
+    if method == "backward_induction":
+        return backward_induction(mdp, discount, levels)
+    if method == "value_iteration":
+        return value_iteration(mdp, discount, **options)
+    if method == "policy_iteration":
+        return policy_iteration(mdp, discount, **options)
+    raise ValueError(f"unknown method {method}, expected one of {METHODS}")
+
+
+def value_iteration(mdp: CompiledMDP, discount: float = 1.0, tol: float = 1e-9,
+                    max_iterations: int = 10_000) -> SolveReport:
+    """
+    :param mdp: compiled MDP
+    :param discount: discount factor
+    :param tol: stop once no value changes by more than tol
+    :param max_iterations: cap on the number of sweeps
+    :return: SolveReport with values, action codes, sweeps used, last change and whether it converged
+    """
+    values = np.zeros(len(mdp.states))
+    residual = np.inf
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        q = _action_values(mdp, values, discount)
+        new_values = q.max(axis=1)
+        residual = np.abs(new_values - values).max()
+        values = new_values
+        if residual < tol:
+            break
+    policy = _action_values(mdp, values, discount).argmax(axis=1)
+    return SolveReport(values, policy, iterations, residual, residual < tol)
+
+
+def policy_iteration(mdp: CompiledMDP, discount: float = 1.0, evaluation_sweeps: int = None, tol: float = 1e-9,
+                     max_iterations: int = 1_000) -> SolveReport:
+    """
+    :param mdp: compiled MDP
+    :param discount: discount factor
+    :param evaluation_sweeps: None for exact evaluation by a linear solve, otherwise the number of
+        sweeps per evaluation (modified policy iteration)
+    :param tol: modified policy iteration stops once the policy is stable and values change by less than tol
+    :param max_iterations: cap on the number of improvement steps
+    :return: SolveReport with values, action codes, improvement steps, last change and whether it converged
+    """
+    values = np.zeros(len(mdp.states))
+    policy = mdp.rewards.argmax(axis=1)
+    residual = np.inf
+    converged = False
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        if evaluation_sweeps is None:
+            new_values = evaluate_policy(mdp, policy, discount)
+        else:
+            matrix, reward = _policy_matrix(mdp, policy)
+            new_values = values
+            for _ in range(evaluation_sweeps):
+                new_values = reward + discount * (matrix @ new_values)
+        residual = np.abs(new_values - values).max()
+        values = new_values
+        q = _action_values(mdp, values, discount)
+        # only switch actions on a strict improvement so the loop can't cycle between ties
+        current = q[np.arange(len(policy)), policy]
+        new_policy = np.where(q.max(axis=1) > current + 1e-12, q.argmax(axis=1), policy)
+        stable = np.array_equal(new_policy, policy)
+        policy = new_policy
+        if stable and (evaluation_sweeps is None or residual < tol):
+            converged = True
+            break
+    return SolveReport(values, policy, iterations, residual, converged)
+
+
+def save_solution(store, params: dict, mdp: CompiledMDP, report: SolveReport, version: int = 1) -> None:
+    """
+    Keeps a solved MDP in a primers.table_store.TableStore
+    :param store: TableStore
+    :param params: JSON serializable parameters that identify the problem
+    :param mdp: compiled MDP, its states have to be tuples of numbers so they fit in an array
+    :param report: result of value_iteration or policy_iteration
+    :param version: bump when the model changes so old solutions are not reused
+    """
+    states = np.asarray(mdp.states)
+    if states.dtype == object or states.ndim > 2:
+        raise ValueError("only states that are numbers or flat tuples of numbers can be stored")
+    store.save("mdp", {"params": params, "actions": [str(action) for action in mdp.actions]},
+               {"states": states, "values": report.values, "policy": report.policy},
+               {"states": len(mdp.states)}, version)
+
+
+def load_solution(store, params: dict, actions: list, version: int = 1, state_type=None):
+    """
+    :param store: TableStore
+    :param params: parameters the solution was saved under
+    :param actions: the MDP's action list (CompiledMDP.actions), part of the key
+    :param version: version the solution was saved under
+    :param state_type: called on each state row to rebuild the state, e.g. a namedtuple class
+    :return: state -> Result(action, value) like policy_results, or None if nothing valid is stored
+    """
+    stored = store.load("mdp", {"params": params, "actions": [str(action) for action in actions]}, version,
+                        validate=True)
+    if stored is None:
+        return None
+    states, values, policy = (stored.arrays[name] for name in ("states", "values", "policy"))
+    rows = states.tolist()
+    if states.ndim == 2:
+        rows = [state_type(*row) if state_type else tuple(row) for row in rows]
+    elif state_type:
+        rows = [state_type(row) for row in rows]
+    return {state: Result(actions[code], float(value)) for state, code, value in zip(rows, policy.tolist(), values)}
+
+
+def policy_results(mdp: CompiledMDP, report: SolveReport) -> dict:
+    """
+    :param mdp: compiled MDP
+    :param report: result of value_iteration or policy_iteration
+    :return: state -> Result(action, value), the same shape and value types as the primers' lookup dicts
+    """
+    # tolist gives plain floats and ints, like load_solution and BellmanSolver
+    return {state: Result(mdp.actions[code], value)
+            for state, code, value in zip(mdp.states, report.policy.tolist(), report.values.tolist())}
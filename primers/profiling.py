@@ -0,0 +1,436 @@
+"""Profiling helpers built from the ProfilingCode primer
+
+Profile is both a context manager and a decorator:
+
+    with Profile() as profile:
+        solve(...)
+    profile.write("run.csv")
+
+    @profile_calls(path="knapsack.json")
+    def solve(...): ...
+
+Modes:
+deterministic: cProfile, exact call counts and times, slows pure Python code down noticeably
+sampling: a background thread records the profiled thread's stack every interval seconds.
+    No call counts, times are estimated from the number of samples, and the interval is
+    stretched whenever taking samples costs more than max_overhead of the wall time
+
+Results are FunctionRecord rows (function, file, line, calls, primitive_calls, tottime,
+cumtime) that can be written to .csv, .json or .parquet (needs pandas with pyarrow), read
+back with load_records and compared with diff.
+
+Existing solvers can be measured without editing them: instrument(module_or_class) wraps
+their functions in place for the duration of a with block, and Profile(include=[module])
+keeps only the functions defined in the given modules. load_module imports a primer from
+a directory whose name isn't a valid module name, such as 01-Recursion.
+"""
+import cProfile
+import csv
+import functools
+import importlib.util
+import inspect
+import json
+import pstats
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from pathlib import Path
+
+FunctionRecord = namedtuple("FunctionRecord", ["function", "file", "line", "calls", "primitive_calls", "tottime",
+                                               "cumtime"])
+RecordDiff = namedtuple("RecordDiff", ["function", "file", "before", "after", "change", "ratio"])
+
+MODES = ("deterministic", "sampling")
+FORMATS = (".csv", ".json", ".parquet")
+
+
+class Profile:
+    """
+    Profiles the code run inside it, entering it again adds to the same results
+    :param mode: one of MODES
+    :param interval: seconds between samples in sampling mode
+    :param max_overhead: fraction of wall time sampling may spend taking samples
+    :param include: modules, files or directories, only functions defined there are reported
+    """
+
+    def __init__(self, mode: str = "deterministic", interval: float = 0.001, max_overhead: float = 0.05,
+                 include=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown mode {mode}, expected one of {MODES}")
+        self.mode = mode
+        self.interval = interval
+        self.max_overhead = max_overhead
+        self.include = None if include is None else [_source_path(item) for item in include]
+        self.elapsed = 0.0
+        self._profiler = cProfile.Profile() if mode == "deterministic" else None
+        # sampling: (file, line, name) -> samples at the top of the stack / anywhere in the stack
+        self.n_samples = 0
+        self._self_samples = defaultdict(int)
+        self._stack_samples = defaultdict(int)
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+        self._depth = 0  # a decorated recursive function enters the profile again before leaving it
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+        wrapper.profile = self
+        return wrapper
+
+    def start(self) -> None:
+        self._depth += 1
+        if self._depth > 1:
+            return
+        self._started = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        else:
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, args=(threading.get_ident(),), daemon=True)
+            self._sampler.start()
+
+    def stop(self) -> None:
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        if self._profiler is not None:
+            self._profiler.disable()
+        else:
+            self._stop.set()
+            self._sampler.join()
+        self.elapsed += time.perf_counter() - self._started
+
+    def _sample(self, thread_id: int) -> None:
+        interval = self.interval
+        own_frame = sys._getframe()
+        while not self._stop.wait(interval):
+            taken = time.perf_counter()
+            frame = sys._current_frames().get(thread_id)
+            if frame is None:
+                break
+            seen = set()
+            self._self_samples[_frame_key(frame)] += 1
+            while frame is not None and frame is not own_frame:
+                key = _frame_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self._stack_samples[key] += 1
+                frame = frame.f_back
+            self.n_samples += 1
+            cost = time.perf_counter() - taken
+            # keep cost / (interval + cost) under max_overhead
+            interval = max(interval, cost / self.max_overhead - cost)
+
+    def records(self, sort_by: str = "cumtime") -> list[FunctionRecord]:
+        """
+        :param sort_by: FunctionRecord field to sort on, largest first
+        :return: one FunctionRecord per function
+        """
+        if self._profiler is not None:
+            stats = pstats.Stats(self._profiler).stats
+            records = [FunctionRecord(name, file, line, calls, primitive_calls, tottime, cumtime)
+                       for (file, line, name), (primitive_calls, calls, tottime, cumtime, _) in stats.items()]
+        else:
+            # a sample stands for elapsed / n_samples seconds, whatever the interval ended up being
+            seconds = self.elapsed / self.n_samples if self.n_samples else 0.0
+            records = [FunctionRecord(name, file, line, None, None, self._self_samples.get(key, 0) * seconds,
+                                      count * seconds)
+                       for key, count in self._stack_samples.items() for file, line, name in [key]]
+        if self.include is not None:
+            records = [record for record in records if _included(record.file, self.include)]
+        return sorted(records, key=lambda record: getattr(record, sort_by) or 0, reverse=True)
+
+    def write(self, path, sort_by: str = "cumtime") -> None:
+        """
+        Writes the records to a .csv, .json or .parquet file, or the raw cProfile stats to a
+        .prof/.cprof file for snakeviz and gprof2dot
+        :param path: output file, the format follows the suffix
+        :param sort_by: FunctionRecord field to sort on
+        """
+        path = Path(path)
+        if path.suffix in (".prof", ".cprof"):
+            if self._profiler is None:
+                raise ValueError("raw stats are only available in deterministic mode")
+            self._profiler.dump_stats(path)
+        else:
+            write_records(self.records(sort_by), path)
+
+
+def profile_calls(function=None, *, path=None, **profile_options):
+    """
+    Decorator that profiles every call of a function into one Profile, available as wrapper.profile
+    :param function: function to wrap
+    :param path: rewrite the records to this file after every call
+    :param profile_options: passed on to Profile
+    """
+    def decorate(function):
+        profile = Profile(**profile_options)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            try:
+                with profile:
+                    return function(*args, **kwargs)
+            finally:
+                if path is not None:
+                    profile.write(path)
+        wrapper.profile = profile
+        return wrapper
+
+    return decorate if function is None else decorate(function)
+
+
+def profile_function(function, *args, mode: str = "deterministic", **kwargs):
+    """
+    The primer's profile_function, returning the result as well as the profile
+    :return: (function(*args, **kwargs), Profile)
+    """
+    profile = Profile(mode)
+    with profile:
+        result = function(*args, **kwargs)
+    return result, profile
+
+
+def write_records(records: list, path) -> None:
+    """
+    :param records: FunctionRecord rows
+    :param path: .csv, .json or .parquet file
+    """
+    path = Path(path)
+    rows = [record._asdict() for record in records]
+    if path.suffix == ".csv":
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FunctionRecord._fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    elif path.suffix == ".json":
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=1)
+    elif path.suffix == ".parquet":
+        import pandas as pd
+        pd.DataFrame(rows, columns=FunctionRecord._fields).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"unknown format {path.suffix}, expected one of {FORMATS}")
+
+
+def load_records(path) -> list[FunctionRecord]:
+    """
+    :param path: file written by write_records or Profile.write
+    :return: the FunctionRecord rows
+    """
+    path = Path(path)
+    if path.suffix == ".csv":
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+    elif path.suffix == ".json":
+        with open(path) as f:
+            rows = json.load(f)
+    elif path.suffix == ".parquet":
+        import pandas as pd
+        rows = pd.read_parquet(path).to_dict("records")
+    else:
+        raise ValueError(f"unknown format {path.suffix}, expected one of {FORMATS}")
+
+    def number(value, kind):
+        return None if value in (None, "") or value != value else kind(value)
+
+    return [FunctionRecord(row["function"], row["file"], number(row["line"], int), number(row["calls"], int),
+                           number(row["primitive_calls"], int), number(row["tottime"], float),
+                           number(row["cumtime"], float))
+            for row in rows]
+
+
+def diff(before, after, key: str = "cumtime", min_change: float = 0.0) -> list[RecordDiff]:
+    """
+    Compares two runs function by function
+    :param before: records, a Profile or a file of the baseline run
+    :param after: records, a Profile or a file of the new run
+    :param key: FunctionRecord field to compare
+    :param min_change: leave out functions whose field changed by less than this
+    :return: RecordDiff rows, largest absolute change first. Functions missing from one
+        run count as 0 there and get a ratio of None
+    """
+    def by_function(run):
+        if isinstance(run, Profile):
+            run = run.records()
+        elif isinstance(run, (str, Path)):
+            run = load_records(run)
+        return {(record.function, record.file, record.line): getattr(record, key) or 0 for record in run}
+
+    old, new = by_function(before), by_function(after)
+    rows = []
+    for function, file, line in old.keys() | new.keys():
+        value_before, value_after = old.get((function, file, line), 0), new.get((function, file, line), 0)
+        change = value_after - value_before
+        if abs(change) < min_change:
+            continue
+        ratio = value_after / value_before if value_before else None
+        rows.append(RecordDiff(function, file, value_before, value_after, change, ratio))
+    return sorted(rows, key=lambda row: abs(row.change), reverse=True)
+
+
+class instrument:
+    """
+    Wraps the functions of a module or class in timing wrappers for the duration of a with
+    block and restores them afterwards, so a solver can be measured without touching its code.
+    Only the wrapped functions are timed, which costs far less than profiling every call.
+    Recursive calls add to calls but only the outermost call adds to cumtime, as in cProfile,
+    and tottime leaves out time spent in other wrapped functions.
+
+        with instrument(egg_drop.EggDrop) as timings:
+            EggDrop("bisect").extend(10, 5000)
+        timings.records()
+
+    :param targets: modules or classes
+    :param names: attribute names to wrap, every function defined on the target by default
+    """
+
+    def __init__(self, *targets, names: list[str] = None):
+        self.targets = targets
+        self.names = names
+        self._originals = []
+        self._stats = {}
+        self._stack = []  # [key, start, time spent in wrapped children]
+
+    def __enter__(self):
+        for target in self.targets:
+            for name, function in self._functions(target):
+                self._originals.append((target, name, target.__dict__[name]))
+                setattr(target, name, self._wrap(target, name, function))
+        return self
+
+    def __exit__(self, *exc_info):
+        for target, name, original in reversed(self._originals):
+            setattr(target, name, original)
+        self._originals = []
+
+    def _functions(self, target):
+        for name, value in list(vars(target).items()):
+            if self.names is not None and name not in self.names:
+                continue
+            function = value.__func__ if isinstance(value, (staticmethod, classmethod)) else value
+            if inspect.isfunction(function) and (inspect.isclass(target) or
+                                                 function.__module__ == target.__name__):
+                yield name, function
+
+    def _wrap(self, target, name, function):
+        key = (f"{getattr(target, '__qualname__', target.__name__)}.{name}", function.__code__.co_filename,
+               function.__code__.co_firstlineno)
+        stats = self._stats.setdefault(key, [0, 0.0, 0.0, 0])  # calls, tottime, cumtime, active calls
+        stack = self._stack
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stats[0] += 1
+            stats[3] += 1
+            frame = [time.perf_counter(), 0.0]
+            stack.append(frame)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - frame[0]
+                stack.pop()
+                stats[3] -= 1
+                stats[1] += elapsed - frame[1]
+                if stats[3] == 0:
+                    stats[2] += elapsed
+                if stack:
+                    stack[-1][1] += elapsed
+
+        original = target.__dict__[name]
+        if isinstance(original, staticmethod):
+            return staticmethod(wrapper)
+        if isinstance(original, classmethod):
+            return classmethod(wrapper)
+        return wrapper
+
+    def records(self, sort_by: str = "cumtime") -> list[FunctionRecord]:
+        records = [FunctionRecord(function, file, line, calls, calls, tottime, cumtime)
+                   for (function, file, line), (calls, tottime, cumtime, _) in self._stats.items() if calls]
+        return sorted(records, key=lambda record: getattr(record, sort_by), reverse=True)
+
+    def write(self, path, sort_by: str = "cumtime") -> None:
+        write_records(self.records(sort_by), path)
+
+
+def load_module(path, name: str = None):
+    """
+    Imports a .py file or package directory by path, for primers that live in directories
+    like 01-Recursion that can't be imported by name. The file's directory goes on sys.path
+    first so the primers' sibling imports (from hmm import ...) keep working.
+    :param path: .py file or directory with an __init__.py
+    :param name: module name, the file name by default
+    :return: the module
+    """
+    path = Path(path).resolve()
+    if path.is_dir():
+        name = name or path.name
+        location, search = path / "__init__.py", [str(path)]
+    else:
+        name = name or path.stem
+        location, search = path, None
+    if name in sys.modules:
+        return sys.modules[name]
+    if str(path.parent) not in sys.path:
+        sys.path.insert(0, str(path.parent))
+    spec = importlib.util.spec_from_file_location(name, location, submodule_search_locations=search)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+def _frame_key(frame) -> tuple:
+    code = frame.f_code
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+def _source_path(item) -> str:
+    if isinstance(item, (str, Path)):
+        return str(Path(item).resolve())
+    source = getattr(item, "__file__", None) or inspect.getsourcefile(item)
+    if Path(source).name == "__init__.py":
+        source = Path(source).parent
+    return str(Path(source).resolve())
+
+
+def _included(file: str, include: list[str]) -> bool:
+    try:
+        resolved = str(Path(file).resolve())
+    except (OSError, ValueError):
+        return False
+    return any(resolved == path or resolved.startswith(path.rstrip("/") + "/") for path in include)
+
+
+if __name__ == "__main__":
+    import argparse
+    import runpy
+
+    parser = argparse.ArgumentParser(description="Profile a script and write per function records")
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    parser.add_argument("--out", default="profile.csv", help=".csv, .json, .parquet or .prof file")
+    parser.add_argument("--mode", default="deterministic", choices=MODES)
+    parser.add_argument("--sort", default="cumtime", choices=FunctionRecord._fields)
+    options = parser.parse_args()
+
+    sys.argv = [options.script] + options.args
+    sys.path.insert(0, str(Path(options.script).resolve().parent))
+    with Profile(options.mode) as profile:
+        runpy.run_path(options.script, run_name="__main__")
+    profile.write(options.out, options.sort)
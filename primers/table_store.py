@@ -0,0 +1,199 @@
+"""Persistent store for solved DP and value tables
+
+Each entry is a set of NumPy arrays saved as .npy files plus a JSON manifest, in a
+directory named after a hash of (kind, version, params):
+
+    <root>/<kind>-<hash>/manifest.json
+    <root>/<kind>-<hash>/<array name>.npy
+
+params identify the problem (the knapsack items, an MDP's parameters); how far a table
+has been solved (floors, capacity) is the entry's extent and lives in the manifest, so a
+larger request finds the smaller table, extends it and saves it back under the same key.
+Bumping version gives new files, the old entries are simply never read again.
+
+load maps the arrays read only with mmap, so nothing is read or copied until it is used.
+Shapes and dtypes are checked against the manifest right away, which only touches the
+.npy headers; the CRC32 checksums are compared the first time validate() is called.
+Writes go to a temporary directory that is swapped in for the entry while holding an
+exclusive lock on the entry's lock file (<root>/.<kind>-<hash>.lock), and load holds a
+shared lock while it opens the files, so concurrent writers take turns and a reader sees
+the old entry or the new one, never a mix or a missing entry. Where fcntl is not available
+(Windows) there is no locking and a reader can miss an entry while it is being replaced.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+FORMAT_VERSION = 1
+
+
+class StoredTable:
+    """
+    Arrays of one store entry, memory-mapped read only
+    :param path: entry directory
+    :param manifest: parsed manifest.json
+    """
+
+    def __init__(self, path: Path, manifest: dict):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = {}
+        for name, meta in manifest["arrays"].items():
+            array = np.load(path / f"{name}.npy", mmap_mode="r")
+            if list(array.shape) != meta["shape"] or array.dtype.str != meta["dtype"]:
+                raise ValueError(f"{path / name}.npy does not match its manifest")
+            self.arrays[name] = array
+        self._valid = None
+
+    @property
+    def extent(self) -> dict:
+        return self.manifest["extent"]
+
+    @property
+    def params(self) -> dict:
+        return self.manifest["params"]
+
+    def validate(self) -> bool:
+        """Compares every array with its checksum, reading the files once, later calls are free"""
+        if self._valid is None:
+            self._valid = all(_checksum(self.arrays[name]) == meta["crc32"]
+                              for name, meta in self.manifest["arrays"].items())
+        return self._valid
+
+
+class TableStore:
+    """
+    Directory of stored tables
+    :param root: directory, created if needed
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, kind: str, params: dict, version: int = 1) -> Path:
+        """Entry directory for a problem, whether or not it exists"""
+        identity = json.dumps({"kind": kind, "version": version, "params": params}, sort_keys=True)
+        return self.root / f"{kind}-{hashlib.sha256(identity.encode()).hexdigest()[:16]}"
+
+    def load(self, kind: str, params: dict, version: int = 1, validate: bool = False):
+        """
+        :param kind: table family, e.g. "egg_drop"
+        :param params: JSON serializable problem parameters
+        :param version: version of the solver that wrote the table
+        :param validate: check the checksums now instead of on the first validate()
+        :return: StoredTable, or None if there is no usable entry
+        """
+        path = self.path(kind, params, version)
+        try:
+            # the memmaps keep the files open, so the entry can be replaced once they are made
+            with _locked(path, exclusive=False):
+                with open(path / "manifest.json") as f:
+                    manifest = json.load(f)
+                if manifest["format"] != FORMAT_VERSION:
+                    return None
+                table = StoredTable(path, manifest)
+        except (OSError, ValueError, KeyError):
+            return None
+        if validate and not table.validate():
+            return None
+        return table
+
+    def save(self, kind: str, params: dict, arrays: dict, extent: dict = None, version: int = 1) -> StoredTable:
+        """
+        Writes (or replaces) an entry
+        :param kind: table family
+        :param params: JSON serializable problem parameters
+        :param arrays: name -> NumPy array
+        :param extent: how far the tables are solved, e.g. {"eggs": 10, "floors": 5000}
+        :param version: version of the solver writing the table
+        :return: the saved entry, memory-mapped
+        """
+        path = self.path(kind, params, version)
+        staging = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=self.root))
+        manifest = {"format": FORMAT_VERSION, "kind": kind, "version": version, "params": params,
+                    "extent": extent or {}, "arrays": {}}
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            np.save(staging / f"{name}.npy", array)
+            manifest["arrays"][name] = {"shape": list(array.shape), "dtype": array.dtype.str,
+                                        "crc32": _checksum(array)}
+        with open(staging / "manifest.json", "w") as f:
+            json.dump(manifest, f, indent=1)
+        # a directory can't be renamed over a non-empty one, so move the old entry aside first,
+        # under the lock so no other writer can put an entry back in between
+        retired = None
+        with _locked(path, exclusive=True):
+            if path.exists():
+                retired = Path(tempfile.mkdtemp(prefix=f".{path.name}-old-", dir=self.root))
+                os.replace(path, retired / "entry")
+            os.replace(staging, path)
+            table = StoredTable(path, manifest)
+        if retired is not None:
+            # open memmaps of the old files stay valid after the unlink
+            shutil.rmtree(retired, ignore_errors=True)
+        return table
+
+    def get_or_compute(self, kind: str, params: dict, compute, version: int = 1) -> StoredTable:
+        """
+        :param kind: table family
+        :param params: JSON serializable problem parameters
+        :param compute: () -> (arrays dict, extent dict), called only if nothing valid is stored
+        :param version: solver version
+        :return: the stored entry
+        """
+        table = self.load(kind, params, version, validate=True)
+        if table is None:
+            arrays, extent = compute()
+            table = self.save(kind, params, arrays, extent, version)
+        return table
+
+    def entries(self) -> list[dict]:
+        """Manifests of every entry in the store"""
+        manifests = []
+        for manifest_path in sorted(self.root.glob("*/manifest.json")):
+            if not manifest_path.parent.name.startswith("."):
+                with open(manifest_path) as f:
+                    manifests.append(json.load(f))
+        return manifests
+
+    def remove(self, kind: str, params: dict, version: int = 1) -> None:
+        path = self.path(kind, params, version)
+        with _locked(path, exclusive=True):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def _locked(path: Path, exclusive: bool):
+    """Holds the lock file of the entry at path, shared or exclusive, for the with block"""
+    try:
+        fd = None if fcntl is None else os.open(path.with_name(f".{path.name}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+    except PermissionError:
+        if exclusive:
+            raise
+        # a read only store has no writers to wait for
+        fd = None
+    if fd is None:
+        yield
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _checksum(array: np.ndarray) -> int:
+    return zlib.crc32(np.ascontiguousarray(array).view(np.uint8).reshape(-1)) if array.size else 0